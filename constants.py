@@ -1,13 +1,114 @@
 import os
 
 # Vector DB
+RETRIEVAL_BACKEND = os.environ.get('RETRIEVAL_BACKEND', "chroma")  # "chroma" or "local"
+LOCAL_INDEX_DIR = os.environ.get('LOCAL_INDEX_DIR', "data/index")
 CHROMA_HOST = os.environ.get('CHROMA_HOST', 'http://127.0.0.1')
 CHROMA_PORT = os.environ.get('CHROMA_PORT', 8000)
 CHROMA_COLLECTION_NAME = "courses"
+CHROMA_COLLECTION_VERSION_KEY = "version"
+CHROMA_VERSION_CHECK_SECONDS = float(os.environ.get('CHROMA_VERSION_CHECK_SECONDS', 30))
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 256))
+
+# Embedding cache: content hash -> embedding of the ingested documents
+EMBEDDING_CACHE_ENABLED = os.environ.get('EMBEDDING_CACHE_ENABLED', "1") == "1"
+EMBEDDING_CACHE_DIR = os.environ.get('EMBEDDING_CACHE_DIR', "data/cache/embeddings")  # One subdirectory per model
+# In-memory LRU cache of search phrase embeddings, per process (0 disables it)
+QUERY_EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get('QUERY_EMBEDDING_CACHE_MAX_ENTRIES', 4096))
+
+# Retrieval cache
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', 4096))
+
+# NCF model
+NCF_MODEL_PATH = os.environ.get('NCF_MODEL_PATH', "models/ncf_bundle")  # A model bundle, or a pickled model
+NCF_INFERENCE_BACKEND = os.environ.get('NCF_INFERENCE_BACKEND', "torch")  # "torch", "torchscript" or "onnx"
+NCF_BUNDLE_EXPORTS = tuple(filter(None, os.environ.get('NCF_BUNDLE_EXPORTS', "torchscript").split(",")))
+NCF_USER_FEATURES_PATH = os.environ.get('NCF_USER_FEATURES_PATH', "data/processed/user_features.json")
+NCF_COURSES_LIST_PATH = os.environ.get('NCF_COURSES_LIST_PATH', "data/processed/courses_list.json")
+NCF_FEATURE_COLUMNS = ('Field_Of_Study', 'Primary_Hobby', 'Secondary_Hobby', 'Desired_Career_Field')
+NCF_SPARSE_INPUT = os.environ.get('NCF_SPARSE_INPUT', "0") == "1"
+NCF_QUANTIZE = os.environ.get('NCF_QUANTIZE', "0") == "1"  # Dynamic int8 Linear layers (torch backend only)
+NCF_MEMO_MAX_ENTRIES = int(os.environ.get('NCF_MEMO_MAX_ENTRIES', 4096))
+NCF_TOPK_TABLE_PATH = os.environ.get('NCF_TOPK_TABLE_PATH', "models/ncf_topk_table.npz")
+NCF_TOPK_TABLE_K = int(os.environ.get('NCF_TOPK_TABLE_K', 10))
+
+# NCF streaming preprocessing
+NCF_PACKED_DATA_DIR = os.environ.get('NCF_PACKED_DATA_DIR', "data/processed/packed")
+PREPROCESS_CHUNK_SIZE = int(os.environ.get('PREPROCESS_CHUNK_SIZE', 100_000))
+
+# NCF training
+TRAIN_EPOCHS = int(os.environ.get('TRAIN_EPOCHS', 50))
+TRAIN_BATCH_SIZE = int(os.environ.get('TRAIN_BATCH_SIZE', 16))
+TRAIN_LEARNING_RATE = float(os.environ.get('TRAIN_LEARNING_RATE', 0.01))
+TRAIN_NUM_WORKERS = int(os.environ.get('TRAIN_NUM_WORKERS', 0))
+TRAIN_PIN_MEMORY = os.environ.get('TRAIN_PIN_MEMORY', "0") == "1"
+TRAIN_NUM_THREADS = int(os.environ.get('TRAIN_NUM_THREADS', 0))  # 0 keeps the torch default
+TRAIN_BF16 = os.environ.get('TRAIN_BF16', "0") == "1"
+TRAIN_VALIDATION_SIZE = float(os.environ.get('TRAIN_VALIDATION_SIZE', 0.0))  # Fraction of the training rows
+TRAIN_EARLY_STOPPING_PATIENCE = int(os.environ.get('TRAIN_EARLY_STOPPING_PATIENCE', 0))  # 0 disables early stopping
+TRAIN_EARLY_STOPPING_MIN_DELTA = float(os.environ.get('TRAIN_EARLY_STOPPING_MIN_DELTA', 1e-4))
+TRAIN_CHECKPOINT_DIR = os.environ.get('TRAIN_CHECKPOINT_DIR', "models/checkpoints")
+TRAIN_CHECKPOINT_EVERY = int(os.environ.get('TRAIN_CHECKPOINT_EVERY', 0))  # In epochs; 0 disables checkpoints
+
+# NCF micro-batching
+MICRO_BATCH_MAX_SIZE = int(os.environ.get('MICRO_BATCH_MAX_SIZE', 64))
+MICRO_BATCH_MAX_WAIT_MS = float(os.environ.get('MICRO_BATCH_MAX_WAIT_MS', 5))
+
+# Multi-worker serving (serve.py)
+SERVER_HOST = os.environ.get('SERVER_HOST', "0.0.0.0")
+SERVER_PORT = int(os.environ.get('SERVER_PORT', 6942))
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', os.cpu_count() or 1))
+SERVER_WORKER_THREADS = int(os.environ.get('SERVER_WORKER_THREADS', 1))  # torch intra-op threads per worker
+# Workers exiting sooner than this after their start are failing; they are restarted with a growing delay,
+# and the launcher gives up after SERVER_MAX_QUICK_FAILURES of them in a row
+SERVER_WORKER_MIN_UPTIME_SECONDS = float(os.environ.get('SERVER_WORKER_MIN_UPTIME_SECONDS', 10))
+SERVER_MAX_QUICK_FAILURES = int(os.environ.get('SERVER_MAX_QUICK_FAILURES', 5))
+SERVER_RESPAWN_BACKOFF_SECONDS = float(os.environ.get('SERVER_RESPAWN_BACKOFF_SECONDS', 0.5))
+
+# Metrics (/metrics endpoint and Server-Timing debug header)
+METRICS_DEBUG_TIMINGS_ENABLED = os.environ.get('METRICS_DEBUG_TIMINGS_ENABLED', "1") == "1"
+METRICS_LATENCY_BUCKETS = tuple(float(bucket) for bucket in os.environ.get(
+    'METRICS_LATENCY_BUCKETS', "0.0005,0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30"
+).split(","))  # In seconds
+# How often each worker of serve.py shares its metrics with the others, in seconds
+METRICS_SNAPSHOT_SECONDS = float(os.environ.get('METRICS_SNAPSHOT_SECONDS', 1))
 
 # API keys
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', "")
 
+# Hybrid fast-path recommender (NCF + vector search rank fusion)
+HYBRID_NCF_WEIGHT = float(os.environ.get('HYBRID_NCF_WEIGHT', 1.0))
+HYBRID_RETRIEVAL_WEIGHT = float(os.environ.get('HYBRID_RETRIEVAL_WEIGHT', 1.0))
+HYBRID_RRF_K = float(os.environ.get('HYBRID_RRF_K', 60))
+HYBRID_NCF_CANDIDATES = int(os.environ.get('HYBRID_NCF_CANDIDATES', 20))
+
+# LLM client
+LLM_BACKEND = os.environ.get('LLM_BACKEND', "gemini")  # "gemini" or "stub"
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 8))
+LLM_TIMEOUT_SECONDS = float(os.environ.get('LLM_TIMEOUT_SECONDS', 60))
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 2))
+LLM_RETRY_BACKOFF_SECONDS = float(os.environ.get('LLM_RETRY_BACKOFF_SECONDS', 0.5))
+LLM_STUB_LATENCY_SECONDS = float(os.environ.get('LLM_STUB_LATENCY_SECONDS', 0.5))
+
+# LLM response cache
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', "1") == "1"
+LLM_CACHE_PATH = os.environ.get('LLM_CACHE_PATH', "data/cache/llm_responses.sqlite3")
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get('LLM_CACHE_MAX_ENTRIES', 10000))
+LLM_CACHE_TTL_SECONDS = float(os.environ.get('LLM_CACHE_TTL_SECONDS', 7 * 24 * 60 * 60))
+
+# Request coalescing: identical concurrent requests share one execution
+SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', "1") == "1"
+
+# Prompt assembly (prompt_builder.py)
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', 1500))  # Estimated tokens per prompt; 0 disables it
+PROMPT_CHARS_PER_TOKEN = float(os.environ.get('PROMPT_CHARS_PER_TOKEN', 4))
+PROMPT_MAX_DISTANCE = float(os.environ['PROMPT_MAX_DISTANCE']) if os.environ.get('PROMPT_MAX_DISTANCE') else None
+PROMPT_MIN_COURSES = int(os.environ.get('PROMPT_MIN_COURSES', 5))  # Kept whatever their distance
+PROMPT_DEDUPE_SIMILARITY = float(os.environ.get('PROMPT_DEDUPE_SIMILARITY', 0.9))
+PROMPT_EXCLUDED_PROFILE_FIELDS = tuple(filter(None, os.environ.get(
+    'PROMPT_EXCLUDED_PROFILE_FIELDS', "gender,country_of_origin"
+).lower().split(",")))
+
 # Prompt templates
 COURSE_RECOMMENDATION_PROMPT = """
 You are the program coordinator, student counsellor and course management expert for graduate courses.
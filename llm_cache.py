@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+from constants import LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS
+from util import clean_text
+
+
+def get_normalized_profile(profile_dict: dict):
+    """
+    Function to normalize a profile, so profiles that only differ in key order, case or punctuation are equal.
+
+    Args:
+        profile_dict (dict): The user's profile.
+
+    Returns:
+        tuple: The sorted (lowercase key, cleaned value) pairs.
+    """
+    return tuple(sorted(
+        (str(key).strip().lower(), clean_text(str(value))) for key, value in profile_dict.items()
+    ))
+
+
+def get_llm_cache_key(profile_dict: dict, course_ids, prompt_template: str):
+    """
+    Function to build the LLM response cache key for a recommendation request.
+
+    The key covers the cleaned profile values, the ordered IDs of the retrieved courses and the prompt template,
+    so profiles that only differ in case or punctuation share an entry, while a re-ingested catalog or an edited prompt does not.
+
+    Args:
+        profile_dict (dict): The user's profile.
+        course_ids (list): The ordered IDs of the courses returned by the search.
+        prompt_template (str): The prompt template the response was generated from.
+
+    Returns:
+        str: The hex digest of the key.
+    """
+    payload = json.dumps({
+        "profile": get_normalized_profile(profile_dict),
+        "courses": list(course_ids),
+        "prompt": hashlib.sha256(prompt_template.encode("utf-8")).hexdigest(),
+    })
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Persistent LLM response cache stored in SQLite, with LRU and TTL eviction.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES, ttl_seconds=LLM_CACHE_TTL_SECONDS):
+        """
+        Initializes the cache, creating the database file if needed.
+
+        Args:
+            path (str): The path to the SQLite database file.
+            max_entries (int): The maximum number of entries kept; the least recently used are evicted first.
+            ttl_seconds (float): How long an entry stays valid after it is written.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connect()
+
+    def connect(self):
+        """
+        Open the connection to the database, creating the table if needed.
+
+        A SQLite connection must not be used on both sides of a fork, so worker processes forked
+        after the cache was created call this again to get a connection of their own.
+        """
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def get(self, key: str):
+        """
+        Look up a cached response.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            str: The cached response, or None on a miss or an expired entry.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, response: str):
+        """
+        Store a response and evict the least recently used entries beyond `max_entries`.
+
+        Args:
+            key (str): The cache key.
+            response (str): The response to store.
+        """
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            self.connection.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: The number of hits, misses and stored entries.
+        """
+        with self.lock:
+            entries = self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
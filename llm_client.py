@@ -0,0 +1,244 @@
+import asyncio
+
+from constants import (
+    LLM_MAX_CONCURRENCY, LLM_TIMEOUT_SECONDS, LLM_MAX_RETRIES, LLM_RETRY_BACKOFF_SECONDS, LLM_STUB_LATENCY_SECONDS
+)
+
+# HTTP status codes of the backend errors worth retrying: timeouts, rate limiting and server errors
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_transient_error(ex):
+    """
+    Function to tell whether a failed attempt may succeed if retried.
+
+    Timeouts and connection errors are transient, and so are the backend errors carrying a transient HTTP status
+    in their `code` attribute (the `google.api_core` errors raised by Gemini do). Other errors, such as a bad request,
+    an authentication error or a blocked response, would fail again and are not retried.
+
+    Args:
+        ex (Exception): The error raised by the attempt.
+
+    Returns:
+        bool: True if the attempt should be retried.
+    """
+    if isinstance(ex, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    code = getattr(ex, "code", None)
+    return isinstance(code, int) and code in TRANSIENT_STATUS_CODES
+
+
+class GeminiBackend:
+    """
+    LLM backend calling a Gemini `GenerativeModel` through its native async API.
+    """
+
+    def __init__(self, model):
+        """
+        Initializes the backend.
+
+        Args:
+            model (google.generativeai.GenerativeModel): The configured generative model.
+        """
+        self.model = model
+
+    async def generate(self, prompt: str):
+        """
+        Generate a completion for a prompt without blocking the event loop.
+
+        Args:
+            prompt (str): The prompt to generate a response for.
+
+        Returns:
+            str: The generated response.
+        """
+        response = await self.model.generate_content_async(prompt)
+        return response.text.strip()
+
+    async def stream(self, prompt: str):
+        """
+        Stream a completion for a prompt as it is generated.
+
+        Args:
+            prompt (str): The prompt to generate a response for.
+
+        Yields:
+            str: The text of each generated chunk.
+        """
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            yield chunk.text
+
+
+class StubBackend:
+    """
+    Local LLM backend that sleeps for a fixed latency and echoes a canned response.
+    It lets the concurrency, timeout, retry and streaming behaviour be exercised offline.
+    """
+
+    def __init__(self, latency_seconds=LLM_STUB_LATENCY_SECONDS, response="Stub response"):
+        """
+        Initializes the backend.
+
+        Args:
+            latency_seconds (float): How long each call takes.
+            response (str): The response returned for every prompt.
+        """
+        self.latency_seconds = latency_seconds
+        self.response = response
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate(self, prompt: str):
+        """
+        Pretend to generate a completion for a prompt.
+
+        Args:
+            prompt (str): The prompt to generate a response for.
+
+        Returns:
+            str: The canned response.
+        """
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency_seconds)
+        finally:
+            self.in_flight -= 1
+        return self.response
+
+    async def stream(self, prompt: str):
+        """
+        Pretend to stream a completion, yielding the canned response word by word.
+        The words are spread evenly over `latency_seconds`, so the first one arrives well before the full response.
+
+        Args:
+            prompt (str): The prompt to generate a response for.
+
+        Yields:
+            str: The next word of the canned response, with its trailing space.
+        """
+        words = self.response.split(" ")
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            for idx, word in enumerate(words):
+                await asyncio.sleep(self.latency_seconds / len(words))
+                yield word if idx == len(words) - 1 else word + " "
+        finally:
+            self.in_flight -= 1
+
+
+class AsyncLLMClient:
+    """
+    Async LLM client that bounds the number of concurrent calls and applies per-call timeouts and retries.
+    """
+
+    def __init__(self, backend, max_concurrency=LLM_MAX_CONCURRENCY, timeout_seconds=LLM_TIMEOUT_SECONDS,
+                 max_retries=LLM_MAX_RETRIES, retry_backoff_seconds=LLM_RETRY_BACKOFF_SECONDS):
+        """
+        Initializes the client.
+
+        Args:
+            backend: An object with an async `generate(prompt)` method and an async generator `stream(prompt)`,
+                such as `GeminiBackend` or `StubBackend`.
+            max_concurrency (int): The maximum number of calls in flight at once.
+            timeout_seconds (float): The timeout of a single attempt.
+            max_retries (int): How many times a timed out attempt, or one failing with a transient error, is retried.
+            retry_backoff_seconds (float): The base delay between retries, doubled after every attempt.
+        """
+        self.backend = backend
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.stats = {"calls": 0, "retries": 0, "timeouts": 0, "failures": 0}
+        # Number of calls holding a slot of the semaphore; the other calls are waiting for one
+        self.in_flight = 0
+
+    async def generate(self, prompt: str):
+        """
+        Generate a completion for a prompt, retrying on timeouts and transient errors.
+        Each attempt takes its own concurrency slot, so waiting out the backoff does not hold one.
+
+        Args:
+            prompt (str): The prompt to generate a response for.
+
+        Returns:
+            str: The generated response.
+
+        Raises:
+            Exception: The first error that is not transient, or the last one once all retries are exhausted.
+        """
+        self.stats["calls"] += 1
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.retry_backoff_seconds * 2 ** (attempt - 1))
+            async with self.semaphore:
+                self.in_flight += 1
+                try:
+                    return await asyncio.wait_for(self.backend.generate(prompt), self.timeout_seconds)
+                except Exception as ex:
+                    if isinstance(ex, asyncio.TimeoutError):
+                        self.stats["timeouts"] += 1
+                    if attempt == self.max_retries or not is_transient_error(ex):
+                        self.stats["failures"] += 1
+                        raise
+                finally:
+                    self.in_flight -= 1
+
+    async def stream(self, prompt: str):
+        """
+        Stream a completion for a prompt. Each chunk must arrive within the per-call timeout.
+        Attempts are only retried until the first chunk arrives, since the caller has already received the output after that,
+        and only on timeouts and transient errors. Each attempt takes its own concurrency slot, held until the stream ends.
+
+        Args:
+            prompt (str): The prompt to generate a response for.
+
+        Yields:
+            str: The text of each generated chunk.
+
+        Raises:
+            Exception: The first error that is not transient, the last one once all retries are exhausted,
+                or any error after the first chunk.
+        """
+        self.stats["calls"] += 1
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.retry_backoff_seconds * 2 ** (attempt - 1))
+            async with self.semaphore:
+                self.in_flight += 1
+                try:
+                    chunks = self.backend.stream(prompt)
+                    try:
+                        first_chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout_seconds)
+                    except StopAsyncIteration:
+                        return
+                    except Exception as ex:
+                        if isinstance(ex, asyncio.TimeoutError):
+                            self.stats["timeouts"] += 1
+                        await chunks.aclose()
+                        if attempt == self.max_retries or not is_transient_error(ex):
+                            self.stats["failures"] += 1
+                            raise
+                        continue
+
+                    yield first_chunk
+                    try:
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout_seconds)
+                            except StopAsyncIteration:
+                                return
+                            yield chunk
+                    except asyncio.TimeoutError:
+                        self.stats["timeouts"] += 1
+                        self.stats["failures"] += 1
+                        raise
+                    finally:
+                        await chunks.aclose()
+                finally:
+                    self.in_flight -= 1
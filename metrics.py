@@ -0,0 +1,547 @@
+import os
+import glob
+import json
+import time
+import bisect
+import threading
+import contextvars
+
+from constants import METRICS_DEBUG_TIMINGS_ENABLED, METRICS_LATENCY_BUCKETS, METRICS_SNAPSHOT_SECONDS
+
+# Stage timings of the current request, set by MetricsMiddleware when the client asks for them
+__request_timings__ = contextvars.ContextVar("request_timings", default=None)
+
+
+def escape_label_value(value):
+    """
+    Function to escape a label value for the Prometheus text format.
+
+    Args:
+        value: The label value.
+
+    Returns:
+        str: The value with its backslashes, double quotes and newlines escaped.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(label_names, label_values, extra=""):
+    """
+    Function to format the label set of a sample in the Prometheus text format.
+
+    Args:
+        label_names (tuple): The label names.
+        label_values (tuple): The label values, in the same order.
+        extra (str): An already formatted label appended to the set, such as the "le" label of a bucket.
+
+    Returns:
+        str: The formatted label set, empty if there are no labels.
+    """
+    labels = [f'{name}="{escape_label_value(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Counter:
+    """
+    Monotonically increasing counter, with one value per combination of label values.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, label_names=()):
+        """
+        Initializes the counter.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text of the metric.
+            label_names (tuple): The names of the labels the values are split by.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        """
+        Increase the counter.
+
+        Args:
+            *label_values: The label values, in the order of the label names.
+            amount (float): How much to add.
+        """
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        """
+        Get the samples of the metric.
+
+        Returns:
+            list: (suffixed name, formatted labels, value) tuples.
+        """
+        with self.lock:
+            values = list(self.values.items())
+        return [(self.name, format_labels(self.label_names, labels), value) for labels, value in values]
+
+
+class Gauge(Counter):
+    """
+    Value that can go up and down, such as the number of requests in flight.
+    """
+
+    kind = "gauge"
+    # Across worker processes the gauges of the live workers are added up
+    multiprocess_mode = "livesum"
+
+    def dec(self, *label_values, amount=1):
+        """
+        Decrease the gauge.
+
+        Args:
+            *label_values: The label values, in the order of the label names.
+            amount (float): How much to subtract.
+        """
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, *label_values, value):
+        """
+        Set the gauge.
+
+        Args:
+            *label_values: The label values, in the order of the label names.
+            value (float): The new value.
+        """
+        with self.lock:
+            self.values[label_values] = value
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed cumulative buckets, with one distribution per combination of label values.
+    An observation is a binary search and three additions, so histograms can stay on in the hot path.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=METRICS_LATENCY_BUCKETS):
+        """
+        Initializes the histogram.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text of the metric.
+            label_names (tuple): The names of the labels the distributions are split by.
+            buckets (tuple): The sorted upper bounds of the buckets; a +Inf bucket is added.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: the (non-cumulative) count of each bucket plus +Inf, and the sum of the observations
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """
+        Record an observation.
+
+        Args:
+            value (float): The observed value.
+            *label_values: The label values, in the order of the label names.
+        """
+        idx = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(label_values)
+            if entry is None:
+                entry = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][idx] += 1
+            entry[1] += value
+
+    def samples(self):
+        """
+        Get the samples of the metric: the cumulative buckets, the sum and the count of every distribution.
+
+        Returns:
+            list: (suffixed name, formatted labels, value) tuples.
+        """
+        with self.lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self.values.items()]
+        samples = []
+        for labels, counts, total in values:
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if upper_bound == float("inf") else repr(float(upper_bound))
+                samples.append((f"{self.name}_bucket", format_labels(self.label_names, labels, f'le="{le}"'), cumulative))
+            samples.append((f"{self.name}_sum", format_labels(self.label_names, labels), total))
+            samples.append((f"{self.name}_count", format_labels(self.label_names, labels), cumulative))
+        return samples
+
+
+def is_process_alive(pid):
+    """
+    Function to check whether a process is running.
+
+    Args:
+        pid (int): The process id.
+
+    Returns:
+        bool: True if the process exists.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge_families(snapshots):
+    """
+    Function to combine the metrics of several worker processes into one set of families.
+
+    Counters and histograms are added up over every worker, including the ones that exited, so the totals never
+    go down when a worker is replaced. Gauges only count the live workers: "livesum" gauges are added up, and
+    "livemax" gauges (values of a store shared by the workers, which each of them reports) take the largest value.
+
+    Args:
+        snapshots (list): (alive, families) pairs, where families are as returned by `MetricsRegistry.collect`.
+
+    Returns:
+        list: The combined (name, kind, documentation, multiprocess mode, samples) families.
+    """
+    merged = {}
+    for alive, families in snapshots:
+        for name, kind, documentation, mode, samples in families:
+            values = merged.setdefault(name, (kind, documentation, mode, {}))[3]
+            if kind == "gauge" and not alive:
+                continue
+            for sample_name, labels, value in samples:
+                key = (sample_name, labels)
+                if key in values and kind == "gauge" and mode == "livemax":
+                    values[key] = max(values[key], value)
+                else:
+                    values[key] = values.get(key, 0) + value
+    return [
+        (name, kind, documentation, mode, [(sample_name, labels, value) for (sample_name, labels), value in values.items()])
+        for name, (kind, documentation, mode, values) in merged.items()
+    ]
+
+
+class MetricsRegistry:
+    """
+    Collection of the metrics exposed on the /metrics endpoint.
+
+    Under the pre-fork launcher (`serve.py`) every worker keeps its own metrics in memory, and a scrape reaches
+    whichever worker accepts the connection. Workers then write a snapshot of their metrics to a shared directory
+    (see `start_multiprocess`), and a scrape combines the snapshots of every worker with its own current values.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty registry.
+        """
+        self.metrics = []
+        self.collectors = []
+        self.multiprocess_dir = None
+        self.snapshot_path = None
+        self.snapshot_lock = threading.Lock()
+        self.snapshot_thread = None
+        self.snapshot_stopped = threading.Event()
+
+    def register(self, metric):
+        """
+        Add a metric to the registry.
+
+        Args:
+            metric (Counter | Gauge | Histogram): The metric.
+
+        Returns:
+            The metric, so it can be created and registered in one statement.
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """
+        Add a function read at every scrape, for values that are already counted elsewhere (such as cache hits).
+
+        Args:
+            collector (callable): A function returning a list of (name, kind, documentation, samples) tuples,
+                where samples is a list of (labels dict, value) pairs. A gauge may add a fifth element,
+                its multiprocess mode: "livesum" (the default) or "livemax".
+        """
+        self.collectors.append(collector)
+
+    def collect(self):
+        """
+        Read the current value of every metric of this process.
+
+        Returns:
+            list: (name, kind, documentation, multiprocess mode, samples) tuples, where samples is a list of
+                (suffixed name, formatted labels, value) tuples.
+        """
+        families = [
+            (metric.name, metric.kind, metric.documentation, getattr(metric, "multiprocess_mode", "livesum"),
+             metric.samples())
+            for metric in self.metrics
+        ]
+        for collector in self.collectors:
+            for family in collector():
+                name, kind, documentation, samples = family[:4]
+                mode = family[4] if len(family) > 4 else "livesum"
+                families.append((name, kind, documentation, mode, [
+                    (name, format_labels(tuple(labels), tuple(labels.values())), value) for labels, value in samples
+                ]))
+        return families
+
+    def start_multiprocess(self, directory, interval_seconds=METRICS_SNAPSHOT_SECONDS):
+        """
+        Share the metrics of this worker process with the other workers through snapshot files.
+        The snapshot is rewritten every `interval_seconds`, at every scrape served by this worker and by
+        `stop_multiprocess`; the file is named after the pid and start time, so a replacement worker never
+        overwrites the totals of the worker it replaces.
+
+        Args:
+            directory (str): The directory shared by the workers, created by the launcher.
+            interval_seconds (float): How often the snapshot is rewritten.
+        """
+        self.multiprocess_dir = directory
+        self.snapshot_path = os.path.join(directory, f"metrics-{os.getpid()}-{time.time_ns()}.json")
+        self.snapshot_stopped.clear()
+        self.write_snapshot()
+
+        def run():
+            while not self.snapshot_stopped.wait(interval_seconds):
+                self.write_snapshot()
+
+        self.snapshot_thread = threading.Thread(target=run, name="metrics-snapshot", daemon=True)
+        self.snapshot_thread.start()
+
+    def stop_multiprocess(self):
+        """
+        Stop the periodic snapshots and write the final values of this worker.
+        """
+        if self.snapshot_path is None:
+            return
+        self.snapshot_stopped.set()
+        self.write_snapshot()
+
+    def write_snapshot(self):
+        """
+        Write the current metrics of this process to its snapshot file, replacing it atomically.
+        """
+        with self.snapshot_lock:
+            snapshot = {"pid": os.getpid(), "families": self.collect()}
+            with open(self.snapshot_path + ".tmp", 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(self.snapshot_path + ".tmp", self.snapshot_path)
+
+    def read_snapshots(self):
+        """
+        Read the snapshot of every worker, the live and the exited ones.
+
+        Returns:
+            list: (alive, families) pairs.
+        """
+        snapshots = []
+        for path in sorted(glob.glob(os.path.join(self.multiprocess_dir, "metrics-*.json"))):
+            if path == self.snapshot_path:
+                continue
+            try:
+                with open(path, 'r') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            snapshots.append((is_process_alive(snapshot["pid"]), snapshot["families"]))
+        return snapshots
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format, combined over every worker process
+        when the metrics are shared between workers.
+
+        Returns:
+            str: The exposition text.
+        """
+        if self.multiprocess_dir is None:
+            families = self.collect()
+        else:
+            # This worker's snapshot is written first, so the totals another worker serves next are not lower
+            self.write_snapshot()
+            with open(self.snapshot_path, 'r') as f:
+                own_families = json.load(f)["families"]
+            families = merge_families([(True, own_families)] + self.read_snapshots())
+
+        lines = []
+        for name, kind, documentation, _, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{sample_name}{labels} {value}" for sample_name, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    "recommender_request_duration_seconds", "Time until the response is sent, by endpoint.", ("path", "method")
+))
+REQUESTS = REGISTRY.register(Counter(
+    "recommender_requests_total", "Requests served, by endpoint and status code.", ("path", "method", "status")
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "recommender_requests_in_flight", "Requests being served, by endpoint.", ("path",)
+))
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "recommender_stage_duration_seconds", "Time spent in each stage of the recommendation pipeline.", ("stage",)
+))
+PROMPT_TOKENS = REGISTRY.register(Histogram(
+    "recommender_prompt_tokens", "Estimated size of the prompts sent to the LLM, in tokens.",
+    buckets=(250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+))
+PROMPT_COURSES = REGISTRY.register(Counter(
+    "recommender_prompt_courses_total", "Courses found for the prompts, by what happened to them.", ("outcome",)
+))
+
+
+class time_stage:
+    """
+    Context manager timing one stage of the pipeline into the stage histogram and,
+    when the client asked for them, into the timings of the current request.
+    """
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        """
+        Initializes the timer.
+
+        Args:
+            stage (str): The name of the stage.
+        """
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self.start
+        STAGE_DURATION.observe(elapsed, self.stage)
+        timings = __request_timings__.get()
+        if timings is not None:
+            timings.append((self.stage, elapsed))
+        return False
+
+
+async def run_with_stage_timings(function, *args):
+    """
+    Function to run a coroutine function while recording its stage timings into a list of its own,
+    whether or not the current request asked for them. Used for executions shared between requests,
+    which hand their timings to every request that waited on them (see `add_stage_timings`).
+
+    Args:
+        function (callable): The coroutine function.
+        *args: The arguments to call it with.
+
+    Returns:
+        tuple: The result of the function, and the (stage, seconds) pairs of the stages it ran.
+    """
+    timings = []
+    token = __request_timings__.set(timings)
+    try:
+        return await function(*args), timings
+    finally:
+        __request_timings__.reset(token)
+
+
+def add_stage_timings(timings):
+    """
+    Function to add stage timings recorded elsewhere to the timings of the current request, if it asked for them.
+
+    Args:
+        timings (list): The (stage, seconds) pairs.
+    """
+    request_timings = __request_timings__.get()
+    if request_timings is not None:
+        request_timings.extend(timings)
+
+
+def format_server_timing(timings, total):
+    """
+    Function to format stage timings as a `Server-Timing` header value, in milliseconds.
+
+    Args:
+        timings (list): The (stage, seconds) pairs, in the order they ran.
+        total (float): The time until the response started, in seconds.
+
+    Returns:
+        str: The header value, e.g. "clean_text;dur=0.05, search;dur=3.20, total;dur=3.41".
+    """
+    return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings + [("total", total)])
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting the requests, their duration and the requests in flight of every endpoint.
+
+    Requests sent with an `X-Debug-Timings: 1` header get their stage timings back in a `Server-Timing` response header.
+    Streaming responses only include the stages that ran before the stream started, and requests that joined
+    an identical request's execution get the stage timings of that whole execution.
+    Paths that are not routes of the app are counted under "other", to bound the number of label values.
+    """
+
+    def __init__(self, app, debug_timings_enabled=METRICS_DEBUG_TIMINGS_ENABLED):
+        """
+        Initializes the middleware.
+
+        Args:
+            app: The ASGI application to wrap.
+            debug_timings_enabled (bool): Whether clients may ask for their stage timings.
+        """
+        self.app = app
+        self.debug_timings_enabled = debug_timings_enabled
+        self.paths = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self.paths is None:
+            # The routes are all declared by the time the first request is served
+            self.paths = frozenset(getattr(route, "path", None) for route in scope["app"].routes)
+        path = scope["path"] if scope["path"] in self.paths else "other"
+        method = scope["method"]
+
+        timings = None
+        if self.debug_timings_enabled and (b"x-debug-timings", b"1") in scope["headers"]:
+            timings = []
+            __request_timings__.set(timings)
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_metrics(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timings is not None:
+                    header = format_server_timing(timings, time.perf_counter() - start)
+                    message = {**message, "headers": list(message.get("headers", [])) + [
+                        (b"server-timing", header.encode("latin-1"))
+                    ]}
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(path)
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            REQUESTS_IN_FLIGHT.dec(path)
+            REQUEST_DURATION.observe(time.perf_counter() - start, path, method)
+            REQUESTS.inc(path, method, status)
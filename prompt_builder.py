@@ -0,0 +1,311 @@
+import re
+import math
+import json
+
+from constants import (
+    COURSE_RECOMMENDATION_PROMPT, PROMPT_CHARS_PER_TOKEN, PROMPT_DEDUPE_SIMILARITY, PROMPT_EXCLUDED_PROFILE_FIELDS,
+    PROMPT_MAX_DISTANCE, PROMPT_MIN_COURSES, PROMPT_TOKEN_BUDGET
+)
+from util import get_formatted_key_value_pairs
+
+# Course fields shown in the prompt, as labeled in the display text written by ingestion
+DESCRIPTION_LABEL = "Description"
+__field_pattern__ = re.compile(r"^([A-Za-z ]+): ?(.*)$")
+__sentence_pattern__ = re.compile(r"(?<=[.!?])\s+")
+__word_pattern__ = re.compile(r"[a-z0-9]+")
+
+# Descriptions are dropped rather than cut below this many characters
+MIN_DESCRIPTION_CHARS = 40
+TRUNCATION_MARK = "..."
+
+
+def estimate_tokens(text, chars_per_token=PROMPT_CHARS_PER_TOKEN):
+    """
+    Function to estimate the number of tokens of a text from its length.
+
+    Args:
+        text (str): The text.
+        chars_per_token (float): The average number of characters per token.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return math.ceil(len(text) / chars_per_token)
+
+
+def get_words(text):
+    """
+    Function to get the set of lowercase words of a text.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        set: The words.
+    """
+    return set(__word_pattern__.findall(text.lower()))
+
+
+def parse_display_text(display_text):
+    """
+    Function to split the display text of a course into its labeled fields.
+    Lines without a label continue the previous field.
+
+    Args:
+        display_text (str): The display text, one "Label: value" line per field.
+
+    Returns:
+        list: The [label, value] pairs, in display order.
+    """
+    fields = []
+    for line in display_text.split("\n"):
+        match = __field_pattern__.match(line)
+        if match is not None:
+            fields.append([match.group(1), match.group(2).strip()])
+        elif fields:
+            fields[-1][1] = f"{fields[-1][1]} {line.strip()}".strip()
+        else:
+            fields.append(["", line.strip()])
+    return fields
+
+
+def render_fields(fields):
+    """
+    Function to render labeled course fields back into display text.
+
+    Args:
+        fields (list): The [label, value] pairs.
+
+    Returns:
+        str: The display text.
+    """
+    return "\n".join(f"{label}: {value}" if label else value for label, value in fields)
+
+
+def truncate_by_relevance(description, max_chars, query_words):
+    """
+    Function to shorten a description to a number of characters, keeping the sentences sharing the most words with
+    the search phrase. The kept sentences stay in their original order.
+
+    Args:
+        description (str): The course description.
+        max_chars (int): The maximum length of the result.
+        query_words (set): The words of the search phrase.
+
+    Returns:
+        str: The shortened description, empty if not even a cut sentence fits.
+    """
+    if len(description) <= max_chars:
+        return description
+    max_chars -= len(TRUNCATION_MARK) + 1
+    if max_chars < MIN_DESCRIPTION_CHARS:
+        return ""
+
+    sentences = __sentence_pattern__.split(description)
+    # Most relevant first, earlier sentences first among equally relevant ones
+    ranking = sorted(range(len(sentences)), key=lambda idx: (-len(get_words(sentences[idx]) & query_words), idx))
+    kept = []
+    length = 0
+    for idx in ranking:
+        added = len(sentences[idx]) + (1 if kept else 0)
+        if length + added <= max_chars:
+            kept.append(idx)
+            length += added
+    if not kept:
+        # Not even the most relevant sentence fits: cut it at a word boundary
+        return sentences[ranking[0]][:max_chars].rsplit(" ", 1)[0] + " " + TRUNCATION_MARK
+    return " ".join(sentences[idx] for idx in sorted(kept)) + " " + TRUNCATION_MARK
+
+
+def allocate_budget(lengths, budget):
+    """
+    Function to share a character budget between descriptions: short descriptions are kept whole,
+    and what they leave is split evenly between the longer ones.
+
+    Args:
+        lengths (list): The length of each description.
+        budget (int): The number of characters to share.
+
+    Returns:
+        list: The number of characters allowed to each description.
+    """
+    allowances = [0] * len(lengths)
+    remaining = max(budget, 0)
+    order = sorted(range(len(lengths)), key=lambda idx: lengths[idx])
+    for position, idx in enumerate(order):
+        share = remaining // (len(order) - position)
+        allowances[idx] = min(lengths[idx], share)
+        remaining -= allowances[idx]
+    return allowances
+
+
+class PromptBuilder:
+    """
+    Assembles the course recommendation prompt within a token budget.
+
+    The hits of the search are filtered by distance, near-identical (cross-listed) courses are merged, and the
+    descriptions are shortened to their most relevant sentences until the prompt fits. Profile fields that do
+    not help pick courses are left out.
+    """
+
+    def __init__(self, template=COURSE_RECOMMENDATION_PROMPT, token_budget=PROMPT_TOKEN_BUDGET,
+                 chars_per_token=PROMPT_CHARS_PER_TOKEN, max_distance=PROMPT_MAX_DISTANCE,
+                 min_courses=PROMPT_MIN_COURSES, dedupe_similarity=PROMPT_DEDUPE_SIMILARITY,
+                 excluded_profile_fields=PROMPT_EXCLUDED_PROFILE_FIELDS):
+        """
+        Initializes the builder.
+
+        Args:
+            template (str): The prompt template, with `formatted_background_and_interests` and `formatted_course_list` fields.
+            token_budget (int): The maximum estimated number of tokens of the prompt; 0 disables the budget.
+            chars_per_token (float): The average number of characters per token used to estimate the size of the prompt.
+            max_distance (float, optional): Hits farther than this search distance are dropped. None keeps every hit.
+            min_courses (int): The number of best hits kept whatever their distance, so the model has enough to choose from.
+            dedupe_similarity (float): The word overlap (Jaccard index) above which two descriptions are the same course.
+            excluded_profile_fields (tuple): The lowercase profile fields left out of the prompt.
+        """
+        self.template = template
+        self.token_budget = token_budget
+        self.chars_per_token = chars_per_token
+        self.max_distance = max_distance
+        self.min_courses = min_courses
+        self.dedupe_similarity = dedupe_similarity
+        self.excluded_profile_fields = frozenset(field.lower() for field in excluded_profile_fields)
+        # Identifies the settings, so cached responses of differently built prompts are kept apart
+        self.fingerprint = json.dumps([
+            token_budget, chars_per_token, max_distance, min_courses, dedupe_similarity, sorted(self.excluded_profile_fields)
+        ])
+
+    def filter_profile(self, profile_dict):
+        """
+        Drop the profile fields that are left out of the prompt.
+
+        Args:
+            profile_dict (dict): The user's profile.
+
+        Returns:
+            dict: The profile without the excluded fields.
+        """
+        return {key: value for key, value in profile_dict.items() if str(key).lower() not in self.excluded_profile_fields}
+
+    def select_courses(self, metadatas, distances, stats):
+        """
+        Drop the hits beyond the distance threshold and merge near-identical courses into the best ranked one.
+
+        Args:
+            metadatas (list): The metadata of each hit, best first, with a "display_text".
+            distances (list, optional): The search distance of each hit.
+            stats (dict): The counters updated with the dropped courses.
+
+        Returns:
+            list: The [label, value] fields of each kept course, best first.
+        """
+        courses = []
+        description_words = []
+        for rank, metadata in enumerate(metadatas):
+            if (self.max_distance is not None and distances is not None and rank >= self.min_courses
+                    and distances[rank] > self.max_distance):
+                stats["dropped_below_threshold"] += 1
+                continue
+
+            fields = parse_display_text(metadata["display_text"])
+            description = next((value for label, value in fields if label == DESCRIPTION_LABEL), "")
+            words = get_words(description) or get_words(render_fields(fields))
+            duplicate_of = next((
+                idx for idx, other_words in enumerate(description_words)
+                if len(words & other_words) >= self.dedupe_similarity * len(words | other_words)
+            ), None)
+            if duplicate_of is not None:
+                # Keep one entry for a cross-listed course, naming its other listing
+                listing = " ".join(value for label, value in fields if label in ("Subject", "Catalog Number"))
+                kept_fields = courses[duplicate_of]
+                if kept_fields[-1][0] == "Cross-listed as":
+                    kept_fields[-1][1] += f"; {listing}"
+                else:
+                    kept_fields.append(["Cross-listed as", listing])
+                stats["dropped_duplicates"] += 1
+                continue
+            courses.append(fields)
+            description_words.append(words)
+        return courses
+
+    def fit_courses(self, courses, available_chars, query_words, stats):
+        """
+        Render the courses within a number of characters, dropping the lowest ranked courses when even their
+        details without descriptions do not fit, and shortening the descriptions to share what is left.
+
+        Args:
+            courses (list): The [label, value] fields of each course, best first.
+            available_chars (int, optional): The characters available for the course list. None means no limit.
+            query_words (set): The words of the search phrase.
+            stats (dict): The counters updated with the dropped courses and shortened descriptions.
+
+        Returns:
+            str: The formatted course list.
+        """
+        if available_chars is None:
+            return "\n\n".join(render_fields(fields) for fields in courses)
+
+        # Details without the descriptions, and the cost of the "Description: " lines
+        headers = [render_fields([field for field in fields if field[0] != DESCRIPTION_LABEL]) for fields in courses]
+        descriptions = [next((value for label, value in fields if label == DESCRIPTION_LABEL), "") for fields in courses]
+        label_cost = len(DESCRIPTION_LABEL) + 3
+
+        def fixed_cost(count):
+            return sum(len(header) + label_cost for header in headers[:count]) + 2 * (count - 1)
+
+        count = len(courses)
+        while count > 1 and fixed_cost(count) > available_chars:
+            count -= 1
+        stats["dropped_over_budget"] += len(courses) - count
+
+        allowances = allocate_budget([len(description) for description in descriptions[:count]],
+                                     available_chars - fixed_cost(count))
+        rendered = []
+        for fields, description, allowance in zip(courses[:count], descriptions[:count], allowances):
+            shortened = truncate_by_relevance(description, allowance, query_words)
+            if shortened != description:
+                stats["descriptions_truncated"] += 1
+            rendered.append(render_fields([
+                [label, shortened] if label == DESCRIPTION_LABEL else [label, value]
+                for label, value in fields if label != DESCRIPTION_LABEL or shortened
+            ]))
+        return "\n\n".join(rendered)
+
+    def build(self, profile_dict, metadatas, distances=None, query=""):
+        """
+        Build the prompt for a profile and the courses found for it.
+
+        Args:
+            profile_dict (dict): The user's profile.
+            metadatas (list): The metadata of each hit, best first, with a "display_text".
+            distances (list, optional): The search distance of each hit, used by the distance threshold.
+            query (str): The search phrase, used to keep the most relevant sentences of long descriptions.
+
+        Returns:
+            tuple: The prompt, and its statistics: its size in characters and estimated tokens, and the
+                number of courses found, kept, and dropped by each rule.
+        """
+        stats = {
+            "courses_found": len(metadatas), "dropped_below_threshold": 0, "dropped_duplicates": 0,
+            "dropped_over_budget": 0, "descriptions_truncated": 0,
+        }
+        profile_details_formatted = get_formatted_key_value_pairs(self.filter_profile(profile_dict))
+        courses = self.select_courses(metadatas, distances, stats)
+
+        available_chars = None
+        if self.token_budget > 0:
+            empty_prompt = self.template.format(
+                formatted_background_and_interests=profile_details_formatted, formatted_course_list=""
+            )
+            available_chars = int(self.token_budget * self.chars_per_token) - len(empty_prompt)
+        courses_list_formatted = self.fit_courses(courses, available_chars, get_words(query), stats)
+
+        prompt = self.template.format(
+            formatted_background_and_interests=profile_details_formatted,
+            formatted_course_list=courses_list_formatted
+        )
+        stats["courses_kept"] = len(courses) - stats["dropped_over_budget"]
+        stats["prompt_chars"] = len(prompt)
+        stats["prompt_tokens"] = estimate_tokens(prompt, self.chars_per_token)
+        return prompt, stats
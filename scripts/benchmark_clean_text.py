@@ -0,0 +1,89 @@
+import re
+import csv
+import time
+import argparse
+
+import nltk
+
+from util import clean_text, clean_texts
+
+
+def legacy_clean_text(text):
+    """
+    The original clean_text implementation, kept as the baseline of the benchmark.
+
+    Args:
+        text (str): The text to clean.
+
+    Returns:
+        str: The cleaned text.
+    """
+    text = text.strip().lower()
+    text = re.sub(r'[^a-zA-Z0-9\s]', '', text)
+    stop_words = set(nltk.corpus.stopwords.words('english'))
+    words = text.split(" ")
+    words = [word for word in words if word not in stop_words]
+    text = " ".join(words)
+    text = text.strip()
+    text = re.sub(r' +', ' ', text)
+    text = text.strip()
+    return text
+
+
+def load_course_texts(course_data_csv_path):
+    """
+    Function to load the text fields ingestion cleans from the course CSV.
+
+    Args:
+        course_data_csv_path (str): Path to the CSV file containing the course data.
+
+    Returns:
+        list: The raw text fields of every course.
+    """
+    columns = ("Subject", "Course Title", "Catalog Number", "Course Type", "Description", "Keywords", "Grading",
+               "Prerequisites")
+    texts = []
+    with open(course_data_csv_path, 'r', encoding="cp1252") as course_data_file:
+        for row in csv.DictReader(course_data_file):
+            texts.extend((row.get(column) or "") for column in columns)
+    return texts
+
+
+def time_per_call(function, texts, repeat):
+    """
+    Function to measure the mean cost of one call of a cleaning function.
+
+    Args:
+        function (callable): A function cleaning the whole list of texts.
+        texts (list): The texts to clean.
+        repeat (int): How many times the whole list is cleaned.
+
+    Returns:
+        float: The mean time per text, in microseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(texts)
+    return (time.perf_counter() - start) / (repeat * len(texts)) * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the text cleaning pipeline.")
+    parser.add_argument("--data", default="data/raw/courses.csv", help="Path to the course data file")
+    parser.add_argument("--repeat", type=int, default=5, help="How many times the texts are cleaned")
+    args = parser.parse_args()
+
+    texts = load_course_texts(args.data)
+
+    # The optimized pipeline must produce exactly the same output as the original one
+    assert clean_texts(texts) == [legacy_clean_text(text) for text in texts]
+
+    results = {
+        "legacy clean_text": time_per_call(lambda batch: [legacy_clean_text(text) for text in batch], texts, args.repeat),
+        "clean_text": time_per_call(lambda batch: [clean_text(text) for text in batch], texts, args.repeat),
+        "clean_texts (batch)": time_per_call(clean_texts, texts, args.repeat),
+    }
+
+    print(f"Cleaned {len(texts)} course fields {args.repeat} times")
+    for name, per_call in results.items():
+        print(f"{name:>20}: {per_call:10.2f} us/text")
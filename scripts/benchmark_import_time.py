@@ -0,0 +1,92 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+# Modules whose startup cost is tracked
+DEFAULT_TARGETS = ("server", "scripts.main_DL", "scripts.ingest_course_data")
+
+# A line of `python -X importtime` output: "import time: <self us> | <cumulative us> | <indented module name>"
+__import_time_pattern__ = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+
+def parse_import_times(stderr):
+    """
+    Function to parse the output of `python -X importtime`.
+
+    Args:
+        stderr (str): The standard error of the Python process.
+
+    Returns:
+        list: (module, self microseconds, cumulative microseconds, nesting depth) for every imported module.
+    """
+    import_times = []
+    for line in stderr.splitlines():
+        match = __import_time_pattern__.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            import_times.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return import_times
+
+
+def measure_import(target, root):
+    """
+    Function to import a module in a fresh interpreter and measure its cost.
+
+    Args:
+        target (str): The module to import.
+        root (str): The repository root, used as working directory and import path.
+
+    Returns:
+        dict: The wall time of the process, the cumulative import time of the target and its heaviest direct imports.
+    """
+    env = dict(os.environ, PYTHONPATH=root)
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=root, env=env, capture_output=True, text=True
+    )
+    wall_seconds = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing {target} failed:\n{process.stderr[-2000:]}")
+
+    import_times = parse_import_times(process.stderr)
+    top_level = [entry for entry in import_times if entry[3] == 0]
+    target_us = next((entry[2] for entry in top_level if entry[0] == target), None)
+    # Imports nested one level deep are, in practice, the direct dependencies of the target
+    direct = [entry for entry in import_times if entry[3] == 1]
+    heaviest = sorted(direct, key=lambda entry: entry[2], reverse=True)[:10]
+    return {
+        "wall_seconds": wall_seconds,
+        "import_seconds": target_us / 1e6 if target_us is not None else None,
+        "heaviest_imports": {module: cumulative_us / 1e6 for module, _, cumulative_us, _ in heaviest},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the import-time startup cost of the entry points.")
+    parser.add_argument("--targets", nargs="+", default=list(DEFAULT_TARGETS), help="Modules to import")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of fresh interpreters per target")
+    parser.add_argument("--output", default=None, help="Optional path of a JSON file to write the results to")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    for target in args.targets:
+        runs = [measure_import(target, root) for _ in range(args.repeat)]
+        import_seconds = [run["import_seconds"] for run in runs if run["import_seconds"] is not None]
+        results[target] = {
+            "median_wall_seconds": statistics.median(run["wall_seconds"] for run in runs),
+            "median_import_seconds": statistics.median(import_seconds) if import_seconds else None,
+            "heaviest_imports": runs[-1]["heaviest_imports"],
+        }
+        print(f"{target:>28}: import {results[target]['median_import_seconds'] or 0:.3f}s, "
+              f"process {results[target]['median_wall_seconds']:.3f}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
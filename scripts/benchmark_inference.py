@@ -0,0 +1,190 @@
+import json
+import time
+import argparse
+import platform
+
+import numpy as np
+
+from constants import NCF_MODEL_PATH, NCF_INFERENCE_BACKEND, RETRIEVAL_BACKEND
+from scripts.precompute_topk import DEFAULT_PERSONA_PATHS, load_personas
+from util import clean_text, get_unique_values_from_dict
+
+DEFAULT_BATCH_SIZES = (1, 8, 32, 128, 512)
+
+
+def summarize_latencies(latencies, batch_size):
+    """
+    Function to summarize the latencies of repeated calls.
+
+    Args:
+        latencies (list): The wall time of each call, in seconds.
+        batch_size (int): The number of students scored per call.
+
+    Returns:
+        dict: The latency percentiles and the mean in milliseconds, and the throughput in students per second.
+    """
+    latencies_ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "batch_size": batch_size,
+        "calls": len(latencies),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "mean_ms": float(latencies_ms.mean()),
+        "throughput_per_second": batch_size * len(latencies) / float(np.sum(latencies)),
+    }
+
+
+def time_calls(function, batches, warmup=3):
+    """
+    Function to time a function on each batch.
+
+    Args:
+        function (callable): The function to time, called with one batch.
+        batches (list): The batches to call it with, in order.
+        warmup (int): The number of untimed calls made first.
+
+    Returns:
+        list: The wall time of each timed call, in seconds.
+    """
+    for batch in batches[:warmup]:
+        function(batch)
+    latencies = []
+    for batch in batches:
+        start = time.perf_counter()
+        function(batch)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def make_batches(items, batch_size, num_calls, seed=0):
+    """
+    Function to draw random batches of items.
+
+    Args:
+        items (list): The items to draw from.
+        batch_size (int): The number of items per batch.
+        num_calls (int): The number of batches.
+        seed (int): The random seed.
+
+    Returns:
+        list: The batches, as lists of items.
+    """
+    rng = np.random.default_rng(seed)
+    return [[items[idx] for idx in rng.integers(len(items), size=batch_size)] for _ in range(num_calls)]
+
+
+def benchmark_ncf(personas, batch_sizes, num_calls, model_path=NCF_MODEL_PATH, backend=NCF_INFERENCE_BACKEND):
+    """
+    Function to benchmark the NCF path: encoding, one forward pass and the top-5 selection per batch.
+    The memo and the top-k table are disabled, so every call runs the model.
+
+    Args:
+        personas (list): The student profiles to draw batches from.
+        batch_sizes (list): The batch sizes to benchmark.
+        num_calls (int): The number of timed calls per batch size.
+        model_path (str): The path to the trained model.
+        backend (str): How to run a bundled model: "torch", "torchscript" or "onnx".
+
+    Returns:
+        list: The latency summary of each batch size.
+    """
+    from scripts.inference_DL import NCFPredictor
+
+    predictor = NCFPredictor(model_path=model_path, memo_max_entries=0, topk_table_path=None, backend=backend)
+    results = []
+    for batch_size in batch_sizes:
+        batches = make_batches(personas, batch_size, num_calls)
+        results.append(summarize_latencies(time_calls(predictor.predict_batch, batches), batch_size))
+    return results
+
+
+def benchmark_retrieval(personas, batch_sizes, num_calls, backend=RETRIEVAL_BACKEND, num_results=10):
+    """
+    Function to benchmark the retrieval path: the search phrase of each student is embedded and searched,
+    with one collection query per batch. The in-process search cache is bypassed.
+
+    Args:
+        personas (list): The student profiles to draw batches from.
+        batch_sizes (list): The batch sizes to benchmark.
+        num_calls (int): The number of timed calls per batch size.
+        backend (str): The retrieval backend, "chroma" or "local".
+        num_results (int): The number of courses retrieved per student.
+
+    Returns:
+        list: The latency summary of each batch size.
+    """
+    from scripts.query_vector_db import get_chroma_db_collection
+
+    collection = get_chroma_db_collection(backend)
+    # The server searches for the cleaned unique values of the profile
+    queries = [clean_text(str(get_unique_values_from_dict(persona))) for persona in personas]
+
+    def search(batch):
+        collection.query(query_texts=batch, n_results=num_results)
+
+    results = []
+    for batch_size in batch_sizes:
+        batches = make_batches(queries, batch_size, num_calls)
+        results.append(summarize_latencies(time_calls(search, batches), batch_size))
+    return results
+
+
+def print_results(path, results):
+    """
+    Function to print the latency summaries of one path as a table.
+
+    Args:
+        path (str): The name of the benchmarked path.
+        results (list): The latency summary of each batch size.
+    """
+    print(f"{path}:")
+    print(f"{'batch':>8} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'students/s':>12}")
+    for result in results:
+        print(f"{result['batch_size']:>8} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} "
+              f"{result['p99_ms']:>10.2f} {result['throughput_per_second']:>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the inference latency and throughput of the NCF and retrieval paths.")
+    parser.add_argument("--paths", nargs="+", choices=["ncf", "retrieval"], default=["ncf", "retrieval"],
+                        help="Inference paths to benchmark")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=list(DEFAULT_BATCH_SIZES),
+                        help="Number of students per call")
+    parser.add_argument("--calls", type=int, default=200, help="Number of timed calls per batch size")
+    parser.add_argument("--data", nargs="+", default=list(DEFAULT_PERSONA_PATHS), help="Persona CSV files")
+    parser.add_argument("--model", default=NCF_MODEL_PATH, help="Path to the trained NCF model")
+    parser.add_argument("--ncf-backend", choices=["torch", "torchscript", "onnx"], default=NCF_INFERENCE_BACKEND,
+                        help="How to run a bundled NCF model")
+    parser.add_argument("--backend", choices=["chroma", "local"], default=RETRIEVAL_BACKEND,
+                        help="Retrieval backend to benchmark")
+    parser.add_argument("--output", default=None, help="Optional path of a JSON file to write the results to")
+    args = parser.parse_args()
+
+    personas = load_personas(args.data)
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "calls": args.calls,
+        "ncf_backend": args.ncf_backend,
+        "paths": {},
+    }
+    for path in args.paths:
+        try:
+            if path == "ncf":
+                results = benchmark_ncf(personas, args.batch_sizes, args.calls, args.model, args.ncf_backend)
+            else:
+                results = benchmark_retrieval(personas, args.batch_sizes, args.calls, args.backend)
+        except Exception as ex:
+            # A missing vector store should not lose the results of the other path
+            print(f"{path}: skipped ({type(ex).__name__}: {ex})")
+            report["paths"][path] = {"error": f"{type(ex).__name__}: {ex}"}
+            continue
+        print_results(path, results)
+        report["paths"][path] = {"results": results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
@@ -0,0 +1,73 @@
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from scripts.preprocessing_DL import build_course_labels
+
+
+def legacy_build_course_labels(df):
+    """
+    The original label construction of DataProcessor.preprocess_courses, kept as the baseline of the benchmark.
+
+    Args:
+        df (pd.DataFrame): A DataFrame with a "Recommendations" column. Course columns are added to it.
+
+    Returns:
+        list: The course names.
+    """
+    courses_list = set()
+    for recommendations in df['Recommendations']:
+        courses = [course.strip().replace("'", "") for course in recommendations.strip("[]").split(",")]
+        courses_list.update(courses)
+    courses_list = list(courses_list)
+    for course in courses_list:
+        df[course] = df['Recommendations'].apply(lambda x: int(course in x))
+    return courses_list
+
+
+def make_synthetic_recommendations(course_names, num_personas, courses_per_persona=5, seed=42):
+    """
+    Function to generate a synthetic "Recommendations" column.
+
+    Args:
+        course_names (list): The course names to sample from.
+        num_personas (int): The number of rows to generate.
+        courses_per_persona (int): The number of courses recommended to each persona.
+        seed (int): The random seed.
+
+    Returns:
+        pd.Series: The synthetic column, formatted like the labeled data.
+    """
+    rng = np.random.default_rng(seed)
+    # Sampling the first course of every row from a random permutation keeps the rows distinct
+    samples = np.argsort(rng.random((num_personas, len(course_names))), axis=1)[:, :courses_per_persona]
+    names = np.array([repr(name) for name in course_names], dtype=object)
+    return pd.Series(["[" + ", ".join(row) + "]" for row in names[samples]])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the construction of the multi-hot course labels.")
+    parser.add_argument("--data", default="data/processed/labeled_data_student_to_courseRecomm.csv",
+                        help="Labeled data file the course names are taken from")
+    parser.add_argument("--personas", type=int, default=1_000_000, help="Number of synthetic personas")
+    parser.add_argument("--legacy-personas", type=int, default=20_000,
+                        help="Number of personas the original implementation is timed on; it is extrapolated from there")
+    args = parser.parse_args()
+
+    course_names, _ = build_course_labels(pd.read_csv(args.data)['Recommendations'])
+    recommendations = make_synthetic_recommendations(course_names, args.personas)
+
+    start = time.perf_counter()
+    courses_list, labels = build_course_labels(recommendations)
+    vectorized_seconds = time.perf_counter() - start
+    print(f"Vectorized: {vectorized_seconds:.2f}s for {args.personas} personas and {len(courses_list)} courses "
+          f"({labels.nbytes / 2 ** 20:.0f} MiB of labels)")
+
+    legacy_df = pd.DataFrame({"Recommendations": recommendations[:args.legacy_personas]})
+    start = time.perf_counter()
+    legacy_build_course_labels(legacy_df)
+    legacy_seconds = (time.perf_counter() - start) * args.personas / len(legacy_df)
+    print(f"Original: {legacy_seconds:.2f}s extrapolated from {len(legacy_df)} personas "
+          f"({legacy_seconds / vectorized_seconds:.0f}x slower)")
@@ -0,0 +1,302 @@
+import re
+import json
+import time
+import zlib
+import asyncio
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from constants import LLM_STUB_LATENCY_SECONDS
+from scripts.benchmark_workers import client_process
+from scripts.precompute_topk import DEFAULT_PERSONA_PATHS, load_personas
+
+# Endpoint exercised by each scenario
+SCENARIOS = {
+    "llm": "/recommend-courses/",
+    "stream": "/recommend-courses/stream/",
+    "fast": "/recommend-courses/?mode=fast",
+    "ncf": "/predict-courses/",
+}
+
+
+class HashingEmbeddingFunction:
+    """
+    Offline stand-in for the Chroma embedding model: a normalized bag of hashed words.
+    It needs no model download, and optionally blocks for a fixed time per call to mimic a Chroma server round trip.
+    """
+
+    def __init__(self, dimensions=256, latency_seconds=0.0):
+        """
+        Initializes the embedding function.
+
+        Args:
+            dimensions (int): The number of hash buckets, and so of embedding dimensions.
+            latency_seconds (float): How long each call blocks, like the synchronous Chroma client does.
+        """
+        self.dimensions = dimensions
+        self.latency_seconds = latency_seconds
+
+    def __call__(self, input):
+        """
+        Embed texts.
+
+        Args:
+            input (list): The texts to embed.
+
+        Returns:
+            numpy.ndarray: The (texts, dimensions) float32 embeddings.
+        """
+        if self.latency_seconds > 0:
+            time.sleep(self.latency_seconds)
+        embeddings = np.zeros((len(input), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(input):
+            for word in re.findall(r"[a-z0-9]+", text.lower()):
+                embeddings[row, zlib.crc32(word.encode()) % self.dimensions] += 1
+        return embeddings
+
+
+def build_offline_collection(courses_path, index_dir, search_latency_seconds=0.0):
+    """
+    Function to build the local vector index of the course catalog with the hashing embedding function.
+
+    Args:
+        courses_path (str): The course catalog CSV.
+        index_dir (str): The directory to write the index to.
+        search_latency_seconds (float): How long each search blocks, on top of the search itself.
+
+    Returns:
+        scripts.local_vector_index.LocalVectorIndex: The collection standing in for Chroma.
+    """
+    from scripts.ingest_course_data import get_course_records, get_formatted_course_details_list
+    from scripts.local_vector_index import LocalVectorIndex, write_local_vector_index
+
+    courses_by_id = get_course_records(get_formatted_course_details_list(courses_path))
+    ids = list(courses_by_id)
+    write_local_vector_index(
+        ids,
+        [courses_by_id[doc_id][0] for doc_id in ids],
+        [courses_by_id[doc_id][1] for doc_id in ids],
+        index_dir=index_dir,
+        embedding_function=HashingEmbeddingFunction()
+    )
+    return LocalVectorIndex(index_dir, embedding_function=HashingEmbeddingFunction(latency_seconds=search_latency_seconds))
+
+
+def configure_server(collection, llm_latency_seconds, llm_chunks, caches, cache_dir):
+    """
+    Function to point the server at the offline stand-ins, replacing its lazily created collection, LLM client
+    and caches before the first request.
+
+    Args:
+        collection (scripts.local_vector_index.LocalVectorIndex): The offline course collection.
+        llm_latency_seconds (float): How long each fake LLM call takes.
+        llm_chunks (int): The number of chunks each fake streamed response is split into.
+        caches (bool): Whether to keep the LLM, search and NCF caches; without them every request does the full work.
+        cache_dir (str): The directory of the LLM cache database, when the caches are kept.
+
+    Returns:
+        fastapi.FastAPI: The configured application.
+    """
+    import util
+    import server
+    from llm_cache import LLMResponseCache
+    from llm_client import AsyncLLMClient, StubBackend
+    from scripts.inference_DL import NCFPredictor
+    from scripts.micro_batcher import MicroBatcher
+    from scripts.query_vector_db import __search_cache__
+
+    server.__chroma_collection__ = collection
+    util.__llm_client__ = AsyncLLMClient(StubBackend(llm_latency_seconds, " ".join(["course"] * llm_chunks)))
+    if caches:
+        server.__llm_cache__ = LLMResponseCache(path=f"{cache_dir}/llm_responses.sqlite3")
+        server.__ncf_batcher__ = MicroBatcher(NCFPredictor())
+    else:
+        server.__llm_cache__ = None
+        __search_cache__.max_entries = 0
+        server.__ncf_batcher__ = MicroBatcher(NCFPredictor(memo_max_entries=0, topk_table_path=None))
+    server.warm_up()
+    return server.app
+
+
+class EventLoopLagMonitor:
+    """
+    Measures how late the event loop wakes up a task sleeping at a fixed interval.
+    The lag is the time the loop spent blocked in other callbacks, such as a synchronous search or forward pass.
+    """
+
+    def __init__(self, interval_seconds=0.005):
+        """
+        Initializes the monitor.
+
+        Args:
+            interval_seconds (float): The sleep interval between two measurements.
+        """
+        self.interval_seconds = interval_seconds
+        self.lags = []
+        self.task = None
+
+    async def run(self):
+        """
+        Measure the lag of every wake-up until cancelled.
+        """
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval_seconds)
+            self.lags.append(max(time.perf_counter() - start - self.interval_seconds, 0.0))
+
+    def start(self):
+        """
+        Start measuring on the running loop.
+        """
+        self.lags = []
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self, elapsed):
+        """
+        Stop measuring and summarize the lag.
+
+        Args:
+            elapsed (float): The wall time the monitor ran for, in seconds.
+
+        Returns:
+            dict: The lag percentiles and maximum in milliseconds, and the total time the loop was blocked.
+        """
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        lags_ms = np.array(self.lags or [0.0]) * 1000
+        p50, p99 = np.percentile(lags_ms, [50, 99])
+        blocked_seconds = float(lags_ms.sum()) / 1000
+        return {
+            "loop_lag_p50_ms": float(p50),
+            "loop_lag_p99_ms": float(p99),
+            "loop_lag_max_ms": float(lags_ms.max()),
+            "loop_blocked_seconds": blocked_seconds,
+            "loop_blocked_fraction": blocked_seconds / elapsed,
+        }
+
+
+def summarize_run(results, elapsed):
+    """
+    Function to summarize the requests of one load level.
+
+    Args:
+        results (tuple): The latencies, times to the first byte and number of errors returned by `run_client`.
+        elapsed (float): The wall time of the run, in seconds.
+
+    Returns:
+        dict: The throughput, the latency and time to first byte percentiles in milliseconds, and the errors.
+    """
+    latencies, first_byte_latencies, errors = results
+    summary = {"requests": len(latencies), "errors": errors, "requests_per_second": len(latencies) / elapsed}
+    for name, values in (("latency", latencies), ("first_byte", first_byte_latencies)):
+        percentiles = np.percentile(np.array(values) * 1000, [50, 95, 99]) if values else (float("nan"),) * 3
+        for percentile, value in zip((50, 95, 99), percentiles):
+            summary[f"{name}_p{percentile}_ms"] = float(value)
+    return summary
+
+
+async def run_benchmark(app, profiles, scenarios, concurrency_levels, duration, port, warmup_seconds=1.0):
+    """
+    Function to serve the app in this process and load every scenario at increasing concurrency
+    from a separate load generator process, while measuring the lag of the server's event loop.
+
+    Args:
+        app (fastapi.FastAPI): The configured application.
+        profiles (list): The profiles to send.
+        scenarios (list): The names of the scenarios to run, keys of `SCENARIOS`.
+        concurrency_levels (list): The numbers of concurrent connections to run each scenario at.
+        duration (float): How long each load level runs, in seconds.
+        port (int): The port to serve on.
+        warmup_seconds (float): How long each scenario is loaded at concurrency 1 before it is measured.
+
+    Returns:
+        list: The summary of every (scenario, concurrency) run.
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if server_task.done():
+            server_task.result()
+        await asyncio.sleep(0.05)
+
+    loop = asyncio.get_running_loop()
+    monitor = EventLoopLagMonitor()
+    runs = []
+    try:
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for scenario in scenarios:
+                path = SCENARIOS[scenario]
+                if warmup_seconds > 0:
+                    await loop.run_in_executor(pool, client_process,
+                                               ("127.0.0.1", port, path, profiles, 1, warmup_seconds))
+                for concurrency in concurrency_levels:
+                    monitor.start()
+                    start = time.perf_counter()
+                    results = await loop.run_in_executor(pool, client_process,
+                                                         ("127.0.0.1", port, path, profiles, concurrency, duration))
+                    elapsed = time.perf_counter() - start
+                    run = {"scenario": scenario, "concurrency": concurrency, **summarize_run(results, elapsed),
+                           **await monitor.stop(elapsed)}
+                    runs.append(run)
+                    print(f"{scenario:>7} {concurrency:>5} {run['requests_per_second']:>9.1f} "
+                          f"{run['latency_p50_ms']:>9.1f} {run['latency_p95_ms']:>9.1f} {run['latency_p99_ms']:>9.1f} "
+                          f"{run['first_byte_p50_ms']:>9.1f} {run['loop_lag_p99_ms']:>9.2f} "
+                          f"{run['loop_lag_max_ms']:>9.2f} {run['loop_blocked_fraction']:>8.1%} {run['errors']:>6}",
+                          flush=True)
+    finally:
+        server.should_exit = True
+        await server_task
+    return runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the API offline, with a local retrieval stand-in and a fake LLM.")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help="Endpoints to load")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16, 64],
+                        help="Numbers of concurrent connections")
+    parser.add_argument("--duration", type=float, default=5, help="Seconds of load per concurrency level")
+    parser.add_argument("--llm-latency", type=float, default=LLM_STUB_LATENCY_SECONDS,
+                        help="Seconds each fake LLM call takes")
+    parser.add_argument("--llm-chunks", type=int, default=20, help="Chunks per fake streamed LLM response")
+    parser.add_argument("--search-latency-ms", type=float, default=0,
+                        help="Milliseconds each search blocks, to mimic a Chroma server round trip")
+    parser.add_argument("--caches", action="store_true",
+                        help="Keep the LLM, search and NCF caches instead of doing the full work on every request")
+    parser.add_argument("--courses", default="data/raw/courses.csv", help="Course catalog CSV")
+    parser.add_argument("--data", nargs="+", default=list(DEFAULT_PERSONA_PATHS), help="Persona CSV files")
+    parser.add_argument("--profiles", type=int, default=None,
+                        help="Number of distinct profiles to send; few profiles make identical concurrent requests")
+    parser.add_argument("--port", type=int, default=6951, help="Port to serve on")
+    parser.add_argument("--output", default=None, help="Optional path of a JSON file to write the results to")
+    args = parser.parse_args()
+
+    profiles = load_personas(args.data)[:args.profiles]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        collection = build_offline_collection(args.courses, f"{tmp_dir}/index", args.search_latency_ms / 1000)
+        app = configure_server(collection, args.llm_latency, args.llm_chunks, args.caches, tmp_dir)
+
+        print(f"{'scenario':>7} {'conc.':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+              f"{'ttfb ms':>9} {'lag p99':>9} {'lag max':>9} {'blocked':>8} {'errors':>6}")
+        runs = asyncio.run(run_benchmark(app, profiles, args.scenarios, args.concurrency, args.duration, args.port))
+
+    if args.output:
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "settings": {key: value for key, value in vars(args).items() if key not in ("data", "output")},
+            "runs": runs,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+import subprocess
+import multiprocessing
+
+import numpy as np
+
+from scripts.precompute_topk import DEFAULT_PERSONA_PATHS, load_personas
+
+
+def get_process_memory(pid):
+    """
+    Function to read the resident and proportional set sizes of a process.
+    The proportional set size splits each shared page between the processes sharing it,
+    so summing it over the workers shows how much memory the copy-on-write sharing saves.
+
+    Args:
+        pid (int): The process id.
+
+    Returns:
+        dict: The "rss_mb" and "pss_mb" of the process.
+    """
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("Rss", "Pss"):
+                memory[f"{name.lower()}_mb"] = int(value.split()[0]) / 1024
+    return memory
+
+
+def get_server_memory(parent_pid):
+    """
+    Function to sum the memory of the launcher and its workers.
+
+    Args:
+        parent_pid (int): The pid of the `serve.py` launcher.
+
+    Returns:
+        dict: The summed "rss_mb" and "pss_mb", and the number of processes.
+    """
+    with open(f"/proc/{parent_pid}/task/{parent_pid}/children", 'r') as f:
+        pids = [parent_pid] + [int(pid) for pid in f.read().split()]
+    memories = [get_process_memory(pid) for pid in pids]
+    return {
+        "processes": len(pids),
+        "rss_mb": sum(memory["rss_mb"] for memory in memories),
+        "pss_mb": sum(memory["pss_mb"] for memory in memories),
+    }
+
+
+async def read_body(reader, head):
+    """
+    Function to read the body of a response, sized by its Content-Length or sent with chunked transfer encoding.
+
+    Args:
+        reader (asyncio.StreamReader): The connection's reader, positioned after the headers.
+        head (bytes): The status line and headers of the response.
+
+    Returns:
+        float: The `time.perf_counter()` at which the first byte of the body arrived.
+    """
+    headers = {}
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        headers[name.strip().lower()] = value.strip()
+    if headers.get(b"transfer-encoding", b"").lower() != b"chunked":
+        await reader.readexactly(int(headers.get(b"content-length", 0)))
+        return time.perf_counter()
+
+    first_byte_at = None
+    while True:
+        size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+        await reader.readexactly(size + 2)
+        if first_byte_at is None:
+            first_byte_at = time.perf_counter()
+        # The server sends no trailers, so the last chunk is followed by an empty line only
+        if size == 0:
+            return first_byte_at
+
+
+async def post_json(reader, writer, host, path, payload):
+    """
+    Function to send one HTTP/1.1 keep-alive POST request on an open connection and read the whole response.
+    A minimal client keeps the load generator cheap, so it does not compete with the server for the CPU.
+
+    Args:
+        reader (asyncio.StreamReader): The connection's reader.
+        writer (asyncio.StreamWriter): The connection's writer.
+        host (str): The value of the Host header.
+        path (str): The request path.
+        payload (bytes): The JSON body.
+
+    Returns:
+        tuple: The HTTP status code, and the `time.perf_counter()` at which the first byte of the body arrived.
+    """
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+    )
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    first_byte_at = await read_body(reader, head)
+    return status, first_byte_at
+
+
+async def run_client(host, port, path, profiles, concurrency, duration):
+    """
+    Function to send requests from concurrent keep-alive connections for a fixed duration.
+
+    Args:
+        host (str): The server host.
+        port (int): The server port.
+        path (str): The endpoint to post the profiles to.
+        profiles (list): The profiles to send, in turn.
+        concurrency (int): The number of concurrent connections.
+        duration (float): How long to send requests for, in seconds.
+
+    Returns:
+        tuple: The latency and the time to the first byte of the body of each successful request in seconds,
+            and the number of failed requests.
+    """
+    payloads = [json.dumps(profile).encode() for profile in profiles]
+    latencies = []
+    first_byte_latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def connection(offset):
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        idx = offset
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    status, first_byte_at = await post_json(reader, writer, host, path, payloads[idx % len(payloads)])
+                except (OSError, asyncio.IncompleteReadError):
+                    errors += 1
+                    writer.close()
+                    reader, writer = await asyncio.open_connection(host, port)
+                    continue
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+                    first_byte_latencies.append(first_byte_at - start)
+                else:
+                    errors += 1
+                idx += concurrency
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(connection(offset) for offset in range(concurrency)))
+    return latencies, first_byte_latencies, errors
+
+
+def client_process(args):
+    """
+    Function run by each load generator process.
+
+    Args:
+        args (tuple): The host, port, path, profiles, concurrency and duration passed to `run_client`.
+
+    Returns:
+        tuple: The latencies, the times to the first byte and the number of errors of this process.
+    """
+    return asyncio.run(run_client(*args))
+
+
+def wait_until_ready(url, timeout=120):
+    """
+    Function to wait for the server to answer its health check.
+
+    Args:
+        url (str): The base url of the server.
+        timeout (float): How long to wait, in seconds.
+    """
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url + "/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"The server at {url} did not start within {timeout}s")
+
+
+def benchmark_workers(num_workers, profiles, port, client_processes, concurrency, duration, endpoint):
+    """
+    Function to start `serve.py` with a number of workers, load it, and measure throughput, latency and memory.
+
+    Args:
+        num_workers (int): The number of server workers.
+        profiles (list): The profiles to send.
+        port (int): The port to run the server on.
+        client_processes (int): The number of load generator processes.
+        concurrency (int): The number of concurrent connections per load generator process.
+        duration (float): How long to load the server, in seconds.
+        endpoint (str): The endpoint path to post the profiles to.
+
+    Returns:
+        dict: The throughput, latency percentiles, errors and memory of the run.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # Every request runs the model: no memoization and no precomputed table
+    env = dict(os.environ, LLM_BACKEND="stub", NCF_MEMO_MAX_ENTRIES="0", NCF_TOPK_TABLE_PATH="")
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(num_workers), "--port", str(port), "--host", "127.0.0.1",
+         "--log-level", "warning"],
+        cwd=root, env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(url)
+        memory_idle = get_server_memory(server.pid)
+
+        with multiprocessing.get_context("spawn").Pool(client_processes) as pool:
+            chunks = [profiles[idx::client_processes] for idx in range(client_processes)]
+            start = time.perf_counter()
+            results = pool.map(client_process, [("127.0.0.1", port, endpoint, chunk, concurrency, duration)
+                                                for chunk in chunks])
+            elapsed = time.perf_counter() - start
+        memory_loaded = get_server_memory(server.pid)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    latencies = np.concatenate([np.array(latencies) for latencies, _, _ in results]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (float("nan"),) * 3
+    return {
+        "workers": num_workers,
+        "requests": int(len(latencies)),
+        "errors": int(sum(errors for _, _, errors in results)),
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "memory_idle": memory_idle,
+        "memory_loaded": memory_loaded,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure how the throughput of serve.py scales with its number of workers.")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4], help="Numbers of workers to compare")
+    parser.add_argument("--endpoint", default="/predict-courses/", help="Endpoint to post the profiles to")
+    parser.add_argument("--clients", type=int, default=1, help="Number of load generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent connections per load generator")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load per run")
+    parser.add_argument("--port", type=int, default=6950, help="Port to run the server on")
+    parser.add_argument("--data", nargs="+", default=list(DEFAULT_PERSONA_PATHS), help="Persona CSV files")
+    parser.add_argument("--output", default=None, help="Optional path of a JSON file to write the results to")
+    args = parser.parse_args()
+
+    profiles = load_personas(args.data)
+    report = {"cpus": os.cpu_count(), "clients": args.clients, "concurrency": args.concurrency, "runs": []}
+    for num_workers in args.workers:
+        result = benchmark_workers(num_workers, profiles, args.port, args.clients, args.concurrency, args.duration,
+                                   args.endpoint)
+        report["runs"].append(result)
+        print(f"{num_workers} workers: {result['requests_per_second']:.0f} req/s, p50 {result['p50_ms']:.1f} ms, "
+              f"p99 {result['p99_ms']:.1f} ms, {result['errors']} errors | "
+              f"RSS {result['memory_loaded']['rss_mb']:.0f} MB, PSS {result['memory_loaded']['pss_mb']:.0f} MB",
+              flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
@@ -0,0 +1,122 @@
+import io
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+import torch
+
+from constants import NCF_MODEL_PATH
+from scripts.inference_DL import NCFPredictor
+from scripts.preprocessing_DL import build_course_labels
+from scripts.test_evaluate_DL import ranking_metric_sums
+from scripts.benchmark_inference import make_batches, summarize_latencies, time_calls
+
+
+def get_model_bytes(model):
+    """
+    Function to measure the serialized size of the weights of a model.
+
+    Args:
+        model (torch.nn.Module): The model.
+
+    Returns:
+        int: The size of its state_dict, in bytes.
+    """
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+
+def get_ranking_metrics(probabilities, labels, ks=(5, 10)):
+    """
+    Function to compute the ranking metrics of predicted probabilities against the labeled courses.
+
+    Args:
+        probabilities (numpy.ndarray): The (students, courses) predicted probabilities.
+        labels (numpy.ndarray): The (students, courses) multi-hot labeled courses.
+        ks (tuple): The cut-offs to compute the metrics at.
+
+    Returns:
+        dict: The metrics averaged over the students, keyed like "precision@5".
+    """
+    metrics = {}
+    for k in ks:
+        sums = ranking_metric_sums(torch.from_numpy(probabilities), torch.from_numpy(labels), k)
+        for name in ("precision", "recall", "ndcg", "hit_rate"):
+            metrics[f"{name}@{k}"] = sums[name] / max(sums["students"], 1)
+    return metrics
+
+
+def compare_quantization(model_path, data_path, batch_sizes=(1, 32, 256), num_calls=200, top_k=5):
+    """
+    Function to compare the float32 and the dynamic int8 NCF model on accuracy, latency and size.
+
+    Args:
+        model_path (str): The path to the trained model.
+        data_path (str): The labeled CSV the ranking metrics are computed on.
+        batch_sizes (tuple): The batch sizes the latency is measured at.
+        num_calls (int): The number of timed calls per batch size.
+        top_k (int): The cut-off the two models' rankings are compared at.
+
+    Returns:
+        dict: The results of each model, and the agreement between them.
+    """
+    df = pd.read_csv(data_path)
+    predictors = {
+        "fp32": NCFPredictor(model_path, memo_max_entries=0, topk_table_path=None, quantize=False),
+        "int8": NCFPredictor(model_path, memo_max_entries=0, topk_table_path=None, quantize=True),
+    }
+    reference = predictors["fp32"]
+    keys = [reference.feature_key(student) for student in df.to_dict("records")]
+    # Courses missing from the model's vocabulary cannot be recommended and are left out of the labels
+    _, labels = build_course_labels(df["Recommendations"], reference.courses_list)
+
+    results = {}
+    probabilities = {}
+    for name, predictor in predictors.items():
+        probabilities[name] = predictor.predict_proba_keys(keys)
+        results[name] = {
+            "metrics": get_ranking_metrics(probabilities[name], labels),
+            "model_bytes": get_model_bytes(predictor.model),
+            "latency": [
+                summarize_latencies(time_calls(predictor.predict_proba_keys, make_batches(keys, batch_size, num_calls)),
+                                    batch_size)
+                for batch_size in batch_sizes
+            ],
+        }
+
+    # How often the int8 model recommends the same courses as the float32 model
+    top_fp32 = np.argsort(-probabilities["fp32"], axis=1, kind="stable")[:, :top_k]
+    top_int8 = np.argsort(-probabilities["int8"], axis=1, kind="stable")[:, :top_k]
+    overlap = [len(set(a) & set(b)) / top_k for a, b in zip(top_fp32, top_int8)]
+    results["agreement"] = {
+        f"top{top_k}_overlap": float(np.mean(overlap)),
+        f"top{top_k}_identical_rate": float(np.mean((top_fp32 == top_int8).all(axis=1))),
+        "max_probability_difference": float(np.abs(probabilities["fp32"] - probabilities["int8"]).max()),
+    }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the float32 and dynamic int8 NCF models.")
+    parser.add_argument("--model", default=NCF_MODEL_PATH, help="Path to the trained NCF model")
+    parser.add_argument("--data", default="data/processed/labeled_data_student_to_courseRecomm.csv",
+                        help="Labeled CSV the ranking metrics are computed on")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 32, 256], help="Batch sizes to time")
+    parser.add_argument("--calls", type=int, default=200, help="Number of timed calls per batch size")
+    parser.add_argument("--output", default=None, help="Optional path of a JSON file to write the results to")
+    args = parser.parse_args()
+
+    results = compare_quantization(args.model, args.data, tuple(args.batch_sizes), args.calls)
+    for name in ("fp32", "int8"):
+        result = results[name]
+        metrics = ", ".join(f"{metric} {value:.4f}" for metric, value in result["metrics"].items())
+        latency = ", ".join(f"batch {entry['batch_size']}: p50 {entry['p50_ms']:.3f} ms" for entry in result["latency"])
+        print(f"{name}: {result['model_bytes'] / 1024:.0f} KiB | {metrics}")
+        print(f"{'':>6}{latency}")
+    print("agreement:", ", ".join(f"{name} {value:.4f}" for name, value in results["agreement"].items()))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,51 @@
+import argparse
+
+import torch
+
+from constants import NCF_MODEL_PATH
+from scripts.inference_DL import load_model
+from scripts.train_model_DL import SparseNCFModel
+
+
+def convert_to_sparse_model(model_path, output_path, num_checks=256, active_features=4):
+    """
+    Function to convert a dense NCF checkpoint into an equivalent SparseNCFModel checkpoint.
+    The two models are compared on random students before the sparse one is saved.
+
+    Args:
+        model_path (str): The path to the trained dense NCF model.
+        output_path (str): The path to save the sparse model to.
+        num_checks (int): The number of random students the two models are compared on.
+        active_features (int): The number of active features of each random student.
+
+    Returns:
+        float: The largest absolute difference between the probabilities of the two models.
+    """
+    dense_model = load_model(model_path)
+    sparse_model = SparseNCFModel.from_dense(dense_model)
+
+    # Comparing the models on random one-hot students
+    num_features = dense_model.fc1.in_features
+    indices = torch.randint(num_features, (num_checks, active_features))
+    one_hot = torch.zeros(num_checks, num_features)
+    one_hot.scatter_(1, indices, 1.0)
+    # Duplicate indices count once in the one-hot vector, so the sparse input is taken from it
+    sparse_indices = one_hot.nonzero()
+    offsets = torch.searchsorted(sparse_indices[:, 0].contiguous(), torch.arange(num_checks))
+    with torch.no_grad():
+        max_difference = (dense_model(one_hot) - sparse_model(sparse_indices[:, 1], offsets)).abs().max().item()
+    if max_difference > 1e-5:
+        raise ValueError(f"The sparse model differs from the dense model by up to {max_difference}")
+
+    torch.save(sparse_model, output_path)
+    return max_difference
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a dense NCF checkpoint into an index-based SparseNCFModel.")
+    parser.add_argument("--model", default=NCF_MODEL_PATH, help="Path to the trained dense model")
+    parser.add_argument("--output", default="models/ncf_model_sparse.pth", help="Path to save the sparse model to")
+    args = parser.parse_args()
+
+    max_difference = convert_to_sparse_model(args.model, args.output)
+    print(f"[+] Saved the sparse model to {args.output} (max difference {max_difference:.2e})")
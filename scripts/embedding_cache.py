@@ -0,0 +1,354 @@
+import os
+import json
+import fcntl
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from constants import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_ENABLED, QUERY_EMBEDDING_CACHE_MAX_ENTRIES
+
+KEYS_FILE_NAME = "keys.bin"
+VECTORS_FILE_NAME = "vectors.f32"
+METADATA_FILE_NAME = "metadata.json"
+LOCK_FILE_NAME = "lock"
+# Size of the SHA-256 digest keying every embedding
+KEY_SIZE = 32
+
+# Process-wide embedding model and the embedding functions wrapping it, created on first use
+__embedding_model__ = None
+__default_embedding_function__ = None
+__query_embedding_function__ = None
+
+
+def get_text_digest(text):
+    """
+    Function to compute the content key of a text.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        bytes: The SHA-256 digest of the UTF-8 encoded text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    On-disk, content-addressed store of embeddings: the SHA-256 of a text maps to its embedding.
+
+    The embeddings are appended as float32 rows to a file that is read through a memory map, and their keys are
+    appended, in the same order, to a second file. Appends from several processes (ingestion runs, server workers)
+    are serialized with a file lock, and every process picks up the rows added by the others when it next misses.
+    """
+
+    def __init__(self, cache_dir):
+        """
+        Initializes the cache, reading the keys stored so far.
+
+        Args:
+            cache_dir (str): The directory of the store. Each embedding model needs its own directory.
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.keys_path = os.path.join(cache_dir, KEYS_FILE_NAME)
+        self.vectors_path = os.path.join(cache_dir, VECTORS_FILE_NAME)
+        self.metadata_path = os.path.join(cache_dir, METADATA_FILE_NAME)
+        self.lock_path = os.path.join(cache_dir, LOCK_FILE_NAME)
+        self.dimensions = None
+        self.rows = {}
+        self.num_rows = 0
+        self.vectors = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        with self.lock:
+            self.refresh()
+
+    def refresh(self):
+        """
+        Read the keys appended since the last refresh. Must be called with the lock held.
+        """
+        if self.dimensions is None and os.path.exists(self.metadata_path):
+            with open(self.metadata_path, 'r') as f:
+                self.dimensions = json.load(f)["dimensions"]
+        if not os.path.exists(self.keys_path):
+            return
+        num_rows = os.path.getsize(self.keys_path) // KEY_SIZE
+        if num_rows <= self.num_rows:
+            return
+        with open(self.keys_path, 'rb') as f:
+            f.seek(self.num_rows * KEY_SIZE)
+            keys = f.read((num_rows - self.num_rows) * KEY_SIZE)
+        for idx in range(num_rows - self.num_rows):
+            self.rows[keys[idx * KEY_SIZE:(idx + 1) * KEY_SIZE]] = self.num_rows + idx
+        self.num_rows = num_rows
+
+    def get_vectors(self):
+        """
+        Get the memory map of the stored embeddings, mapping it again if rows were added since. Must be called with the lock held.
+
+        Returns:
+            numpy.memmap: The (rows, dimensions) float32 embeddings.
+        """
+        if self.vectors is None or len(self.vectors) < self.num_rows:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self.num_rows, self.dimensions))
+        return self.vectors
+
+    def get_many(self, keys):
+        """
+        Look up embeddings by content key.
+
+        Args:
+            keys (list): The content keys, from `get_text_digest`.
+
+        Returns:
+            list: The embedding (a float32 array) of each key, or None for the keys not in the store.
+        """
+        with self.lock:
+            if any(key not in self.rows for key in keys):
+                self.refresh()
+            found = [self.rows.get(key) for key in keys]
+            hits = sum(row is not None for row in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+            if not hits:
+                return [None] * len(keys)
+            vectors = self.get_vectors()
+            return [np.array(vectors[row]) if row is not None else None for row in found]
+
+    def put_many(self, keys, embeddings):
+        """
+        Store embeddings under their content keys. Keys already in the store are skipped.
+
+        Args:
+            keys (list): The content keys, from `get_text_digest`.
+            embeddings (list): The embedding of each key.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(keys), -1)
+        with self.lock, open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                if self.dimensions is None:
+                    self.dimensions = embeddings.shape[1]
+                    with open(self.metadata_path, 'w') as f:
+                        json.dump({"dimensions": self.dimensions}, f)
+                elif embeddings.shape[1] != self.dimensions:
+                    raise ValueError(f"Embeddings of size {embeddings.shape[1]} cannot be stored in {self.cache_dir}, "
+                                     f"which holds embeddings of size {self.dimensions}")
+
+                new_keys = []
+                new_rows = []
+                for key, embedding in zip(keys, embeddings):
+                    if key not in self.rows and key not in new_keys:
+                        new_keys.append(key)
+                        new_rows.append(embedding)
+                if not new_keys:
+                    return
+
+                # Rows are written before their keys, so a key is never read without its row.
+                # Rows left without keys by an interrupted append are overwritten.
+                with open(self.vectors_path, 'ab') as f:
+                    f.truncate(self.num_rows * self.dimensions * 4)
+                    f.write(np.stack(new_rows).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                with open(self.keys_path, 'ab') as f:
+                    f.write(b"".join(new_keys))
+                for idx, key in enumerate(new_keys):
+                    self.rows[key] = self.num_rows + idx
+                self.num_rows += len(new_keys)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: The number of hits, misses and stored embeddings.
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": self.num_rows}
+
+
+class CachedEmbeddingFunction:
+    """
+    Embedding function that only runs the wrapped model on texts it has not embedded before.
+    """
+
+    def __init__(self, embedding_function, cache):
+        """
+        Initializes the embedding function.
+
+        Args:
+            embedding_function (callable): The embedding function to wrap, called with a list of texts.
+            cache (EmbeddingCache): The store of the embeddings of the wrapped function.
+        """
+        self.embedding_function = embedding_function
+        self.cache = cache
+
+    def __call__(self, input):
+        """
+        Embed texts, reading the ones already embedded from the cache and embedding the others in one batch.
+
+        Args:
+            input (list): The texts to embed.
+
+        Returns:
+            list: The float32 embedding of each text.
+        """
+        keys = [get_text_digest(text) for text in input]
+        embeddings = self.cache.get_many(keys)
+
+        missing = {}
+        for idx, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(keys[idx], input[idx])
+        if missing:
+            missing_keys = list(missing)
+            new_embeddings = np.asarray(self.embedding_function([missing[key] for key in missing_keys]), dtype=np.float32)
+            self.cache.put_many(missing_keys, new_embeddings)
+            new_embeddings = dict(zip(missing_keys, new_embeddings))
+            embeddings = [new_embeddings[key] if embedding is None else embedding
+                          for key, embedding in zip(keys, embeddings)]
+        return embeddings
+
+
+class QueryEmbeddingCache:
+    """
+    Embedding function keeping the embeddings of the most recently embedded texts in a size-bounded,
+    thread-safe LRU cache. Used for search phrases, which are user supplied and unbounded in number,
+    so they are not added to the on-disk store.
+    """
+
+    def __init__(self, embedding_function, max_entries=QUERY_EMBEDDING_CACHE_MAX_ENTRIES):
+        """
+        Initializes the embedding function.
+
+        Args:
+            embedding_function (callable): The embedding function to wrap, called with a list of texts.
+            max_entries (int): The maximum number of embeddings kept.
+        """
+        self.embedding_function = embedding_function
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, input):
+        """
+        Embed texts, reading the recently embedded ones from the cache and embedding the others in one batch.
+
+        Args:
+            input (list): The texts to embed.
+
+        Returns:
+            list: The float32 embedding of each text.
+        """
+        with self.lock:
+            embeddings = [self.entries.get(text) for text in input]
+            for text, embedding in zip(input, embeddings):
+                if embedding is not None:
+                    self.entries.move_to_end(text)
+            hits = sum(embedding is not None for embedding in embeddings)
+            self.hits += hits
+            self.misses += len(input) - hits
+
+        missing = list(dict.fromkeys(text for text, embedding in zip(input, embeddings) if embedding is None))
+        if missing:
+            new_embeddings = dict(zip(missing, np.asarray(self.embedding_function(missing), dtype=np.float32)))
+            with self.lock:
+                for text, embedding in new_embeddings.items():
+                    self.entries[text] = embedding
+                    self.entries.move_to_end(text)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            embeddings = [new_embeddings[text] if embedding is None else embedding
+                          for text, embedding in zip(input, embeddings)]
+        return embeddings
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: The number of hits, misses and stored embeddings.
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+
+def get_embedding_model():
+    """
+    Function to get the process-wide embedding model: the one the Chroma server embeds with by default.
+
+    Returns:
+        callable: The embedding function, called with a list of texts.
+    """
+    global __embedding_model__
+    if __embedding_model__ is None:
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+        __embedding_model__ = DefaultEmbeddingFunction()
+    return __embedding_model__
+
+
+def get_default_embedding_function():
+    """
+    Function to get the process-wide embedding function of the ingested documents: the embedding model,
+    behind the embedding cache unless `EMBEDDING_CACHE_ENABLED` is off.
+
+    Returns:
+        callable: The embedding function, called with a list of texts.
+    """
+    global __default_embedding_function__
+    if __default_embedding_function__ is None:
+        embedding_function = get_embedding_model()
+        if EMBEDDING_CACHE_ENABLED:
+            cache = EmbeddingCache(os.path.join(EMBEDDING_CACHE_DIR, type(embedding_function).__name__))
+            embedding_function = CachedEmbeddingFunction(embedding_function, cache)
+        __default_embedding_function__ = embedding_function
+    return __default_embedding_function__
+
+
+def get_query_embedding_function():
+    """
+    Function to get the process-wide embedding function of the search phrases: the embedding model,
+    behind an in-memory LRU cache of `QUERY_EMBEDDING_CACHE_MAX_ENTRIES` embeddings.
+
+    Returns:
+        callable: The embedding function, called with a list of texts.
+    """
+    global __query_embedding_function__
+    if __query_embedding_function__ is None:
+        __query_embedding_function__ = QueryEmbeddingCache(get_embedding_model())
+    return __query_embedding_function__
+
+
+def get_embedding_cache_stats():
+    """
+    Function to get the counters of the default embedding function's cache.
+
+    Returns:
+        dict: The number of hits, misses and stored embeddings; empty until the default embedding function is
+            first used, or if the cache is disabled.
+    """
+    if isinstance(__default_embedding_function__, CachedEmbeddingFunction):
+        return __default_embedding_function__.cache.stats()
+    return {}
+
+
+def get_query_embedding_cache_stats():
+    """
+    Function to get the counters of the query embedding function's cache.
+
+    Returns:
+        dict: The number of hits, misses and stored embeddings; empty until the query embedding function is first used.
+    """
+    if __query_embedding_function__ is not None:
+        return __query_embedding_function__.stats()
+    return {}
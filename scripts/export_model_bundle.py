@@ -0,0 +1,66 @@
+import json
+import time
+import argparse
+
+from constants import NCF_MODEL_PATH, NCF_USER_FEATURES_PATH, NCF_COURSES_LIST_PATH, NCF_BUNDLE_EXPORTS
+from scripts.inference_DL import load_model
+from scripts.model_bundle import save_model_bundle, load_model_bundle
+
+
+def export_model_bundle(model_path, output_dir, user_features_path=NCF_USER_FEATURES_PATH,
+                        courses_list_path=NCF_COURSES_LIST_PATH, exports=NCF_BUNDLE_EXPORTS):
+    """
+    Function to convert a pickled NCF model and its vocabulary files into a model bundle.
+
+    Args:
+        model_path (str): The path to the pickled dense model.
+        output_dir (str): The directory of the bundle to write.
+        user_features_path (str): The path to the JSON list of one-hot user feature names.
+        courses_list_path (str): The path to the JSON list of course names.
+        exports (tuple): The exports to include, among "torchscript" and "onnx".
+
+    Returns:
+        dict: The metadata of the bundle.
+    """
+    with open(user_features_path, 'r') as f:
+        user_features = json.load(f)
+    with open(courses_list_path, 'r') as f:
+        courses_list = json.load(f)
+    return save_model_bundle(load_model(model_path), user_features, courses_list, output_dir, exports)
+
+
+def time_load(function, repeat):
+    """
+    Function to measure the best wall time of loading a model.
+
+    Args:
+        function (callable): The function loading the model.
+        repeat (int): The number of loads.
+
+    Returns:
+        float: The fastest load, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a pickled NCF model into a versioned model bundle.")
+    parser.add_argument("--model", default="models/ncf_model_full.pth", help="Path to the pickled model")
+    parser.add_argument("--output", default=NCF_MODEL_PATH, help="Directory of the bundle to write")
+    parser.add_argument("--exports", nargs="*", choices=["torchscript", "onnx"], default=list(NCF_BUNDLE_EXPORTS),
+                        help="Exports to include in the bundle")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of loads timed per format")
+    args = parser.parse_args()
+
+    metadata = export_model_bundle(args.model, args.output, exports=tuple(args.exports))
+    print(f"[+] Saved model bundle {metadata['model_version']} to {args.output}")
+
+    print(f"Pickled model: {time_load(lambda: load_model(args.model), args.repeat) * 1000:.2f} ms")
+    for backend in ["torch", *args.exports]:
+        seconds = time_load(lambda: load_model_bundle(args.output, backend), args.repeat)
+        print(f"Bundle ({backend}): {seconds * 1000:.2f} ms")
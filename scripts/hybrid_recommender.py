@@ -0,0 +1,82 @@
+import numpy as np
+
+from constants import HYBRID_NCF_WEIGHT, HYBRID_RETRIEVAL_WEIGHT, HYBRID_RRF_K, HYBRID_NCF_CANDIDATES
+from util import clean_text
+
+
+def get_display_title(metadata: dict):
+    """
+    Function to get the original course title of a search result, as shown in its display text.
+
+    Args:
+        metadata (dict): The metadata of the search result.
+
+    Returns:
+        str: The course title, or the cleaned title if the display text has no title line.
+    """
+    for line in metadata.get("display_text", "").split("\n"):
+        if line.startswith("Title: "):
+            return line[len("Title: "):].strip()
+    return metadata.get("title", "")
+
+
+def fuse_recommendations(predictor, new_student: dict, search_results: dict, top_k: int = 5,
+                         ncf_weight: float = HYBRID_NCF_WEIGHT, retrieval_weight: float = HYBRID_RETRIEVAL_WEIGHT,
+                         rrf_k: float = HYBRID_RRF_K, ncf_candidates: int = HYBRID_NCF_CANDIDATES, probabilities=None):
+    """
+    Function to fuse the NCF ranking and the vector search ranking into one deterministic ranking.
+
+    Each course scores `weight / (rrf_k + rank)` in every ranking it appears in (weighted reciprocal rank fusion).
+    Courses from both rankings are matched on their cleaned title. Ties are broken by title, so equal inputs
+    always give the same output.
+
+    Args:
+        predictor (scripts.inference_DL.NCFPredictor): The NCF predictor.
+        new_student (dict): The student's profile.
+        search_results (dict): The results of `perform_search` for the student's profile.
+        top_k (int): The number of courses to return.
+        ncf_weight (float): The weight of the NCF ranking.
+        retrieval_weight (float): The weight of the vector search ranking.
+        rrf_k (float): The rank offset damping the influence of the top ranks.
+        ncf_candidates (int): The number of top NCF courses taking part in the fusion.
+        probabilities (numpy.ndarray, optional): The student's course probabilities, when already computed
+            (e.g. by the server's micro-batcher). By default they are computed with `predictor.predict_proba`.
+
+    Returns:
+        list: The fused top courses, best first, as dicts with the title, the fused score, the NCF probability
+            and the search distance (None where the course was not ranked), and the display text if it was retrieved.
+    """
+    candidates = {}
+
+    # Ranking the courses with the NCF model
+    if probabilities is None:
+        probabilities = predictor.predict_proba(new_student)
+    ncf_ranking = np.argsort(-probabilities, kind="stable")[:ncf_candidates]
+    for rank, course_idx in enumerate(ncf_ranking):
+        title = predictor.courses_list[course_idx]
+        candidate = candidates.setdefault(clean_text(title), {
+            "title": title, "score": 0.0, "ncf_probability": None, "retrieval_distance": None, "display_text": None
+        })
+        candidate["score"] += ncf_weight / (rrf_k + rank + 1)
+        candidate["ncf_probability"] = float(probabilities[course_idx])
+
+    # Adding the vector search ranking
+    metadata_list = (search_results.get("metadatas") or [[]])[0]
+    distances = (search_results.get("distances") or [[None] * len(metadata_list)])[0]
+    seen = set()
+    for rank, (metadata, distance) in enumerate(zip(metadata_list, distances)):
+        title = get_display_title(metadata)
+        key = clean_text(title)
+        # Cross-listed courses share a title; only the best ranked one counts
+        if key in seen:
+            continue
+        seen.add(key)
+        candidate = candidates.setdefault(key, {
+            "title": title, "score": 0.0, "ncf_probability": None, "retrieval_distance": None, "display_text": None
+        })
+        candidate["score"] += retrieval_weight / (rrf_k + rank + 1)
+        candidate["retrieval_distance"] = float(distance) if distance is not None else None
+        candidate["display_text"] = metadata.get("display_text")
+
+    fused = sorted(candidates.values(), key=lambda candidate: (-candidate["score"], candidate["title"]))
+    return fused[:top_k]
@@ -1,55 +1,437 @@
-import pandas as pd
+import os
+import sys
 import torch
 import numpy as np
 import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
 
-def predict(new_student, model_path):
+from constants import (
+    NCF_MODEL_PATH, NCF_USER_FEATURES_PATH, NCF_COURSES_LIST_PATH, NCF_FEATURE_COLUMNS, NCF_MEMO_MAX_ENTRIES,
+    NCF_TOPK_TABLE_PATH, NCF_SPARSE_INPUT, NCF_INFERENCE_BACKEND, NCF_QUANTIZE
+)
+from scripts.model_bundle import get_file_sha256, is_model_bundle, load_model_bundle
+
+logger = logging.getLogger(__name__)
+
+
+def load_model(model_path, backend=NCF_INFERENCE_BACKEND):
     """
-    Predict the top 5 course recommendations for a new student.
+    Load an NCF model on the CPU and set it to evaluation mode.
+
+    The model path is either a model bundle (see `scripts.model_bundle`), or a legacy pickled model.
+    Legacy checkpoints were pickled from inside the scripts directory, so they refer to their class as
+    `train_model_DL.NCFModel`. The module is aliased here so that they also unpickle from the repository root.
 
     Args:
-    new_student (dict): A dictionary containing the new student's features.
-    model_path (str): The path to the trained neural collaborative filtering model.
+        model_path (str): The path to the trained neural collaborative filtering model.
+        backend (str): How to run a bundled model: "torch", "torchscript" or "onnx". Pickled models always run on torch.
 
     Returns:
-    list: A list of the top 5 recommended courses for the new student.
+        torch.nn.Module: The loaded model.
     """
-    print(new_student)
-    # Load user features from JSON file as a list
-    with open('data/processed/user_features.json', 'r') as f:
-        user_features_cols = json.load(f)
+    if is_model_bundle(model_path):
+        return load_model_bundle(model_path, backend)[0]
 
-    # Load courses list from JSON file as a list
-    with open('data/processed/courses_list.json', 'r') as f:
-        courses_list = json.load(f)
+    from scripts import train_model_DL
+    sys.modules.setdefault("train_model_DL", train_model_DL)
+    model = torch.load(model_path, map_location="cpu", weights_only=False)
+    model.eval()
+    return model
 
-    # Create a DataFrame for the new student with all columns initialized to zero
-    new_student_df = pd.DataFrame(0, index=[0], columns=user_features_cols)
 
-    # Update the DataFrame with new student data by setting the appropriate fields
-    for key in new_student:
-        feature_name = key + "_" + new_student[key]
-        if feature_name in new_student_df.columns:
-            new_student_df.loc[0, feature_name] = 1
+def quantize_model(model):
+    """
+    Quantize the Linear layers of an NCF model to int8 with dynamic quantization.
 
-    # Convert the DataFrame to a PyTorch tensor
-    new_student_tensor = torch.tensor(new_student_df.values.astype(np.float32))
+    Weights are stored as int8 and activations are quantized on the fly for each batch, which makes the
+    model about 4x smaller and its matrix products cheaper on CPU, at a small loss of precision.
+    The first layer of a SparseNCFModel is an embedding bag and stays in float32.
 
-    # Load the model and set it to evaluation mode
-    model = torch.load(model_path)
-    model.eval()
+    Args:
+        model (torch.nn.Module): The float32 model, in evaluation mode.
+
+    Returns:
+        torch.nn.Module: The quantized model.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class NCFPredictor:
+    """
+    Long-lived predictor for the NCF model.
+
+    The model and the feature/course vocabularies are loaded once when the predictor is created,
+    so each prediction only costs the encoding of the student and a forward pass.
+
+    The model output only depends on the set of active one-hot features, so predictions are also memoized:
+    a precomputed top-k table (see `scripts.precompute_topk`) answers the combinations seen in the persona data,
+    and a bounded LRU keeps the probabilities of the most recent other combinations.
+    """
+
+    def __init__(self, model_path=NCF_MODEL_PATH, user_features_path=NCF_USER_FEATURES_PATH,
+                 courses_list_path=NCF_COURSES_LIST_PATH, memo_max_entries=NCF_MEMO_MAX_ENTRIES,
+                 topk_table_path=NCF_TOPK_TABLE_PATH, sparse=NCF_SPARSE_INPUT, backend=NCF_INFERENCE_BACKEND,
+                 quantize=NCF_QUANTIZE):
+        """
+        Initializes the predictor by loading the model and the vocabularies from disk.
+
+        Args:
+            model_path (str): The path to the trained neural collaborative filtering model: a model bundle,
+                which includes its vocabularies, or a legacy pickled model.
+            user_features_path (str): The path to the JSON list of one-hot user feature names (pickled models only).
+            courses_list_path (str): The path to the JSON list of course names (pickled models only).
+            memo_max_entries (int): The maximum number of feature combinations whose probabilities are memoized.
+            topk_table_path (str): The path to the precomputed top-k table. It is loaded if the file exists.
+            sparse (bool): Whether to run a dense checkpoint as a `SparseNCFModel`, fed with feature indices
+                instead of one-hot vectors. Sparse checkpoints always run that way. Only applies to the torch backend.
+            backend (str): How to run a bundled model: "torch", "torchscript" or "onnx".
+            quantize (bool): Whether to run the model with dynamic int8 Linear layers (torch backend only).
+        """
+        from scripts.train_model_DL import NCFModel, SparseNCFModel
+
+        self.model_metadata = None
+        if is_model_bundle(model_path):
+            # The bundle carries the vocabularies the model was trained with
+            self.model, self.user_features, self.courses_list, self.model_metadata = load_model_bundle(model_path, backend)
+        else:
+            # Load user features from JSON file as a list
+            with open(user_features_path, 'r') as f:
+                self.user_features = json.load(f)
+
+            # Load courses list from JSON file as a list
+            with open(courses_list_path, 'r') as f:
+                self.courses_list = json.load(f)
+
+            # Load the model and set it to evaluation mode
+            self.model = load_model(model_path, backend)
+
+        # Identifies the weights and the way they are run, so a top-k table computed by another model is not served
+        if self.model_metadata is not None:
+            self.model_version = self.model_metadata["model_version"]
+        else:
+            self.model_version = get_file_sha256(model_path)[:16]
+        self.inference = "torch-int8" if quantize else (backend if self.model_metadata is not None else "torch")
+
+        # Map each one-hot feature name to its column index
+        self.feature_index = {name: idx for idx, name in enumerate(self.user_features)}
+
+        # Map lower-cased profile keys (as sent by the web UI) to the model's column names
+        self.column_lookup = {column.lower(): column for column in NCF_FEATURE_COLUMNS}
+
+        if sparse and isinstance(self.model, NCFModel):
+            self.model = SparseNCFModel.from_dense(self.model)
+        self.sparse = isinstance(self.model, SparseNCFModel)
+        self.quantized = quantize
+        if quantize:
+            if not isinstance(self.model, (NCFModel, SparseNCFModel)):
+                raise ValueError("Quantization only applies to the torch inference backend")
+            self.model = quantize_model(self.model)
+
+        # Memoized probabilities, keyed on the active feature indices
+        self.memo_max_entries = memo_max_entries
+        self.memo = OrderedDict()
+        self.memo_lock = threading.Lock()
+        self.stats = {"table_hits": 0, "memo_hits": 0, "misses": 0}
+
+        # Precomputed top-k courses, keyed on the active feature indices
+        self.topk_table = {}
+        self.topk_table_k = 0
+        if topk_table_path and os.path.exists(topk_table_path):
+            self.load_topk_table(topk_table_path)
+
+    @property
+    def num_features(self):
+        """int: The width of the model input."""
+        return len(self.user_features)
+
+    def feature_key(self, new_student):
+        """
+        Get the indices of the one-hot features a student profile activates.
+        Profiles with the same key always get the same predictions.
+
+        Args:
+            new_student (dict): A dictionary containing the student's features.
+
+        Returns:
+            tuple: The sorted indices of the active features.
+        """
+        indices = set()
+        for key, value in new_student.items():
+            column = self.column_lookup.get(str(key).lower())
+            if column is None or value is None:
+                continue
+            idx = self.feature_index.get(f"{column}_{value}")
+            if idx is not None:
+                indices.add(idx)
+        return tuple(sorted(indices))
+
+    def encode(self, new_student):
+        """
+        Encode a student profile into the model's one-hot input vector.
+
+        Args:
+            new_student (dict): A dictionary containing the student's features.
+
+        Returns:
+            numpy.ndarray: A float32 vector of length `num_features`.
+        """
+        return self.encode_key(self.feature_key(new_student))
+
+    def encode_key(self, key):
+        """
+        Encode the active feature indices of a student into the model's one-hot input vector.
+
+        Args:
+            key (tuple): The active feature indices, as returned by `feature_key`.
+
+        Returns:
+            numpy.ndarray: A float32 vector of length `num_features`.
+        """
+        features = np.zeros(self.num_features, dtype=np.float32)
+        features[list(key)] = 1.0
+        return features
+
+    def get_topk_table_provenance(self):
+        """
+        Get what a top-k table computed by this predictor depends on: the model version, the way the model is run,
+        and the input and output vocabularies.
+
+        Returns:
+            dict: The provenance fields, stored in the table by `scripts.precompute_topk`.
+        """
+        return {
+            "model_version": self.model_version,
+            "inference": self.inference,
+            "user_features_sha256": hashlib.sha256(json.dumps(self.user_features).encode()).hexdigest(),
+            "courses_list_sha256": hashlib.sha256(json.dumps(self.courses_list).encode()).hexdigest(),
+        }
+
+    def load_topk_table(self, path):
+        """
+        Load a top-k table written by `scripts.precompute_topk`.
+        A table computed for another model, inference backend or vocabulary is skipped with a warning,
+        and every prediction then goes through the model.
+
+        Args:
+            path (str): The path to the `.npz` table.
+
+        Returns:
+            bool: Whether the table was loaded.
+        """
+        table = np.load(path)
+        expected = self.get_topk_table_provenance()
+        mismatched = [name for name, value in expected.items() if name not in table.files or str(table[name]) != value]
+        if mismatched:
+            logger.warning("Skipping the top-k table %s, which does not match the loaded model (%s differ); "
+                           "rebuild it with `python -m scripts.precompute_topk`", path, ", ".join(mismatched))
+            return False
 
-    # Perform prediction using the model
-    with torch.no_grad():
-        predictions = model(new_student_tensor)
+        self.topk_table = {
+            tuple(int(idx) for idx in row if idx >= 0): top_indices
+            for row, top_indices in zip(table["feature_indices"], table["top_indices"])
+        }
+        self.topk_table_k = table["top_indices"].shape[1]
+        return True
 
-    # Convert the model's predictions to probabilities
-    course_probabilities = predictions.numpy().flatten()
+    def lookup(self, key, top_k=5):
+        """
+        Answer a prediction from the precomputed table or the memoized probabilities, without a forward pass.
 
-    # Identify the indices of the top 5 courses
-    top_course_indices = np.argsort(course_probabilities)[-5:][::-1]
+        Args:
+            key (tuple): The active feature indices, as returned by `feature_key`.
+            top_k (int): The number of courses to return.
 
-    # Map indices to course names
-    top_courses = [courses_list[idx] for idx in top_course_indices]
+        Returns:
+            list: The top recommended courses, or None if the combination has to go through the model.
+        """
+        if top_k <= self.topk_table_k:
+            top_indices = self.topk_table.get(key)
+            if top_indices is not None:
+                self.stats["table_hits"] += 1
+                return [self.courses_list[idx] for idx in top_indices[:top_k]]
 
-    return top_courses
\ No newline at end of file
+        probabilities = self.recall(key)
+        if probabilities is not None:
+            self.stats["memo_hits"] += 1
+            return self.top_courses(probabilities[np.newaxis, :], top_k)[0]
+        return None
+
+    def recall(self, key):
+        """
+        Get the memoized probabilities of a feature combination, marking them as recently used.
+
+        Args:
+            key (tuple): The active feature indices.
+
+        Returns:
+            numpy.ndarray: The course probabilities, or None if they are not memoized.
+        """
+        with self.memo_lock:
+            probabilities = self.memo.get(key)
+            if probabilities is not None:
+                self.memo.move_to_end(key)
+            return probabilities
+
+    def remember(self, key, probabilities):
+        """
+        Memoize the probabilities of a feature combination, evicting the least recently used one when full.
+
+        Args:
+            key (tuple): The active feature indices.
+            probabilities (numpy.ndarray): The course probabilities.
+        """
+        if self.memo_max_entries <= 0:
+            return
+        with self.memo_lock:
+            self.memo[key] = probabilities
+            self.memo.move_to_end(key)
+            while len(self.memo) > self.memo_max_entries:
+                self.memo.popitem(last=False)
+
+    def predict_proba(self, new_student):
+        """
+        Get the course probabilities of a student, from the memo when possible.
+
+        Args:
+            new_student (dict): A dictionary containing the student's features.
+
+        Returns:
+            numpy.ndarray: The probability of every course.
+        """
+        key = self.feature_key(new_student)
+        probabilities = self.recall(key)
+        if probabilities is None:
+            self.stats["misses"] += 1
+            probabilities = self.predict_proba_keys([key])[0]
+            self.remember(key, probabilities)
+        return probabilities
+
+    def predict_proba_batch(self, features):
+        """
+        Run the model on a batch of encoded students.
+
+        Args:
+            features (numpy.ndarray): A (batch, num_features) float32 array.
+
+        Returns:
+            numpy.ndarray: A (batch, num_courses) array of course probabilities.
+        """
+        if self.sparse:
+            return self.predict_proba_keys([tuple(np.flatnonzero(row)) for row in features])
+        with torch.inference_mode():
+            probabilities = self.model(torch.from_numpy(features))
+        return probabilities.numpy()
+
+    def predict_proba_keys(self, keys):
+        """
+        Run the model on a batch of students given by their active feature indices.
+        The sparse model is fed the indices directly; the dense model gets the one-hot vectors built from them.
+
+        Args:
+            keys (list): The active feature indices of each student, as returned by `feature_key`.
+
+        Returns:
+            numpy.ndarray: A (batch, num_courses) array of course probabilities.
+        """
+        if not self.sparse:
+            return self.predict_proba_batch(np.stack([self.encode_key(key) for key in keys]))
+
+        indices = torch.tensor([idx for key in keys for idx in key], dtype=torch.long)
+        offsets = torch.tensor(np.cumsum([0] + [len(key) for key in keys[:-1]]), dtype=torch.long)
+        with torch.inference_mode():
+            probabilities = self.model(indices, offsets)
+        return probabilities.numpy()
+
+    def top_courses(self, probabilities, top_k=5):
+        """
+        Map a batch of course probabilities to the names of the top-k courses.
+
+        Args:
+            probabilities (numpy.ndarray): A (batch, num_courses) array of course probabilities.
+            top_k (int): The number of courses to return per student.
+
+        Returns:
+            list: A list of lists of course names, best first.
+        """
+        top_k = min(top_k, probabilities.shape[1])
+        # Select the top-k without fully sorting, then order them by probability
+        top_indices = np.argpartition(-probabilities, top_k - 1, axis=1)[:, :top_k]
+        order = np.argsort(-np.take_along_axis(probabilities, top_indices, axis=1), axis=1)
+        top_indices = np.take_along_axis(top_indices, order, axis=1)
+        return [[self.courses_list[idx] for idx in row] for row in top_indices]
+
+    def predict_batch(self, new_students, top_k=5):
+        """
+        Predict the top course recommendations for several students.
+        Memoized combinations are answered directly and the others share one forward pass.
+
+        Args:
+            new_students (list): A list of dictionaries containing the students' features.
+            top_k (int): The number of courses to return per student.
+
+        Returns:
+            list: A list of lists of recommended courses, one per student.
+        """
+        keys = [self.feature_key(new_student) for new_student in new_students]
+        results = [self.lookup(key, top_k) for key in keys]
+
+        # Running the model once for the distinct combinations that are not memoized
+        missing_keys = list(dict.fromkeys(key for key, result in zip(keys, results) if result is None))
+        if missing_keys:
+            self.stats["misses"] += len(missing_keys)
+            probabilities = self.predict_proba_keys(missing_keys)
+            top_courses = dict(zip(missing_keys, self.top_courses(probabilities, top_k)))
+            for key, row in zip(missing_keys, probabilities):
+                self.remember(key, row)
+            results = [top_courses[key] if result is None else result for key, result in zip(keys, results)]
+        return results
+
+    def predict(self, new_student, top_k=5):
+        """
+        Predict the top course recommendations for a single student.
+
+        Args:
+            new_student (dict): A dictionary containing the new student's features.
+            top_k (int): The number of courses to return.
+
+        Returns:
+            list: A list of the top recommended courses for the new student.
+        """
+        return self.predict_batch([new_student], top_k)[0]
+
+
+__predictors__ = {}
+
+
+def get_predictor(model_path=NCF_MODEL_PATH, quantize=NCF_QUANTIZE):
+    """
+    Function to get the process-wide NCF predictor for a model, loading it on first use.
+
+    Args:
+        model_path (str): The path to the trained neural collaborative filtering model.
+        quantize (bool): Whether to run the model with dynamic int8 Linear layers.
+
+    Returns:
+        NCFPredictor: The shared predictor.
+    """
+    if (model_path, quantize) not in __predictors__:
+        __predictors__[(model_path, quantize)] = NCFPredictor(model_path=model_path, quantize=quantize)
+    return __predictors__[(model_path, quantize)]
+
+
+def predict(new_student, model_path=NCF_MODEL_PATH, quantize=NCF_QUANTIZE):
+    """
+    Predict the top 5 course recommendations for a new student.
+
+    Args:
+    new_student (dict): A dictionary containing the new student's features.
+    model_path (str): The path to the trained neural collaborative filtering model.
+    quantize (bool): Whether to run the model with dynamic int8 Linear layers.
+
+    Returns:
+    list: A list of the top 5 recommended courses for the new student.
+    """
+    return get_predictor(model_path, quantize).predict(new_student, top_k=5)
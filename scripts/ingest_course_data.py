@@ -1,10 +1,21 @@
 import csv
-import chromadb
+import uuid
+import hashlib
+import argparse
 
+import numpy as np
 from tqdm.auto import tqdm
 
-from constants import CHROMA_HOST, CHROMA_PORT, CHROMA_COLLECTION_NAME
-from util import clean_text
+from constants import (
+    CHROMA_COLLECTION_NAME, CHROMA_COLLECTION_VERSION_KEY, INGEST_BATCH_SIZE, LOCAL_INDEX_DIR, RETRIEVAL_BACKEND
+)
+from util import clean_texts
+
+# Course fields that are cleaned before being embedded
+CLEANED_COURSE_FIELDS = (
+    "subject", "title", "catalog_number", "course_type", "description", "keywords", "grading", "prerequisites"
+)
+
 
 def get_formatted_course_details_list(course_data_csv_path):
     """
@@ -33,53 +44,141 @@ def get_formatted_course_details_list(course_data_csv_path):
             display_text = f"Subject: {unformatted_subject}\nTitle: {unformatted_title}\nCatalog Number: {unformatted_catalog_number}\nCourse Type: {unformatted_course_type}\nDescription: {unformatted_description}\nGrading: {unformatted_grading}\nPrerequisites: {unformatted_prerequisites}"
 
             # Formatting the extracted course details
-            subject = row.get("Subject", "").strip().lower()
-            title = row.get("Course Title", "").strip().lower()
-            catalog_number = row.get("Catalog Number", "").strip().lower()
-            course_type = row.get("Course Type", "").strip().lower().replace("-", " ")
-            description = row.get("Description", "").strip().lower()
-            keywords = row.get("Keywords", "").strip().lower()
-            grading = row.get("Grading", "").strip().lower()
-            prerequisites = row.get("Prerequisites").strip().lower()
-
-            # Cleaning the formatted course details
-            subject = clean_text(subject)
-            title = clean_text(title)
-            catalog_number = clean_text(catalog_number)
-            course_type = clean_text(course_type)
-            description = clean_text(description)
-            keywords = clean_text(keywords)
-            grading = clean_text(grading)
-            prerequisites = clean_text(prerequisites)
-            if len(prerequisites) == 0:
-                prerequisites = "None"
-
-            # Creating a dictionary of the cleaned course details
-            formatted_course_dict = {
-                "subject": subject,
-                "title": title,
-                "catalog_number": catalog_number,
-                "course_type": course_type,
-                "description": description,
-                "keywords": keywords,
-                "grading": grading,
-                "prerequisites": prerequisites,
+            course_details_list.append({
+                "subject": row.get("Subject", "").strip().lower(),
+                "title": row.get("Course Title", "").strip().lower(),
+                "catalog_number": row.get("Catalog Number", "").strip().lower(),
+                "course_type": row.get("Course Type", "").strip().lower().replace("-", " "),
+                "description": row.get("Description", "").strip().lower(),
+                "keywords": row.get("Keywords", "").strip().lower(),
+                "grading": row.get("Grading", "").strip().lower(),
+                "prerequisites": row.get("Prerequisites").strip().lower(),
                 "display_text": display_text
-            }
-            course_details_list.append(formatted_course_dict)
+            })
+
+    # Cleaning the formatted course details of every row in one batch
+    cleaned_fields = clean_texts([
+        course[field] for course in course_details_list for field in CLEANED_COURSE_FIELDS
+    ])
+    for course_idx, course in enumerate(course_details_list):
+        offset = course_idx * len(CLEANED_COURSE_FIELDS)
+        for field_idx, field in enumerate(CLEANED_COURSE_FIELDS):
+            course[field] = cleaned_fields[offset + field_idx]
+        if len(course["prerequisites"]) == 0:
+            course["prerequisites"] = "None"
 
     return course_details_list
 
 
-def ingest_course_details_into_vector_db(course_details_list):
+def stamp_collection_version(course_collection):
+    """
+    Function to write a new version stamp into the collection metadata.
+    Servers key their search caches on this stamp, so cached results from before the ingestion are no longer served.
+
+    Args:
+        course_collection (chromadb.Collection): The collection that was ingested into.
+    """
+    # The distance function cannot be modified, so only the other metadata keys are carried over
+    metadata = {
+        key: value for key, value in (course_collection.metadata or {}).items() if not key.startswith("hnsw:")
+    }
+    metadata[CHROMA_COLLECTION_VERSION_KEY] = uuid.uuid4().hex
+    course_collection.modify(metadata=metadata)
+
+
+def get_course_document(course):
+    """
+    Function to build the document that is embedded for a course.
+
+    Args:
+        course (dict): The cleaned details of the course.
+
+    Returns:
+        str: The document text.
+    """
+    return (
+        f"Subject: {course['subject']}\nTitle: {course['title']}\nCatalog Number: {course['catalog_number']}\n"
+        f"Course Type: {course['course_type']}\nDescription: {course['description']}\nKeywords: {course['keywords']}\n"
+        f"Grading: {course['grading']}\nPrerequisites: {course['prerequisites']}"
+    )
+
+
+def get_course_id(doc, course):
+    """
+    Function to derive a stable ID from the content of a course.
+    The same course always gets the same ID in every process, and any change to it gives a new ID.
+
+    Args:
+        doc (str): The document text of the course.
+        course (dict): The details of the course, stored as its metadata.
+
+    Returns:
+        str: The hex digest identifying the course.
+    """
+    content = doc + "\0" + course["display_text"]
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def get_course_records(course_details_list):
+    """
+    Function to build the documents of the courses, keyed on their content-derived IDs.
+    Exact duplicate courses collapse into a single record.
+
+    Args:
+        course_details_list (list): A list of dictionaries, each representing a course and its details.
+
+    Returns:
+        dict: The (document, metadata) pair of each course, keyed on its ID, in catalog order.
+    """
+    courses_by_id = {}
+    for course in course_details_list:
+        doc = get_course_document(course)
+        courses_by_id[get_course_id(doc, course)] = (doc, course)
+    return courses_by_id
+
+
+def ingest_course_details_into_local_index(course_details_list, index_dir=LOCAL_INDEX_DIR):
+    """
+    Function to ingest the course details into the local vector index used by the "local" retrieval backend.
+    Only new or changed courses are embedded again.
+
+    Args:
+        course_details_list (list): A list of dictionaries, each representing a course and its details.
+        index_dir (str): The directory to write the index files to.
+    """
+    from scripts.local_vector_index import write_local_vector_index
+
+    courses_by_id = get_course_records(course_details_list)
+    ids = list(courses_by_id)
+    num_embedded = write_local_vector_index(
+        ids,
+        [courses_by_id[doc_id][0] for doc_id in ids],
+        [courses_by_id[doc_id][1] for doc_id in ids],
+        index_dir=index_dir
+    )
+    print(f"[+] Ingestion into local index completed: {len(ids)} courses, {num_embedded} embedded.")
+
+
+def ingest_course_details_into_vector_db(course_details_list, sync=True, batch_size=INGEST_BATCH_SIZE):
     """
     Function to ingest the course details into a vector database.
 
+    Courses are written with batched `upsert` calls under content-derived IDs, so re-running the ingestion is idempotent.
+    In sync mode only new or changed courses are embedded, and courses that are no longer in the list are deleted.
+    The embeddings are computed here and sent with the documents, so texts already in the embedding cache
+    (from an earlier run, another catalog or a full re-ingestion) are not embedded again.
+
     Args:
         course_details_list (list): A list of dictionaries, each representing a course and its details.
+        sync (bool): Whether to only upsert the difference with the collection and delete removed courses.
+            Otherwise every course is upserted again and nothing is deleted.
+        batch_size (int): The number of courses sent per request.
     """
-    # Creating a ChromaDB client
-    chroma_client = chromadb.HttpClient(f"{CHROMA_HOST}:{CHROMA_PORT}")
+    from scripts.embedding_cache import get_default_embedding_function
+    from scripts.query_vector_db import get_chroma_client
+
+    # Getting the ChromaDB client shared with the search path
+    chroma_client = get_chroma_client()
 
     # Getting or creating a collection in the vector database
     course_collection = chroma_client.get_or_create_collection(
@@ -87,41 +186,55 @@ def ingest_course_details_into_vector_db(course_details_list):
         metadata={"hnsw:space": "cosine"}  # l2 is the default
     )
 
-    # Ingesting the course details into the vector database
-    for course in tqdm(course_details_list):
-        # Extracting course details from the course dictionary
-        subject = course["subject"]
-        title = course["title"]
-        catalog_number = course["catalog_number"]
-        course_type = course["course_type"]
-        description = course["description"]
-        keywords = course["keywords"]
-        grading = course["grading"]
-        prerequisites = course["prerequisites"]
-
-        # Creating a document from the course details
-        doc = f"Subject: {subject}\nTitle: {title}\nCatalog Number: {catalog_number}\nCourse Type: {course_type}\nDescription: {description}\nKeywords: {keywords}\nGrading: {grading}\nPrerequisites: {prerequisites}"
-        doc_id = str(hash(frozenset(course.items())))
-        doc_metadata = course
-
-        # Adding the document to the vector database
-        try:
-            course_collection.add(
-                documents=[doc],
-                ids=[doc_id],
-                metadatas=[doc_metadata]
-            )
-        except Exception as ex:
-            print(ex)
-
-    print("[+] Ingestion into vector database completed.")
+    # Creating the documents and their IDs, dropping exact duplicates
+    courses_by_id = get_course_records(course_details_list)
+
+    ids_to_upsert = list(courses_by_id)
+    ids_to_delete = []
+    if sync:
+        existing_ids = set(course_collection.get(include=[])["ids"])
+        ids_to_upsert = [doc_id for doc_id in courses_by_id if doc_id not in existing_ids]
+        ids_to_delete = sorted(existing_ids - set(courses_by_id))
+
+    # Upserting the new or changed courses into the vector database, with their embeddings
+    embedding_function = get_default_embedding_function()
+    for start in tqdm(range(0, len(ids_to_upsert), batch_size), desc="Upserting courses"):
+        batch_ids = ids_to_upsert[start:start + batch_size]
+        batch_documents = [courses_by_id[doc_id][0] for doc_id in batch_ids]
+        course_collection.upsert(
+            ids=batch_ids,
+            documents=batch_documents,
+            embeddings=np.asarray(embedding_function(batch_documents), dtype=np.float32).tolist(),
+            metadatas=[courses_by_id[doc_id][1] for doc_id in batch_ids]
+        )
+
+    # Deleting the courses that are no longer in the catalog
+    for start in range(0, len(ids_to_delete), batch_size):
+        course_collection.delete(ids=ids_to_delete[start:start + batch_size])
+
+    # Invalidate the search caches of running servers
+    if ids_to_upsert or ids_to_delete:
+        stamp_collection_version(course_collection)
+
+    print(f"[+] Ingestion into vector database completed: {len(ids_to_upsert)} upserted, "
+          f"{len(ids_to_delete)} deleted, {len(courses_by_id) - len(ids_to_upsert)} unchanged.")
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ingest the course catalog into the vector database.")
+    parser.add_argument("--data", default="data/raw/courses.csv", help="Path to the course data file")
+    parser.add_argument("--mode", choices=["sync", "full"], default="sync",
+                        help="'sync' only embeds new or changed courses and deletes removed ones; 'full' upserts every course")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Number of courses sent per request")
+    parser.add_argument("--backend", choices=["chroma", "local"], default=RETRIEVAL_BACKEND,
+                        help="'chroma' ingests into the Chroma server; 'local' writes the in-process index to LOCAL_INDEX_DIR")
+    args = parser.parse_args()
+
     # Getting the formatted course details list
-    course_details_list = get_formatted_course_details_list(
-        "data/raw/courses.csv"
-    )
+    course_details_list = get_formatted_course_details_list(args.data)
 
     # Ingesting the course details into the vector database
-    ingest_course_details_into_vector_db(course_details_list)
\ No newline at end of file
+    if args.backend == "local":
+        ingest_course_details_into_local_index(course_details_list)
+    else:
+        ingest_course_details_into_vector_db(course_details_list, sync=args.mode == "sync", batch_size=args.batch_size)
@@ -0,0 +1,226 @@
+import os
+import json
+import uuid
+import threading
+
+import numpy as np
+
+from constants import CHROMA_COLLECTION_NAME, CHROMA_COLLECTION_VERSION_KEY, LOCAL_INDEX_DIR
+from scripts.embedding_cache import get_default_embedding_function, get_query_embedding_function
+
+EMBEDDINGS_FILE_NAME = "embeddings.npy"  # Indexes written before the embeddings were versioned
+EMBEDDINGS_FILE_PATTERN = "embeddings-{version}.npy"
+RECORDS_FILE_NAME = "records.json"
+# How many times a load retries when the index is rewritten while it reads it
+LOAD_ATTEMPTS = 3
+
+
+def read_records(index_dir):
+    """
+    Function to read the records of a local index, which name the embeddings file written with them.
+
+    Args:
+        index_dir (str): The directory containing the index files.
+
+    Returns:
+        dict: The version, the embeddings file name, and the ids, documents and metadatas of the courses.
+    """
+    with open(os.path.join(index_dir, RECORDS_FILE_NAME), 'r') as f:
+        records = json.load(f)
+    records.setdefault("embeddings_file", EMBEDDINGS_FILE_NAME)
+    return records
+
+
+def normalize_rows(matrix):
+    """
+    Function to scale every row of a matrix to unit length.
+
+    Args:
+        matrix (numpy.ndarray): The matrix to normalize.
+
+    Returns:
+        numpy.ndarray: The normalized float32 matrix.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class LocalVectorIndex:
+    """
+    In-process retrieval backend over a memory-mapped matrix of normalized course embeddings.
+
+    It exposes the part of `chromadb.Collection` that the search path uses (`name`, `metadata` and `query`),
+    and returns results in the same shape, with cosine distances, so it can replace the Chroma server.
+    """
+
+    def __init__(self, index_dir=LOCAL_INDEX_DIR, embedding_function=None):
+        """
+        Initializes the index by memory-mapping the files written by `write_local_vector_index`.
+
+        Args:
+            index_dir (str): The directory containing the index files.
+            embedding_function (callable, optional): The function embedding the query texts.
+                Defaults to the Chroma default embedding function, behind the query embedding cache.
+        """
+        self.name = CHROMA_COLLECTION_NAME
+        self.index_dir = index_dir
+        self.embedding_function = embedding_function or get_query_embedding_function()
+        # Searches run in executor threads: a reload must not be seen half done
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """
+        Load, or reload, the records and memory-map the embeddings file they name.
+        The records are read again if that file was removed by newer ingestions in the meantime.
+        """
+        for attempt in range(LOAD_ATTEMPTS):
+            records = read_records(self.index_dir)
+            try:
+                embeddings = np.load(os.path.join(self.index_dir, records["embeddings_file"]), mmap_mode="r")
+                break
+            except FileNotFoundError:
+                if attempt == LOAD_ATTEMPTS - 1:
+                    raise
+        if len(embeddings) != len(records["ids"]):
+            raise ValueError(f"The local index in {self.index_dir} has {len(records['ids'])} records "
+                             f"but {len(embeddings)} embeddings")
+        with self.lock:
+            self.version = records["version"]
+            self.ids = records["ids"]
+            self.documents = records["documents"]
+            self.metadatas = records["metadatas"]
+            self.embeddings = embeddings
+
+    @property
+    def metadata(self):
+        """dict: The collection metadata, holding the version stamp of the last ingestion."""
+        return {CHROMA_COLLECTION_VERSION_KEY: self.version}
+
+    def refresh(self):
+        """
+        Reload the index if it was rewritten since it was loaded.
+
+        Returns:
+            dict: The collection metadata after the refresh.
+        """
+        if read_records(self.index_dir)["version"] != self.version:
+            self.load()
+        return self.metadata
+
+    def count(self):
+        """
+        Get the number of courses in the index.
+
+        Returns:
+            int: The number of courses.
+        """
+        return len(self.ids)
+
+    def query(self, query_texts=None, n_results=10, query_embeddings=None):
+        """
+        Find the courses closest to each query by cosine similarity.
+
+        Args:
+            query_texts (list, optional): The texts to search for.
+            n_results (int): The number of results per query.
+            query_embeddings (list, optional): Precomputed query embeddings, used instead of embedding `query_texts`.
+
+        Returns:
+            dict: The `ids`, `distances`, `documents` and `metadatas` of the results, one list per query.
+        """
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        queries = normalize_rows(query_embeddings)
+        with self.lock:
+            ids, documents, metadatas, embeddings = self.ids, self.documents, self.metadatas, self.embeddings
+
+        search_results = {"ids": [], "distances": [], "documents": [], "metadatas": []}
+        n_results = min(n_results, len(ids))
+        if n_results == 0:
+            for key in search_results:
+                search_results[key] = [[] for _ in range(len(queries))]
+            return search_results
+
+        # One matrix product scores every course against every query
+        similarities = queries @ embeddings.T
+        top_indices = np.argpartition(-similarities, n_results - 1, axis=1)[:, :n_results]
+        top_similarities = np.take_along_axis(similarities, top_indices, axis=1)
+        order = np.argsort(-top_similarities, axis=1)
+        top_indices = np.take_along_axis(top_indices, order, axis=1)
+        top_similarities = np.take_along_axis(top_similarities, order, axis=1)
+
+        for indices, row_similarities in zip(top_indices, top_similarities):
+            search_results["ids"].append([ids[idx] for idx in indices])
+            search_results["distances"].append((1 - row_similarities).tolist())
+            search_results["documents"].append([documents[idx] for idx in indices])
+            search_results["metadatas"].append([metadatas[idx] for idx in indices])
+        return search_results
+
+
+def write_local_vector_index(ids, documents, metadatas, index_dir=LOCAL_INDEX_DIR, embedding_function=None,
+                             batch_size=256):
+    """
+    Function to embed courses and write them as a local vector index.
+    Embeddings of courses that are already in the existing index under the same ID are reused.
+
+    The embeddings are written to a new file named after the version, and the records, which name that file,
+    are then swapped in with a single rename. A reader therefore sees either the old index or the new one,
+    never new embeddings paired with old records. The embeddings of the previous version are kept for readers
+    that read its records just before the swap; older ones are removed.
+
+    Args:
+        ids (list): The content-derived IDs of the courses.
+        documents (list): The documents to embed.
+        metadatas (list): The metadata of each course.
+        index_dir (str): The directory to write the index files to.
+        embedding_function (callable, optional): The function embedding the documents.
+            Defaults to the Chroma default embedding function, behind the embedding cache.
+        batch_size (int): The number of documents embedded at once.
+
+    Returns:
+        int: The number of documents that had to be embedded.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+
+    # Reusing the embeddings of unchanged courses
+    existing_rows = {}
+    previous_embeddings_file = None
+    records_path = os.path.join(index_dir, RECORDS_FILE_NAME)
+    if os.path.exists(records_path):
+        existing_records = read_records(index_dir)
+        previous_embeddings_file = existing_records["embeddings_file"]
+        existing_embeddings = np.load(os.path.join(index_dir, previous_embeddings_file))
+        existing_rows = {doc_id: existing_embeddings[idx] for idx, doc_id in enumerate(existing_records["ids"])}
+
+    missing = [idx for idx, doc_id in enumerate(ids) if doc_id not in existing_rows]
+    new_rows = {}
+    if missing:
+        embedding_function = embedding_function or get_default_embedding_function()
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            batch_embeddings = normalize_rows(embedding_function([documents[idx] for idx in batch]))
+            new_rows.update(zip(batch, batch_embeddings))
+
+    rows = [new_rows[idx] if idx in new_rows else existing_rows[doc_id] for idx, doc_id in enumerate(ids)]
+    embeddings = np.stack(rows).astype(np.float32) if rows else np.zeros((0, 0), dtype=np.float32)
+
+    # Writing the embeddings of this version next to the current ones, then swapping the records in
+    version = uuid.uuid4().hex
+    embeddings_file = EMBEDDINGS_FILE_PATTERN.format(version=version)
+    embeddings_path = os.path.join(index_dir, embeddings_file)
+    np.save(embeddings_path + ".tmp.npy", embeddings)
+    os.replace(embeddings_path + ".tmp.npy", embeddings_path)
+    with open(records_path + ".tmp", 'w') as f:
+        json.dump({"version": version, "embeddings_file": embeddings_file, "ids": ids, "documents": documents,
+                   "metadatas": metadatas}, f)
+    os.replace(records_path + ".tmp", records_path)
+
+    # Removing the embeddings of the versions before the previous one
+    for file_name in os.listdir(index_dir):
+        if (file_name.startswith("embeddings") and file_name.endswith(".npy") and not file_name.endswith(".tmp.npy")
+                and file_name not in (embeddings_file, previous_embeddings_file)):
+            os.remove(os.path.join(index_dir, file_name))
+
+    return len(missing)
@@ -1,12 +1,11 @@
 import argparse
 
-# Import custom modules for each stage of the deep learning process
-from scripts.preprocessing_DL import preprocess_workflow
-from scripts.train_model_DL import training_model_workflow
-from scripts.test_evaluate_DL import evaluate
-from scripts.inference_DL import predict
+from constants import NCF_QUANTIZE
 
-def train_test_model(filepath):
+# Custom modules for each stage of the deep learning process are imported where they are used,
+# so inference does not load the training stack and vice versa
+
+def train_test_model(filepath, streaming=False, chunk_size=None, loader_options=None, training_options=None):
     """
     Trains and evaluates a deep learning model using the provided dataset filepath.
     
@@ -15,42 +14,64 @@ def train_test_model(filepath):
     
     Args:
         filepath (str): The path to the dataset file to be used for training and testing.
+        streaming (bool): Whether to preprocess the file in chunks into memory-mapped packed arrays,
+            so that memory use does not grow with the number of rows.
+        chunk_size (int): The number of rows read at once when streaming. Defaults to PREPROCESS_CHUNK_SIZE.
+        loader_options (dict): Overrides of the DataLoader options (batch_size, num_workers, pin_memory, validation_size).
+        training_options (dict): Overrides of the `training_model_workflow` options (epochs, learning_rate, ...).
     
     Returns:
-        None: Outputs the test loss directly to the console.
+        None: Outputs the test loss and ranking metrics directly to the console.
     """
-    # Preprocess the data and get data loaders for both training and testing
-    X_train, X_test, Y_train, Y_test, train_loader, test_loader = preprocess_workflow(filepath=filepath)
+    from scripts.preprocessing_DL import preprocess_workflow, streaming_preprocess_workflow
+    from scripts.train_model_DL import training_model_workflow
+    from scripts.test_evaluate_DL import evaluate, evaluate_ranking
+
+    loader_options = loader_options or {}
+    # Preprocess the data and get data loaders for training, testing and (optionally) validation
+    if streaming:
+        if chunk_size:
+            loader_options["chunk_size"] = chunk_size
+        X_train, X_test, Y_train, Y_test, train_loader, test_loader, val_loader = streaming_preprocess_workflow(
+            filepath, **loader_options)
+    else:
+        X_train, X_test, Y_train, Y_test, train_loader, test_loader, val_loader = preprocess_workflow(
+            filepath=filepath, **loader_options)
     # Train the model using the preprocessed data and training data loader
-    model = training_model_workflow(X_train, Y_train, train_loader)
+    model = training_model_workflow(X_train, Y_train, train_loader, val_loader, **(training_options or {}))
     # Evaluate the trained model using the testing data loader
     test_loss = evaluate(model, test_loader)
     # Print out the test loss to console
     print(f"Test Loss: {test_loss}")
+    # Print out the ranking quality of the recommendations on the test set
+    for name, value in evaluate_ranking(model, test_loader).items():
+        print(f"Test {name}: {value:.4f}")
 
-def predictions(new_student):
+def predictions(new_student, quantize=NCF_QUANTIZE):
     """
     Generates predictions for course recommendations based on the attributes of a new student.
     
-    This function filters the necessary attributes from the new student's data,
-    loads the trained model, and predicts top courses that suit the student's profile.
+    This function filters the necessary attributes from the new student's data
+    and predicts top courses that suit the student's profile using the process-wide predictor,
+    so the trained model is only loaded on the first call.
     
     Args:
         new_student (dict): A dictionary containing new student's attributes such as field of study, hobbies, and desired career field.
+        quantize (bool): Whether to run the model with dynamic int8 Linear layers.
     
     Returns:
         None: Outputs the recommended courses directly to the console.
     """
+    from scripts.inference_DL import get_predictor
+
     # Keys to extract relevant information from new student data
     keys_to_extract = 'Field_Of_Study', 'Primary_Hobby', 'Secondary_Hobby', 'Desired_Career_Field'
     # Create a dictionary for the student's data, extracting only necessary fields
     new_student = {key: new_student.get(key, None) for key in keys_to_extract}
     # Print filtered student data
     print(new_student)
-    # Path to the trained model
-    model_path = 'models/ncf_model_full.pth'
-    # Predict courses using the inference function and print them
-    top_courses = predict(new_student, model_path)
+    # Predict courses using the shared, already loaded predictor and print them
+    top_courses = get_predictor(quantize=quantize).predict(new_student)
     print("Recommended Courses:", top_courses)
 
 def main():
@@ -67,6 +88,21 @@ def main():
     parser = argparse.ArgumentParser(description="Train and test the recommendation model or make predictions.")
     parser.add_argument("--mode", choices=["training", "inference"], required=True, help="Mode of operation: 'training' or 'inference'")
     parser.add_argument("--data", default="data/processed/labeled_data_student_to_courseRecomm.csv", help="Path to the training data file")
+    parser.add_argument("--streaming", action="store_true", help="Preprocess the training data in chunks into memory-mapped arrays")
+    parser.add_argument("--chunk-size", type=int, help="Number of rows read at once with --streaming")
+    # Training options; unset options fall back to the TRAIN_* settings in constants.py
+    parser.add_argument("--epochs", type=int, help="Maximum number of training epochs")
+    parser.add_argument("--batch-size", type=int, help="Number of samples per batch")
+    parser.add_argument("--learning-rate", type=float, help="Learning rate of the optimizer")
+    parser.add_argument("--num-workers", type=int, help="Number of DataLoader worker processes")
+    parser.add_argument("--pin-memory", action="store_true", default=None, help="Copy batches into pinned memory")
+    parser.add_argument("--num-threads", type=int, help="Number of intra-op threads used by torch")
+    parser.add_argument("--bf16", action="store_true", default=None, help="Run the forward pass under bfloat16 autocast")
+    parser.add_argument("--validation-size", type=float, help="Fraction of the training rows held out for validation")
+    parser.add_argument("--patience", type=int, help="Epochs without validation improvement before stopping early")
+    parser.add_argument("--checkpoint-every", type=int, help="Save a checkpoint every this many epochs")
+    parser.add_argument("--checkpoint-dir", help="Directory to save checkpoints in")
+    parser.add_argument("--quantize", action="store_true", default=NCF_QUANTIZE, help="Run inference with a dynamic int8 quantized model")
     parser.add_argument("--Field_Of_Study", type=str, help="New student's field of study")
     parser.add_argument("--Primary_Hobby", type=str, help="New student's primary hobby")
     parser.add_argument("--Secondary_Hobby", type=str, help="New student's secondary hobby")
@@ -75,7 +111,28 @@ def main():
 
     # Execute the appropriate function based on the mode argument
     if args.mode == 'training':
-        train_test_model(filepath=args.data)
+        loader_options = {
+            "batch_size": args.batch_size,
+            "num_workers": args.num_workers,
+            "pin_memory": args.pin_memory,
+            "validation_size": args.validation_size,
+        }
+        training_options = {
+            "epochs": args.epochs,
+            "learning_rate": args.learning_rate,
+            "num_threads": args.num_threads,
+            "bf16": args.bf16,
+            "patience": args.patience,
+            "checkpoint_every": args.checkpoint_every,
+            "checkpoint_dir": args.checkpoint_dir,
+        }
+        train_test_model(
+            filepath=args.data,
+            streaming=args.streaming,
+            chunk_size=args.chunk_size,
+            loader_options={key: value for key, value in loader_options.items() if value is not None},
+            training_options={key: value for key, value in training_options.items() if value is not None}
+        )
     elif args.mode == 'inference':
         # Ensure all necessary fields are provided for inference
         if not (args.Field_Of_Study and args.Primary_Hobby and args.Secondary_Hobby and args.Desired_Career_Field):
@@ -87,7 +144,7 @@ def main():
             'Secondary_Hobby': args.Secondary_Hobby,
             'Desired_Career_Field': args.Desired_Career_Field
         }
-        predictions(new_student)
+        predictions(new_student, quantize=args.quantize)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,143 @@
+import asyncio
+
+import numpy as np
+
+from constants import MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS
+
+
+class MicroBatcher:
+    """
+    Class to collect concurrent single-student NCF requests into one forward pass.
+
+    Requests are queued with their active feature indices. A background task waits for the first request,
+    keeps collecting for at most `max_wait_ms` (or until `max_batch_size` requests are queued), stacks the
+    inputs into one tensor and runs the model once for the whole batch.
+    """
+
+    def __init__(self, predictor, max_batch_size=MICRO_BATCH_MAX_SIZE, max_wait_ms=MICRO_BATCH_MAX_WAIT_MS):
+        """
+        Initializes the micro-batcher.
+
+        Args:
+            predictor (scripts.inference_DL.NCFPredictor): The predictor used to encode and score students.
+            max_batch_size (int): The maximum number of requests scored in one forward pass.
+            max_wait_ms (float): How long to wait for more requests after the first one arrives.
+        """
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        self.worker = None
+        self.loop = None
+
+    def start(self):
+        """Start the background batching task on the running event loop, unless it is already running there."""
+        loop = asyncio.get_running_loop()
+        if self.worker is None or self.worker.done() or self.loop is not loop:
+            self.loop = loop
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stop the background batching task."""
+        if self.worker is not None and self.loop is asyncio.get_running_loop():
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+
+    async def predict(self, new_student, top_k=5):
+        """
+        Queue a student for the next batch and wait for its recommendations.
+
+        Args:
+            new_student (dict): A dictionary containing the student's features.
+            top_k (int): The number of courses to return.
+
+        Returns:
+            list: A list of the top recommended courses for the student.
+        """
+        # Memoized combinations do not need a forward pass at all
+        key = self.predictor.feature_key(new_student)
+        top_courses = self.predictor.lookup(key, top_k)
+        if top_courses is not None:
+            return top_courses
+
+        return await self.enqueue(key, top_k)
+
+    async def predict_proba(self, new_student):
+        """
+        Queue a student for the next batch and wait for the probability of every course.
+
+        Args:
+            new_student (dict): A dictionary containing the student's features.
+
+        Returns:
+            numpy.ndarray: The probability of every course.
+        """
+        key = self.predictor.feature_key(new_student)
+        probabilities = self.predictor.recall(key)
+        if probabilities is not None:
+            self.predictor.stats["memo_hits"] += 1
+            return probabilities
+        return await self.enqueue(key, None)
+
+    async def enqueue(self, key, top_k):
+        """
+        Queue a feature combination for the next batch and wait for its result.
+
+        Args:
+            key (tuple): The active feature indices, as returned by `feature_key`.
+            top_k (int): The number of courses to return, or None for the probability of every course.
+
+        Returns:
+            list: The top recommended courses, or the course probabilities when `top_k` is None.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((key, top_k, future))
+        return await future
+
+    async def collect(self):
+        """
+        Wait for the first queued request and collect more until the batch is full or the wait expires.
+
+        Returns:
+            list: The collected (feature key, top_k, future) items.
+        """
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        """Background loop scoring each collected batch with a single forward pass."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.collect()
+            keys = [item[0] for item in batch]
+            try:
+                # Run the forward pass off the event loop so new requests keep queueing meanwhile
+                probabilities = await loop.run_in_executor(None, self.predictor.predict_proba_keys, keys)
+            except Exception as ex:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(ex)
+                continue
+
+            self.predictor.stats["misses"] += len(batch)
+            for row, (key, top_k, future) in zip(probabilities, batch):
+                self.predictor.remember(key, row)
+                if future.done():
+                    continue
+                future.set_result(row if top_k is None else self.predictor.top_courses(row[np.newaxis, :], top_k)[0])
@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import inspect
+
+import torch
+
+from constants import NCF_FEATURE_COLUMNS
+
+# Version of the bundle layout; bundles written by a newer layout are refused
+BUNDLE_FORMAT_VERSION = 1
+
+WEIGHTS_FILE_NAME = "weights.pt"
+METADATA_FILE_NAME = "metadata.json"
+USER_FEATURES_FILE_NAME = "user_features.json"
+COURSES_LIST_FILE_NAME = "courses_list.json"
+EXPORT_FILE_NAMES = {
+    "torchscript": "model.torchscript.pt",
+    "onnx": "model.onnx",
+}
+
+
+def get_file_sha256(path):
+    """
+    Function to compute the SHA-256 digest of a file.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_torchscript(model, path, num_features):
+    """
+    Function to export a dense NCF model as a traced TorchScript module.
+
+    Args:
+        model (torch.nn.Module): The dense NCF model, in evaluation mode.
+        path (str): The path of the file to write.
+        num_features (int): The number of one-hot input features.
+    """
+    with torch.no_grad():
+        traced = torch.jit.trace(model, torch.zeros(1, num_features))
+    torch.jit.save(traced, path)
+
+
+def export_onnx(model, path, num_features):
+    """
+    Function to export a dense NCF model to ONNX, with a dynamic batch dimension.
+
+    Args:
+        model (torch.nn.Module): The dense NCF model, in evaluation mode.
+        path (str): The path of the file to write.
+        num_features (int): The number of one-hot input features.
+    """
+    # Newer torch versions default to the dynamo exporter, which needs extra packages; the TorchScript one does not
+    kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(
+        model,
+        (torch.zeros(1, num_features),),
+        path,
+        input_names=["features"],
+        output_names=["probabilities"],
+        dynamic_axes={"features": {0: "batch"}, "probabilities": {0: "batch"}},
+        **kwargs
+    )
+
+
+def save_model_bundle(model, user_features, courses_list, bundle_dir, exports=(), extra_metadata=None):
+    """
+    Function to save a trained NCF model as a versioned artifact bundle.
+
+    The bundle is a directory holding the weights as a state_dict, the feature and course vocabularies,
+    a metadata file, and optionally TorchScript and ONNX exports of the model. Loading it needs neither
+    the pickled module nor the path of the class that trained it. The bundle is written next to its
+    destination first and moved in place at the end, so readers never see a half-written bundle.
+
+    Args:
+        model (scripts.train_model_DL.NCFModel): The trained dense model.
+        user_features (list): The one-hot user feature names, in input order.
+        courses_list (list): The course names, in output order.
+        bundle_dir (str): The directory of the bundle. An existing bundle there is replaced.
+        exports (tuple): The exports to include, among "torchscript" and "onnx".
+        extra_metadata (dict, optional): More metadata to store, such as training metrics.
+
+    Returns:
+        dict: The metadata of the bundle.
+    """
+    unknown_exports = set(exports) - set(EXPORT_FILE_NAMES)
+    if unknown_exports:
+        raise ValueError(f"Unknown model exports: {sorted(unknown_exports)}")
+    if model.fc1.in_features != len(user_features) or model.output.out_features != len(courses_list):
+        raise ValueError("The vocabularies do not match the input and output sizes of the model")
+
+    model.eval()
+    tmp_dir = bundle_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    torch.save(model.state_dict(), os.path.join(tmp_dir, WEIGHTS_FILE_NAME))
+    with open(os.path.join(tmp_dir, USER_FEATURES_FILE_NAME), 'w') as f:
+        json.dump(user_features, f, indent=4)
+    with open(os.path.join(tmp_dir, COURSES_LIST_FILE_NAME), 'w') as f:
+        json.dump(courses_list, f, indent=4)
+    for export in exports:
+        export_function = export_torchscript if export == "torchscript" else export_onnx
+        export_function(model, os.path.join(tmp_dir, EXPORT_FILE_NAMES[export]), len(user_features))
+
+    files = [WEIGHTS_FILE_NAME, USER_FEATURES_FILE_NAME, COURSES_LIST_FILE_NAME]
+    files += [EXPORT_FILE_NAMES[export] for export in exports]
+    checksums = {name: get_file_sha256(os.path.join(tmp_dir, name)) for name in files}
+    metadata = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        # The model version identifies the trained weights and vocabularies
+        "model_version": hashlib.sha256(json.dumps(checksums, sort_keys=True).encode()).hexdigest()[:16],
+        "model_class": type(model).__name__,
+        "num_features": len(user_features),
+        "num_courses": len(courses_list),
+        "feature_columns": list(NCF_FEATURE_COLUMNS),
+        "exports": list(exports),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "torch_version": torch.__version__,
+        "checksums": checksums,
+        **(extra_metadata or {}),
+    }
+    with open(os.path.join(tmp_dir, METADATA_FILE_NAME), 'w') as f:
+        json.dump(metadata, f, indent=4)
+
+    shutil.rmtree(bundle_dir, ignore_errors=True)
+    os.replace(tmp_dir, bundle_dir)
+    return metadata
+
+
+def is_model_bundle(path):
+    """
+    Function to check whether a path is a model bundle rather than a pickled model.
+
+    Args:
+        path (str): The model path.
+
+    Returns:
+        bool: True if the path is a directory with a bundle metadata file.
+    """
+    return os.path.isfile(os.path.join(path, METADATA_FILE_NAME))
+
+
+class OnnxModel:
+    """
+    Runs an exported NCF model with onnxruntime on the CPU, called like the torch model it was exported from.
+    """
+
+    def __init__(self, path):
+        """
+        Initializes the inference session.
+
+        Args:
+            path (str): The path to the ONNX file.
+        """
+        try:
+            import onnxruntime
+        except ImportError as ex:
+            raise ImportError("The onnx inference backend needs the onnxruntime package") from ex
+        self.session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+
+    def __call__(self, features):
+        """
+        Run the model on a batch of one-hot students.
+
+        Args:
+            features (torch.Tensor): A (batch, num_features) float32 tensor.
+
+        Returns:
+            torch.Tensor: A (batch, num_courses) tensor of course probabilities.
+        """
+        probabilities, = self.session.run(None, {"features": features.numpy()})
+        return torch.from_numpy(probabilities)
+
+
+def load_model_bundle(bundle_dir, backend="torch"):
+    """
+    Function to load a model bundle written by `save_model_bundle`.
+
+    Args:
+        bundle_dir (str): The directory of the bundle.
+        backend (str): How to run the model: "torch" rebuilds the model from its state_dict,
+            "torchscript" and "onnx" load the matching export (onnx runs with onnxruntime).
+
+    Returns:
+        tuple: The model (in evaluation mode), the user feature names, the course names and the metadata.
+    """
+    with open(os.path.join(bundle_dir, METADATA_FILE_NAME), 'r') as f:
+        metadata = json.load(f)
+    if metadata["format_version"] > BUNDLE_FORMAT_VERSION:
+        raise ValueError(f"Model bundle format {metadata['format_version']} is newer than the supported "
+                         f"format {BUNDLE_FORMAT_VERSION}")
+    with open(os.path.join(bundle_dir, USER_FEATURES_FILE_NAME), 'r') as f:
+        user_features = json.load(f)
+    with open(os.path.join(bundle_dir, COURSES_LIST_FILE_NAME), 'r') as f:
+        courses_list = json.load(f)
+
+    if backend == "torch":
+        from scripts.train_model_DL import NCFModel
+        # Building the model on the meta device skips the random initialization the weights would replace
+        with torch.device("meta"):
+            model = NCFModel(metadata["num_features"], metadata["num_courses"])
+        state_dict = torch.load(os.path.join(bundle_dir, WEIGHTS_FILE_NAME), map_location="cpu", weights_only=True)
+        model.load_state_dict(state_dict, assign=True)
+        model.eval()
+    elif backend in EXPORT_FILE_NAMES:
+        if backend not in metadata["exports"]:
+            raise ValueError(f"The model bundle in {bundle_dir} has no {backend} export")
+        export_path = os.path.join(bundle_dir, EXPORT_FILE_NAMES[backend])
+        if backend == "torchscript":
+            model = torch.jit.load(export_path, map_location="cpu")
+            model.eval()
+        else:
+            model = OnnxModel(export_path)
+    else:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    return model, user_features, courses_list, metadata
@@ -0,0 +1,99 @@
+import csv
+import argparse
+
+import numpy as np
+
+from constants import NCF_FEATURE_COLUMNS, NCF_TOPK_TABLE_PATH, NCF_TOPK_TABLE_K
+from scripts.inference_DL import NCFPredictor
+
+# Persona files whose feature combinations are precomputed
+DEFAULT_PERSONA_PATHS = (
+    "data/raw/Student_Personas_v2.csv",
+    "data/raw/student_personas_v1.csv",
+    "data/processed/labeled_data_student_to_courseRecomm.csv",
+)
+
+# Column names of the older persona file that differ from the model's column names
+LEGACY_COLUMN_NAMES = {
+    "Major": "Field_Of_Study",
+    "Top Hobby": "Primary_Hobby",
+    "Second Favorite Hobby": "Secondary_Hobby",
+    "Desired Career Field": "Desired_Career_Field",
+}
+
+
+def load_personas(persona_paths):
+    """
+    Function to read the NCF feature columns of every persona in the given CSV files.
+
+    Args:
+        persona_paths (list): Paths to the persona CSV files.
+
+    Returns:
+        list: A list of dictionaries with the NCF feature columns of each persona.
+    """
+    personas = []
+    for persona_path in persona_paths:
+        with open(persona_path, 'r', encoding="utf-8", errors="replace") as persona_file:
+            for row in csv.DictReader(persona_file):
+                row = {LEGACY_COLUMN_NAMES.get(key, key): value for key, value in row.items()}
+                personas.append({column: (row.get(column) or "").strip() for column in NCF_FEATURE_COLUMNS})
+    return personas
+
+
+def precompute_topk_table(predictor, personas, output_path=NCF_TOPK_TABLE_PATH, top_k=NCF_TOPK_TABLE_K,
+                          batch_size=1024):
+    """
+    Function to precompute the top-k courses of every distinct feature combination and save them as a compact table.
+
+    The table is a `.npz` file with the active feature indices of each combination (padded with -1),
+    the indices of its top-k courses (best first) and their probabilities, plus the course list it was computed for
+    and the provenance the predictor checks before serving it (model version, inference backend, vocabulary hashes).
+
+    Args:
+        predictor (scripts.inference_DL.NCFPredictor): The predictor to run the model with.
+        personas (list): The personas whose feature combinations are precomputed.
+        output_path (str): The path of the `.npz` file to write.
+        top_k (int): The number of courses stored per combination.
+        batch_size (int): The number of combinations scored per forward pass.
+
+    Returns:
+        int: The number of distinct combinations in the table.
+    """
+    keys = list(dict.fromkeys(predictor.feature_key(persona) for persona in personas))
+    top_k = min(top_k, len(predictor.courses_list))
+
+    feature_indices = np.full((len(keys), len(NCF_FEATURE_COLUMNS)), -1, dtype=np.int32)
+    top_indices = np.zeros((len(keys), top_k), dtype=np.uint16)
+    top_scores = np.zeros((len(keys), top_k), dtype=np.float16)
+    for start in range(0, len(keys), batch_size):
+        batch_keys = keys[start:start + batch_size]
+        probabilities = predictor.predict_proba_keys(batch_keys)
+        batch_top = np.argsort(-probabilities, axis=1, kind="stable")[:, :top_k]
+        top_indices[start:start + len(batch_keys)] = batch_top
+        top_scores[start:start + len(batch_keys)] = np.take_along_axis(probabilities, batch_top, axis=1)
+        for row, key in enumerate(batch_keys, start=start):
+            feature_indices[row, :len(key)] = key
+
+    np.savez_compressed(
+        output_path,
+        feature_indices=feature_indices,
+        top_indices=top_indices,
+        top_scores=top_scores,
+        courses_list=np.array(predictor.courses_list),
+        **{name: np.array(value) for name, value in predictor.get_topk_table_provenance().items()}
+    )
+    return len(keys)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the NCF top-k courses of every persona feature combination.")
+    parser.add_argument("--data", nargs="+", default=list(DEFAULT_PERSONA_PATHS), help="Persona CSV files")
+    parser.add_argument("--output", default=NCF_TOPK_TABLE_PATH, help="Path of the top-k table to write")
+    parser.add_argument("--top-k", type=int, default=NCF_TOPK_TABLE_K, help="Number of courses stored per combination")
+    args = parser.parse_args()
+
+    # The table being rebuilt must not answer its own lookups
+    predictor = NCFPredictor(topk_table_path=None)
+    num_combinations = precompute_topk_table(predictor, load_personas(args.data), args.output, args.top_k)
+    print(f"[+] Precomputed the top {args.top_k} courses of {num_combinations} feature combinations into {args.output}")
@@ -1,9 +1,70 @@
 import pandas as pd
 import numpy as np
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler, SequentialSampler, Subset
 from sklearn.model_selection import train_test_split
 import json
+import os
+
+from constants import (NCF_FEATURE_COLUMNS, NCF_USER_FEATURES_PATH, NCF_COURSES_LIST_PATH, NCF_PACKED_DATA_DIR,
+                       PREPROCESS_CHUNK_SIZE, TRAIN_BATCH_SIZE, TRAIN_NUM_WORKERS, TRAIN_PIN_MEMORY,
+                       TRAIN_VALIDATION_SIZE)
+
+# The separator between two course names of a "Recommendations" list: a comma next to at least one quote.
+# Commas inside course names are not next to a quote, and hand-labeled rows with a missing quote still split correctly.
+__recommendation_separator__ = r",(?:(?<=['\"],)\s*['\"]?|\s*['\"])"
+
+
+def parse_recommendations(recommendations):
+    """
+    Splits the "Recommendations" column into one course name per (row, course) pair.
+
+    Each cell is the string form of a list of course names. All cells are split at once with vectorized string
+    operations, so course names containing commas stay whole. Brackets, quotes and spaces are only
+    stripped from the distinct raw names, not from every occurrence.
+
+    Args:
+        recommendations (pd.Series): The "Recommendations" column.
+
+    Returns:
+        tuple: The row position of every recommended course, and the course names as a pd.Index with one entry per pair.
+    """
+    raw_courses = recommendations.astype(str).str.split(__recommendation_separator__, regex=True).explode()
+    raw_codes, raw_names = pd.factorize(raw_courses)
+
+    # Cleaning the distinct raw names only, and dropping the empty ones left by empty lists
+    clean_names = raw_names.str.strip().str.strip("[]").str.strip().str.strip("'\"").str.strip()
+    keep = (clean_names != "")[raw_codes]
+    row_positions = recommendations.index.get_indexer(raw_courses.index)[keep]
+    return row_positions, clean_names[raw_codes[keep]]
+
+
+def build_course_labels(recommendations, courses_list=None):
+    """
+    Builds the multi-hot course labels from the "Recommendations" column.
+
+    The labels are filled with a single NumPy scatter instead of one substring test per course and row.
+
+    Args:
+        recommendations (pd.Series): The "Recommendations" column.
+        courses_list (list): A fixed course vocabulary to label against; courses outside of it are ignored.
+            By default the vocabulary is the sorted list of courses found in the column.
+
+    Returns:
+        tuple: The list of course names, and a (rows, courses) uint8 array with a 1 for every recommended course.
+    """
+    row_positions, names = parse_recommendations(recommendations)
+    if courses_list is None:
+        codes, courses_list = pd.factorize(names, sort=True)
+        courses_list = courses_list.tolist()
+    else:
+        codes = pd.Index(courses_list).get_indexer(names)
+        row_positions, codes = row_positions[codes >= 0], codes[codes >= 0]
+
+    labels = np.zeros((len(recommendations), len(courses_list)), dtype=np.uint8)
+    labels[row_positions, codes] = 1
+    return courses_list, labels
+
 
 class DataProcessor:
     """
@@ -11,14 +72,18 @@ class DataProcessor:
     This class handles the generation of user and course features and splits the dataset into training and testing sets.
     """
 
-    def __init__(self, filepath):
+    def __init__(self, filepath, user_features_path=NCF_USER_FEATURES_PATH, courses_list_path=NCF_COURSES_LIST_PATH):
         """
         Initializes the DataProcessor class by loading the data from a specified CSV file path.
         
         Args:
             filepath (str): The path to the CSV file containing the dataset.
+            user_features_path (str): The path to write the JSON list of one-hot user feature names to.
+            courses_list_path (str): The path to write the JSON list of course names to.
         """
         self.df = pd.read_csv(filepath)
+        self.user_features_path = user_features_path
+        self.courses_list_path = courses_list_path
         print("Data loaded successfully.")
 
     def preprocess_courses(self):
@@ -28,18 +93,13 @@ class DataProcessor:
         Returns:
             pd.DataFrame: A DataFrame with added binary columns for each course, indicating course recommendations.
         """
-        courses_list = set()
-        for recommendations in self.df['Recommendations']:
-            courses = [course.strip().replace("'", "") for course in recommendations.strip("[]").split(",")]
-            courses_list.update(courses)
-        
-        self.courses_list = list(courses_list)
-        with open('D:/Duke/Sem2/DLA/CourseRecomm/CourseRecom_git/student_class_recommender/data/processed/courses_list.json', 'w') as file:
+        self.courses_list, labels = build_course_labels(self.df['Recommendations'])
+        with open(self.courses_list_path, 'w') as file:
             json.dump(self.courses_list, file, indent=4)
 
         # Create binary features for each course
-        for course in self.courses_list:
-            self.df[course] = self.df['Recommendations'].apply(lambda x: int(course in x))
+        course_features_df = pd.DataFrame(labels, columns=self.courses_list, index=self.df.index)
+        self.df = pd.concat([self.df, course_features_df], axis=1)
 
         print("Course features created.")
         return self.df
@@ -51,11 +111,11 @@ class DataProcessor:
         Returns:
             pd.DataFrame: A DataFrame with one-hot encoded user features.
         """
-        feature_columns = ['Field_Of_Study', 'Primary_Hobby', 'Secondary_Hobby', 'Desired_Career_Field']
+        feature_columns = list(NCF_FEATURE_COLUMNS)
         user_features_df = pd.get_dummies(self.df[feature_columns])
         user_features = user_features_df.columns.tolist()
 
-        with open('D:/Duke/Sem2/DLA/CourseRecomm/CourseRecom_git/student_class_recommender/data/processed/user_features.json', 'w') as file:
+        with open(self.user_features_path, 'w') as file:
             json.dump(user_features, file, indent=4)
 
         print("User features processed.")
@@ -80,6 +140,7 @@ class DataProcessor:
 class CustomDataset(Dataset):
     """
     A class to create PyTorch datasets from provided features and labels for model training and evaluation.
+    Indexing with a list of positions returns a whole batch (see `get_batch_loader`).
     """
     def __init__(self, features, labels):
         """
@@ -98,29 +159,38 @@ class CustomDataset(Dataset):
 
     def __getitem__(self, idx):
         """
-        Retrieve a single item from the dataset.
+        Retrieve a single item or a batch of items from the dataset.
 
         Args:
-            idx (int): The index of the item to retrieve.
+            idx (int or list): The index of the item, or the indices of a batch.
 
         Returns:
-            tuple: A tuple containing the feature and label tensors for the specified index.
+            tuple: A tuple containing the feature and label tensors for the specified index or indices.
         """
         return self.features[idx], self.labels[idx]
 
-def preprocess_workflow(filepath):
+def preprocess_workflow(filepath, user_features_path=NCF_USER_FEATURES_PATH, courses_list_path=NCF_COURSES_LIST_PATH,
+                        batch_size=TRAIN_BATCH_SIZE, num_workers=TRAIN_NUM_WORKERS, pin_memory=TRAIN_PIN_MEMORY,
+                        validation_size=TRAIN_VALIDATION_SIZE):
     """
     Handles the complete preprocessing workflow including data loading, processing,
     dataset creation, and dataloader preparation.
 
     Args:
         filepath (str): Path to the CSV file containing the dataset.
+        user_features_path (str): The path to write the JSON list of one-hot user feature names to.
+        courses_list_path (str): The path to write the JSON list of course names to.
+        batch_size (int): The number of samples per batch.
+        num_workers (int): The number of DataLoader worker processes (0 loads in the main process).
+        pin_memory (bool): Whether the DataLoaders copy batches into pinned memory.
+        validation_size (float): The fraction of the training rows held out for validation (0 for none).
 
     Returns:
-        tuple: Contains train and test splits for features and labels, and DataLoaders for both.
+        tuple: Contains train and test splits for features and labels, and DataLoaders for training, testing
+            and validation (None without a validation split).
     """
     # Initialize the data processor and preprocess data
-    processor = DataProcessor(filepath)
+    processor = DataProcessor(filepath, user_features_path, courses_list_path)
     df_with_courses = processor.preprocess_courses()
     user_features_df = processor.preprocess_user_features()
     labels = df_with_courses[processor.courses_list]
@@ -134,10 +204,329 @@ def preprocess_workflow(filepath):
     print("Datasets for training and testing have been created.")
 
     # Prepare DataLoaders
-    train_loader = DataLoader(train_dataset, batch_size=16, shuffle=True)
-    test_loader = DataLoader(test_dataset, batch_size=16, shuffle=False)
+    loader_options = {"batch_size": batch_size, "num_workers": num_workers, "pin_memory": pin_memory}
+    train_loader, val_loader = get_train_validation_loaders(train_dataset, validation_size, **loader_options)
+    test_loader = get_batch_loader(test_dataset, shuffle=False, **loader_options)
     print("DataLoaders for training and testing have been prepared.")
 
-    return X_train, X_test, Y_train, Y_test, train_loader, test_loader
+    return X_train, X_test, Y_train, Y_test, train_loader, test_loader, val_loader
+
+
+class PackedMatrix:
+    """
+    Read-only view of a 0/1 matrix stored bit-packed (8 columns per byte) in a memory-mapped file.
+
+    Only the rows being read are loaded and unpacked, so the matrix can be much larger than memory.
+    A view can be restricted to a subset of the rows, e.g. the training split.
+    """
+
+    def __init__(self, path, num_rows, num_columns, rows=None):
+        """
+        Initializes the view. The file is only opened on the first read.
+
+        Args:
+            path (str): The path of the bit-packed file.
+            num_rows (int): The number of rows stored in the file.
+            num_columns (int): The number of columns before packing.
+            rows (np.ndarray): The rows of the file this view exposes, in order. By default all of them.
+        """
+        self.path = path
+        self.num_rows = num_rows
+        self.num_columns = num_columns
+        self.rows = rows
+        self.array = None
+
+    @property
+    def shape(self):
+        """tuple: The (rows, columns) shape of the unpacked view."""
+        return len(self), self.num_columns
+
+    def __len__(self):
+        """Return the number of rows of the view."""
+        return self.num_rows if self.rows is None else len(self.rows)
+
+    def __getstate__(self):
+        """Leave the memory map out when the view is sent to a DataLoader worker; each worker opens its own."""
+        state = self.__dict__.copy()
+        state["array"] = None
+        return state
+
+    def subset(self, rows):
+        """
+        Restrict the view to some of its rows.
+
+        Args:
+            rows (np.ndarray): Positions of the rows within this view.
+
+        Returns:
+            PackedMatrix: A view over the selected rows.
+        """
+        rows = np.asarray(rows) if self.rows is None else self.rows[rows]
+        return PackedMatrix(self.path, self.num_rows, self.num_columns, rows)
+
+    def __getitem__(self, idx):
+        """
+        Read and unpack rows of the view.
+
+        Args:
+            idx (int or np.ndarray): Position(s) of the rows within the view.
+
+        Returns:
+            np.ndarray: The unpacked uint8 row, or a (len(idx), columns) array.
+        """
+        if self.array is None:
+            self.array = np.memmap(self.path, dtype=np.uint8, mode="r",
+                                   shape=(self.num_rows, packed_width(self.num_columns)))
+        rows = idx if self.rows is None else self.rows[idx]
+        return np.unpackbits(self.array[rows], axis=-1, count=self.num_columns, bitorder="little")
+
+
+class MemmapDataset(Dataset):
+    """
+    A dataset reading features and labels from bit-packed memory-mapped files instead of in-memory tensors.
+
+    Indexing with a list of positions returns a whole batch, so `get_batch_loader` can read and unpack
+    a batch with one memory map access per file instead of one per row.
+    """
+    def __init__(self, features, labels):
+        """
+        Initialize the dataset with features and labels.
+
+        Args:
+            features (PackedMatrix): The packed one-hot input features.
+            labels (PackedMatrix): The packed multi-hot course labels, row-aligned with the features.
+        """
+        self.features = features
+        self.labels = labels
+
+    def __len__(self):
+        """Return the total number of samples in the dataset."""
+        return len(self.features)
+
+    def __getitem__(self, idx):
+        """
+        Retrieve a single item or a batch of items from the dataset.
+
+        Args:
+            idx (int or list): The index of the item, or the indices of a batch.
+
+        Returns:
+            tuple: A tuple containing the float32 feature and label tensors for the specified index or indices.
+        """
+        # Sorted positions read the memory maps front to back; the order inside a batch does not matter
+        idx = np.sort(idx) if isinstance(idx, list) else idx
+        features = torch.from_numpy(self.features[idx]).to(torch.float32)
+        labels = torch.from_numpy(self.labels[idx]).to(torch.float32)
+        return features, labels
+
+
+def packed_width(num_columns):
+    """
+    Function to get the number of bytes of a bit-packed row.
+
+    Args:
+        num_columns (int): The number of 0/1 columns.
+
+    Returns:
+        int: The number of bytes per packed row.
+    """
+    return (num_columns + 7) // 8
+
+
+def read_csv_chunks(filepath, chunk_size=PREPROCESS_CHUNK_SIZE):
+    """
+    Function to read the NCF columns of a labeled CSV file in chunks.
+
+    Args:
+        filepath (str): The path to the CSV file.
+        chunk_size (int): The number of rows per chunk.
+
+    Returns:
+        Iterator: The chunks, as DataFrames with the NCF feature columns and the "Recommendations" column.
+    """
+    return pd.read_csv(filepath, usecols=[*NCF_FEATURE_COLUMNS, 'Recommendations'], dtype=str, chunksize=chunk_size)
+
+
+def stream_preprocess(filepath, output_dir=NCF_PACKED_DATA_DIR, chunk_size=PREPROCESS_CHUNK_SIZE,
+                      user_features_path=NCF_USER_FEATURES_PATH, courses_list_path=NCF_COURSES_LIST_PATH):
+    """
+    Preprocesses a labeled CSV file in chunks into bit-packed, memory-mappable feature and label files.
+
+    The first pass collects the row count and the feature and course vocabularies, the second pass one-hot
+    encodes each chunk and writes it straight into the files. Memory use depends on the chunk size,
+    not on the number of rows. The vocabularies are written to the same JSON files as `DataProcessor`,
+    with the same one-hot feature names as `pd.get_dummies`.
+
+    Args:
+        filepath (str): The path to the CSV file containing the dataset.
+        output_dir (str): The directory to write `features.u8`, `labels.u8` and `metadata.json` to.
+        chunk_size (int): The number of rows read at once.
+        user_features_path (str): The path to write the JSON list of one-hot user feature names to.
+        courses_list_path (str): The path to write the JSON list of course names to.
+
+    Returns:
+        dict: The metadata of the packed data, as saved in `metadata.json`.
+    """
+    # First pass: the vocabularies and the number of rows
+    num_rows = 0
+    feature_values = {column: set() for column in NCF_FEATURE_COLUMNS}
+    courses = set()
+    for chunk in read_csv_chunks(filepath, chunk_size):
+        num_rows += len(chunk)
+        for column in NCF_FEATURE_COLUMNS:
+            feature_values[column].update(chunk[column].dropna().unique())
+        courses.update(parse_recommendations(chunk['Recommendations'])[1].unique())
+
+    feature_values = {column: sorted(values) for column, values in feature_values.items()}
+    user_features = [f"{column}_{value}" for column, values in feature_values.items() for value in values]
+    courses_list = sorted(courses)
+    with open(user_features_path, 'w') as file:
+        json.dump(user_features, file, indent=4)
+    with open(courses_list_path, 'w') as file:
+        json.dump(courses_list, file, indent=4)
+    print(f"Found {num_rows} rows, {len(user_features)} user features and {len(courses_list)} courses.")
+
+    # Second pass: encoding each chunk straight into the packed files
+    os.makedirs(output_dir, exist_ok=True)
+    metadata = {
+        "num_rows": num_rows,
+        "num_features": len(user_features),
+        "num_courses": len(courses_list),
+        "features_file": "features.u8",
+        "labels_file": "labels.u8",
+    }
+    features_file = np.memmap(os.path.join(output_dir, metadata["features_file"]), dtype=np.uint8, mode="w+",
+                              shape=(max(num_rows, 1), packed_width(len(user_features))))
+    labels_file = np.memmap(os.path.join(output_dir, metadata["labels_file"]), dtype=np.uint8, mode="w+",
+                            shape=(max(num_rows, 1), packed_width(len(courses_list))))
+    start = 0
+    for chunk in read_csv_chunks(filepath, chunk_size):
+        features = np.zeros((len(chunk), len(user_features)), dtype=np.uint8)
+        offset = 0
+        for column, values in feature_values.items():
+            codes = pd.Categorical(chunk[column], categories=values).codes.astype(np.int64)
+            rows = np.flatnonzero(codes >= 0)
+            features[rows, offset + codes[rows]] = 1
+            offset += len(values)
+        _, labels = build_course_labels(chunk['Recommendations'], courses_list)
+
+        features_file[start:start + len(chunk)] = np.packbits(features, axis=1, bitorder="little")
+        labels_file[start:start + len(chunk)] = np.packbits(labels, axis=1, bitorder="little")
+        start += len(chunk)
+    features_file.flush()
+    labels_file.flush()
+    del features_file, labels_file
+
+    # The metadata is written last, so an interrupted run is not mistaken for a complete one
+    with open(os.path.join(output_dir, "metadata.json"), 'w') as file:
+        json.dump(metadata, file, indent=4)
+    print(f"Packed features and labels written to {output_dir}.")
+    return metadata
 
 
+def load_packed_data(output_dir=NCF_PACKED_DATA_DIR):
+    """
+    Function to open the packed features and labels written by `stream_preprocess`.
+
+    Args:
+        output_dir (str): The directory of the packed data.
+
+    Returns:
+        tuple: The features and the labels, as PackedMatrix views over all rows.
+    """
+    with open(os.path.join(output_dir, "metadata.json"), 'r') as file:
+        metadata = json.load(file)
+    features = PackedMatrix(os.path.join(output_dir, metadata["features_file"]),
+                            metadata["num_rows"], metadata["num_features"])
+    labels = PackedMatrix(os.path.join(output_dir, metadata["labels_file"]),
+                          metadata["num_rows"], metadata["num_courses"])
+    return features, labels
+
+
+def get_batch_loader(dataset, batch_size=TRAIN_BATCH_SIZE, shuffle=False, num_workers=TRAIN_NUM_WORKERS,
+                     pin_memory=TRAIN_PIN_MEMORY):
+    """
+    Function to create a DataLoader fetching whole batches from a dataset indexable with a list of positions,
+    such as CustomDataset or MemmapDataset, instead of collating one sample at a time.
+
+    Args:
+        dataset (torch.utils.data.Dataset): The dataset to load.
+        batch_size (int): The number of samples per batch.
+        shuffle (bool): Whether to reshuffle the samples at every epoch.
+        num_workers (int): The number of worker processes (0 loads in the main process).
+        pin_memory (bool): Whether to copy batches into pinned memory.
+
+    Returns:
+        torch.utils.data.DataLoader: The DataLoader, yielding (features, labels) batches.
+    """
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    # batch_size=None hands each list of indices from the batch sampler to the dataset as is
+    return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last=False), batch_size=None,
+                      num_workers=num_workers, pin_memory=pin_memory, persistent_workers=num_workers > 0)
+
+
+def get_train_validation_loaders(train_dataset, validation_size=TRAIN_VALIDATION_SIZE, random_state=42, **kwargs):
+    """
+    Function to hold out part of the training set for validation and create the DataLoaders of both parts.
+
+    Args:
+        train_dataset (torch.utils.data.Dataset): The training dataset.
+        validation_size (float): The fraction of the training rows held out (0 for none).
+        random_state (int): The seed of the split.
+        **kwargs: Other `get_batch_loader` arguments.
+
+    Returns:
+        tuple: The training DataLoader (shuffled) and the validation DataLoader, or None without a validation split.
+    """
+    if not validation_size:
+        return get_batch_loader(train_dataset, shuffle=True, **kwargs), None
+    permutation = np.random.default_rng(random_state).permutation(len(train_dataset))
+    num_validation = int(np.ceil(validation_size * len(train_dataset)))
+    validation_rows, train_rows = np.sort(permutation[:num_validation]), np.sort(permutation[num_validation:])
+    train_loader = get_batch_loader(Subset(train_dataset, train_rows.tolist()), shuffle=True, **kwargs)
+    val_loader = get_batch_loader(Subset(train_dataset, validation_rows.tolist()), shuffle=False, **kwargs)
+    print(f"Held out {num_validation} training rows for validation.")
+    return train_loader, val_loader
+
+
+def streaming_preprocess_workflow(filepath, output_dir=NCF_PACKED_DATA_DIR, chunk_size=PREPROCESS_CHUNK_SIZE,
+                                  batch_size=TRAIN_BATCH_SIZE, num_workers=TRAIN_NUM_WORKERS,
+                                  pin_memory=TRAIN_PIN_MEMORY, validation_size=TRAIN_VALIDATION_SIZE,
+                                  test_size=0.2, random_state=42):
+    """
+    Handles the streaming preprocessing workflow: chunked preprocessing into packed files,
+    a train/test split of the row indices, and DataLoaders reading from the memory-mapped files.
+
+    Args:
+        filepath (str): Path to the CSV file containing the dataset.
+        output_dir (str): The directory to write the packed data to.
+        chunk_size (int): The number of rows read at once.
+        batch_size (int): The number of samples per batch.
+        num_workers (int): The number of DataLoader worker processes (0 loads in the main process).
+        pin_memory (bool): Whether the DataLoaders copy batches into pinned memory.
+        validation_size (float): The fraction of the training rows held out for validation (0 for none).
+        test_size (float): The fraction of the rows kept for testing.
+        random_state (int): The seed of the train/test split.
+
+    Returns:
+        tuple: Contains train and test splits for features and labels (as PackedMatrix views), and DataLoaders
+            for training, testing and validation (None without a validation split).
+    """
+    stream_preprocess(filepath, output_dir, chunk_size)
+    features, labels = load_packed_data(output_dir)
+
+    # Split the row indices; the rows themselves stay on disk
+    permutation = np.random.default_rng(random_state).permutation(len(features))
+    num_test = int(np.ceil(test_size * len(features)))
+    test_rows, train_rows = np.sort(permutation[:num_test]), np.sort(permutation[num_test:])
+    X_train, X_test = features.subset(train_rows), features.subset(test_rows)
+    Y_train, Y_test = labels.subset(train_rows), labels.subset(test_rows)
+    print("Data split into train and test sets.")
+
+    loader_options = {"batch_size": batch_size, "num_workers": num_workers, "pin_memory": pin_memory}
+    train_loader, val_loader = get_train_validation_loaders(MemmapDataset(X_train, Y_train), validation_size,
+                                                            random_state, **loader_options)
+    test_loader = get_batch_loader(MemmapDataset(X_test, Y_test), shuffle=False, **loader_options)
+    print("DataLoaders for training and testing have been prepared.")
+
+    return X_train, X_test, Y_train, Y_test, train_loader, test_loader, val_loader
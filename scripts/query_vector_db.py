@@ -1,27 +1,171 @@
-import chromadb
+import time
+import threading
+from collections import OrderedDict
 
-from constants import CHROMA_HOST, CHROMA_PORT, CHROMA_COLLECTION_NAME, COURSE_RECOMMENDATION_PROMPT
+import numpy as np
+
+from constants import (
+    CHROMA_HOST, CHROMA_PORT, CHROMA_COLLECTION_NAME, CHROMA_COLLECTION_VERSION_KEY, CHROMA_VERSION_CHECK_SECONDS,
+    COURSE_RECOMMENDATION_PROMPT, SEARCH_CACHE_MAX_ENTRIES, RETRIEVAL_BACKEND
+)
+from scripts.embedding_cache import get_query_embedding_function
 from util import clean_text, get_formatted_key_value_pairs, get_response_from_llm, get_unique_values_from_dict
-from scripts.main_DL import predictions
+
+# Reused ChromaDB client, created on first use
+__chroma_client__ = None
+
+
+class SearchCache:
+    """
+    Size-bounded, thread-safe LRU cache of search results.
+
+    Entries are keyed on the collection name and version stamp, so re-ingesting the collection
+    (which writes a new stamp) makes every older entry unreachable; they are evicted as new ones come in.
+    """
+
+    def __init__(self, max_entries=SEARCH_CACHE_MAX_ENTRIES):
+        """
+        Initializes the cache.
+
+        Args:
+            max_entries (int): The maximum number of search results kept.
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Collection name -> (version stamp, time it was last read from the server)
+        self.versions = {}
+
+    def get(self, key):
+        """
+        Look up cached search results, marking them as recently used.
+
+        Args:
+            key (tuple): The cache key.
+
+        Returns:
+            dict: The cached search results, or None on a miss.
+        """
+        with self.lock:
+            search_results = self.entries.get(key)
+            if search_results is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return search_results
+
+    def set(self, key, search_results):
+        """
+        Store search results, evicting the least recently used entry when full.
+
+        Args:
+            key (tuple): The cache key.
+            search_results (dict): The search results to store.
+        """
+        with self.lock:
+            self.entries[key] = search_results
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: The number of hits, misses and stored entries.
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+
+__search_cache__ = SearchCache()
+
+
+def get_search_cache_stats():
+    """
+    Function to get the search cache counters.
+
+    Returns:
+        dict: The number of hits, misses and stored entries.
+    """
+    return __search_cache__.stats()
 
 
-def get_chroma_db_collection():
+def get_chroma_client():
     """
-    Function to get the ChromaDB collection.
+    Function to get the process-wide ChromaDB client, creating it on first use.
+    The client keeps its HTTP connection pool, so every search reuses the same connections.
 
     Returns:
-        chromadb.Collection: The ChromaDB collection.
+        chromadb.HttpClient: The ChromaDB client.
     """
-    # Creating a ChromaDB client
-    chroma_client = chromadb.HttpClient(f"{CHROMA_HOST}:{CHROMA_PORT}")
+    global __chroma_client__
+    if __chroma_client__ is None:
+        import chromadb
+        __chroma_client__ = chromadb.HttpClient(f"{CHROMA_HOST}:{CHROMA_PORT}")
+    return __chroma_client__
 
-    # Getting the collection from the ChromaDB client
-    course_collection = chroma_client.get_collection(CHROMA_COLLECTION_NAME)
+
+def get_chroma_db_collection(backend: str = RETRIEVAL_BACKEND):
+    """
+    Function to get the course collection of the configured retrieval backend.
+
+    Both backends return an object with the `name`, `metadata` and `query(query_texts, n_results)` of a
+    `chromadb.Collection`: the collection on the Chroma server for "chroma", or a
+    `scripts.local_vector_index.LocalVectorIndex` for "local".
+
+    Args:
+        backend (str, optional): The retrieval backend, "chroma" or "local". Defaults to `RETRIEVAL_BACKEND`.
+
+    Returns:
+        chromadb.Collection: The ChromaDB collection, or the local index standing in for it.
+    """
+    if backend == "local":
+        from scripts.local_vector_index import LocalVectorIndex
+        return LocalVectorIndex()
+    if backend != "chroma":
+        raise ValueError(f"Unknown retrieval backend: {backend}")
+
+    # Getting the collection from the shared ChromaDB client
+    course_collection = get_chroma_client().get_collection(CHROMA_COLLECTION_NAME)
 
     return course_collection
 
 
-def perform_search(query: str, course_collection: chromadb.Collection = None, num_results: int = 10):
+def get_collection_version(course_collection: "chromadb.Collection"):
+    """
+    Function to get the version stamp written by the last ingestion into a collection.
+    The stamp is re-read from the server at most every `CHROMA_VERSION_CHECK_SECONDS`.
+
+    Args:
+        course_collection (chromadb.Collection): The ChromaDB collection.
+
+    Returns:
+        str: The version stamp, or None if the collection was never stamped.
+    """
+    name = course_collection.name
+    now = time.monotonic()
+    cached = __search_cache__.versions.get(name)
+    if cached is not None and now - cached[1] < CHROMA_VERSION_CHECK_SECONDS:
+        return cached[0]
+
+    if cached is None:
+        metadata = course_collection.metadata
+    elif hasattr(course_collection, "refresh"):
+        metadata = course_collection.refresh()
+    else:
+        metadata = get_chroma_client().get_collection(name).metadata
+    version = (metadata or {}).get(CHROMA_COLLECTION_VERSION_KEY)
+    __search_cache__.versions[name] = (version, now)
+    return version
+
+
+def perform_search(query: str, course_collection: "chromadb.Collection" = None, num_results: int = 10,
+                   use_cache: bool = True):
     """
     Function to perform a search in the ChromaDB collection.
 
@@ -29,20 +173,40 @@ def perform_search(query: str, course_collection: chromadb.Collection = None, nu
         query (str): The query to search for.
         course_collection (chromadb.Collection, optional): The ChromaDB collection to search in. Defaults to None.
         num_results (int, optional): The number of results to return. Defaults to 15.
+        use_cache (bool, optional): Whether to serve repeated queries from the in-process cache. Defaults to True.
 
     Returns:
-        dict: The search results.
+        dict: The search results. Cached results are shared between callers and must not be modified.
     """
+    if course_collection is None:
+        course_collection = get_chroma_db_collection()
+
+    cache_key = None
+    if use_cache:
+        cache_key = (course_collection.name, get_collection_version(course_collection), query, num_results)
+        search_results = __search_cache__.get(cache_key)
+        if search_results is not None:
+            return search_results
+
+    # Embedding the query with the collection's own function (the local index has one), or the query one
+    embedding_function = getattr(course_collection, "embedding_function", None) or get_query_embedding_function()
+    query_embeddings = np.asarray(embedding_function([query]), dtype=np.float32).tolist()
+
     # Performing the search in the ChromaDB collection
     search_results = course_collection.query(
-        query_texts=[query],
+        query_embeddings=query_embeddings,
         n_results=num_results
     )
 
+    if cache_key is not None:
+        __search_cache__.set(cache_key, search_results)
+
     return search_results
 
 
 if __name__ == "__main__":
+    from scripts.main_DL import predictions
+
     # Defining the demo profile details
     demo_profile_details = {
         "Field_Of_Study": "Computer Science",
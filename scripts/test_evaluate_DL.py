@@ -39,4 +39,74 @@ def evaluate(model, loader):
     # Calculate average loss over all batches
     average_loss = total_loss / len(loader)
 
-    return average_loss
\ No newline at end of file
+    return average_loss
+
+def ranking_metric_sums(scores, labels, k):
+    """
+    Compute the per-batch sums of the ranking metrics at k, vectorized over all students of the batch.
+
+    Args:
+    scores (torch.Tensor): The predicted course probabilities, of shape (students, courses).
+    labels (torch.Tensor): The multi-hot relevant courses, of the same shape.
+    k (int): The number of top-ranked courses considered.
+
+    Returns:
+    dict: The summed precision, recall, NDCG and hits of the batch, and the number of students with at least
+    one relevant course, which are the only ones counted.
+    """
+    k = min(k, scores.shape[1])
+    relevant = labels > 0
+    num_relevant = relevant.sum(dim=1)
+    counted = num_relevant > 0
+
+    # Relevance of the k best-ranked courses of every student
+    top_indices = torch.topk(scores, k, dim=1).indices
+    hits = relevant.gather(1, top_indices).float()
+    num_hits = hits.sum(dim=1)
+
+    # DCG of the ranking, and the ideal DCG with all relevant courses ranked first
+    discounts = 1.0 / torch.log2(torch.arange(2, k + 2, dtype=torch.float32))
+    dcg = (hits * discounts).sum(dim=1)
+    ideal_discounts = torch.cat([torch.zeros(1), discounts.cumsum(dim=0)])
+    idcg = ideal_discounts[num_relevant.clamp(max=k)]
+
+    return {
+        "precision": (num_hits / k)[counted].sum().item(),
+        "recall": (num_hits[counted] / num_relevant[counted]).sum().item(),
+        "ndcg": (dcg[counted] / idcg[counted]).sum().item(),
+        "hit_rate": (num_hits[counted] > 0).sum().item(),
+        "students": counted.sum().item(),
+    }
+
+
+def evaluate_ranking(model, loader, ks=(5, 10)):
+    """
+    Evaluate the recommendation quality of the trained model over a whole data loader.
+
+    Computes precision@k, recall@k, NDCG@k and the hit rate@k (the share of students with at least one
+    relevant course in their top k). Only the per-batch sums are kept, so the memory used does not depend
+    on the size of the split. Students without any relevant course are left out.
+
+    Args:
+    model (torch.nn.Module): The trained model to be evaluated.
+    loader (torch.utils.data.DataLoader): DataLoader containing test/validation data.
+    ks (tuple): The cut-offs to compute the metrics at.
+
+    Returns:
+    dict: The metrics averaged over the students, keyed like "precision@5".
+    """
+    model.eval()
+    totals = {k: {} for k in ks}
+    with torch.no_grad():
+        for features, labels in loader:
+            outputs = model(features)
+            for k in ks:
+                for name, value in ranking_metric_sums(outputs, labels, k).items():
+                    totals[k][name] = totals[k].get(name, 0) + value
+
+    metrics = {}
+    for k in ks:
+        students = max(totals[k].get("students", 0), 1)
+        for name in ("precision", "recall", "ndcg", "hit_rate"):
+            metrics[f"{name}@{k}"] = totals[k].get(name, 0) / students
+    return metrics
@@ -1,8 +1,19 @@
+import os
+import copy
+import json
+import time
+
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch.optim import Adam
 
+from constants import (
+    NCF_BUNDLE_EXPORTS, NCF_COURSES_LIST_PATH, NCF_MODEL_PATH, NCF_USER_FEATURES_PATH, TRAIN_BF16, TRAIN_CHECKPOINT_DIR,
+    TRAIN_CHECKPOINT_EVERY, TRAIN_EARLY_STOPPING_MIN_DELTA, TRAIN_EARLY_STOPPING_PATIENCE, TRAIN_EPOCHS,
+    TRAIN_LEARNING_RATE, TRAIN_NUM_THREADS
+)
+
 
 class NCFModel(nn.Module):
     """
@@ -48,24 +59,149 @@ class NCFModel(nn.Module):
         return x
 
 
-def training_model_workflow(X_train, Y_train, train_loader):
+class SparseNCFModel(nn.Module):
+    """
+    NCF model taking the indices of the active one-hot features instead of the dense one-hot vector.
+
+    The first layer is an `nn.EmbeddingBag` summing one row per active feature plus a bias,
+    which is numerically the same as `NCFModel.fc1` applied to the one-hot vector, without allocating it.
+    The rest of the network is identical to `NCFModel`.
+
+    Attributes:
+        fc1 (torch.nn.EmbeddingBag): First layer, one 128-wide row per input feature.
+        fc1_bias (torch.nn.Parameter): Bias of the first layer.
+        fc2 (torch.nn.Linear): Second fully connected layer.
+        output (torch.nn.Linear): Output layer that predicts interaction probabilities.
+    """
+
+    def __init__(self, num_users_features, num_courses):
+        """
+        Initializes the SparseNCFModel.
+
+        Args:
+            num_users_features (int): Number of one-hot features in the input vocabulary.
+            num_courses (int): Number of courses or items in the recommendation system.
+        """
+        super(SparseNCFModel, self).__init__()
+        self.fc1 = nn.EmbeddingBag(num_users_features, 128, mode="sum")
+        self.fc1_bias = nn.Parameter(torch.zeros(128))
+        self.fc2 = nn.Linear(128, 64)
+        self.output = nn.Linear(64, num_courses)
+
+    @classmethod
+    def from_dense(cls, model):
+        """
+        Build a SparseNCFModel with the same weights as a trained NCFModel.
+
+        Args:
+            model (NCFModel): The trained dense model.
+
+        Returns:
+            SparseNCFModel: The equivalent sparse model, in evaluation mode.
+        """
+        sparse_model = cls(model.fc1.in_features, model.output.out_features)
+        with torch.no_grad():
+            # Linear stores its weight as (out, in); each input feature is a column, i.e. an embedding row
+            sparse_model.fc1.weight.copy_(model.fc1.weight.t())
+            sparse_model.fc1_bias.copy_(model.fc1.bias)
+        sparse_model.fc2.load_state_dict(model.fc2.state_dict())
+        sparse_model.output.load_state_dict(model.output.state_dict())
+        sparse_model.eval()
+        return sparse_model
+
+    def forward(self, indices, offsets):
+        """
+        Forward pass through the network.
+
+        Args:
+            indices (torch.Tensor): The active feature indices of all users, concatenated (int64).
+            offsets (torch.Tensor): The position in `indices` where each user's features start (int64).
+
+        Returns:
+            torch.Tensor: Output tensor containing predicted probabilities of interactions.
+        """
+        x = F.relu(self.fc1(indices, offsets) + self.fc1_bias)
+        x = F.relu(self.fc2(x))
+        # Using sigmoid since this is a binary classification
+        x = torch.sigmoid(self.output(x))
+        return x
+
+
+def save_checkpoint(model, optimizer, epoch, train_loss, val_loss, checkpoint_dir=TRAIN_CHECKPOINT_DIR):
+    """
+    Function to save a training checkpoint with the model and optimizer states.
+
+    Args:
+        model (torch.nn.Module): The model being trained.
+        optimizer (torch.optim.Optimizer): The optimizer of the model.
+        epoch (int): The number of completed epochs.
+        train_loss (float): The training loss of the last epoch.
+        val_loss (float): The validation loss of the last epoch, or None without validation data.
+        checkpoint_dir (str): The directory to save the checkpoint in.
+
+    Returns:
+        str: The path of the saved checkpoint.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    checkpoint_path = os.path.join(checkpoint_dir, f"ncf_epoch_{epoch:03d}.pt")
+    torch.save({
+        "epoch": epoch,
+        "model_state_dict": model.state_dict(),
+        "optimizer_state_dict": optimizer.state_dict(),
+        "train_loss": train_loss,
+        "val_loss": val_loss,
+    }, checkpoint_path)
+    return checkpoint_path
+
+
+def training_model_workflow(X_train, Y_train, train_loader, val_loader=None, epochs=TRAIN_EPOCHS,
+                            learning_rate=TRAIN_LEARNING_RATE, num_threads=TRAIN_NUM_THREADS, bf16=TRAIN_BF16,
+                            patience=TRAIN_EARLY_STOPPING_PATIENCE, min_delta=TRAIN_EARLY_STOPPING_MIN_DELTA,
+                            checkpoint_dir=TRAIN_CHECKPOINT_DIR, checkpoint_every=TRAIN_CHECKPOINT_EVERY,
+                            model_path=NCF_MODEL_PATH, exports=NCF_BUNDLE_EXPORTS,
+                            user_features_path=NCF_USER_FEATURES_PATH, courses_list_path=NCF_COURSES_LIST_PATH):
     """
     Trains the NCF model using the provided training data loader.
 
+    Every epoch reports the training loss, the validation loss (with validation data), the wall time and the
+    number of samples per second. With early stopping, training ends once the validation loss has not improved
+    by `min_delta` for `patience` epochs, and the weights of the best epoch are kept.
+
     Args:
         X_train (numpy.array): Training data features.
         Y_train (numpy.array): Training data labels.
         train_loader (torch.utils.data.DataLoader): DataLoader for training data.
+        val_loader (torch.utils.data.DataLoader): DataLoader for validation data, or None.
+        epochs (int): The maximum number of epochs.
+        learning_rate (float): The learning rate of the Adam optimizer.
+        num_threads (int): The number of intra-op threads torch uses (0 keeps the default).
+        bf16 (bool): Whether to run the forward pass under bfloat16 autocast on the CPU.
+        patience (int): The number of epochs without improvement before stopping early (0 disables early stopping).
+        min_delta (float): The decrease of the validation loss counted as an improvement.
+        checkpoint_dir (str): The directory to save checkpoints in.
+        checkpoint_every (int): Save a checkpoint every this many epochs (0 disables checkpoints).
+        model_path (str): The directory to save the trained model to, as a model bundle.
+        exports (tuple): The exports to include in the bundle, among "torchscript" and "onnx".
+        user_features_path (str): The JSON list of one-hot user feature names written by preprocessing.
+        courses_list_path (str): The JSON list of course names written by preprocessing.
 
     Returns:
         torch.nn.Module: Trained model.
     """
+    from scripts.test_evaluate_DL import evaluate
+
+    if epochs < 1:
+        raise ValueError("Training needs at least one epoch")
+    if patience and val_loader is None:
+        raise ValueError("Early stopping needs validation data; set a validation size")
+    if num_threads:
+        torch.set_num_threads(num_threads)
 
     # Initialize the model
     model = NCFModel(X_train.shape[1], Y_train.shape[1])
-    optimizer = Adam(model.parameters(), lr=0.01)
+    optimizer = Adam(model.parameters(), lr=learning_rate)
     criterion = nn.BCELoss()
-    print("Initialized the model parameters")
+    print(f"Initialized the model parameters ({torch.get_num_threads()} threads, bf16 autocast {'on' if bf16 else 'off'})")
 
     def train(model, loader, optimizer, criterion):
         """
@@ -78,25 +214,68 @@ def training_model_workflow(X_train, Y_train, train_loader):
             criterion (torch.nn.Module): Loss function used for training.
 
         Returns:
-            float: Average loss for this training epoch.
+            tuple: Average loss for this training epoch, and the number of samples seen.
         """
         model.train()
         total_loss = 0
+        num_samples = 0
         for features, labels in loader:
             optimizer.zero_grad()
-            outputs = model(features)
-            loss = criterion(outputs, labels)
+            with torch.autocast("cpu", dtype=torch.bfloat16, enabled=bf16):
+                outputs = model(features)
+            # The loss is computed in float32, outside of autocast
+            loss = criterion(outputs.float(), labels)
             loss.backward()
             optimizer.step()
             total_loss += loss.item()
-        return total_loss / len(loader)
+            num_samples += len(labels)
+        return total_loss / len(loader), num_samples
 
     # Training loop
-    for epoch in range(50):
-        train_loss = train(model, train_loader, optimizer, criterion)
-        print(f"Epoch {epoch+1}, Loss: {train_loss}")
+    best_val_loss = float("inf")
+    best_state = None
+    epochs_without_improvement = 0
+    training_start = time.perf_counter()
+    for epoch in range(epochs):
+        epoch_start = time.perf_counter()
+        train_loss, num_samples = train(model, train_loader, optimizer, criterion)
+        val_loss = evaluate(model, val_loader) if val_loader is not None else None
+        epoch_seconds = time.perf_counter() - epoch_start
+
+        val_message = f", Val Loss: {val_loss}" if val_loss is not None else ""
+        print(f"Epoch {epoch+1}, Loss: {train_loss}{val_message}, "
+              f"Time: {epoch_seconds:.2f}s, Samples/sec: {num_samples / epoch_seconds:.0f}")
+
+        if checkpoint_every and (epoch + 1) % checkpoint_every == 0:
+            print(f"Saved a checkpoint to {save_checkpoint(model, optimizer, epoch + 1, train_loss, val_loss, checkpoint_dir)}")
+
+        if val_loss is not None:
+            if val_loss < best_val_loss - min_delta:
+                best_val_loss = val_loss
+                best_state = copy.deepcopy(model.state_dict())
+                epochs_without_improvement = 0
+            else:
+                epochs_without_improvement += 1
+            if patience and epochs_without_improvement >= patience:
+                print(f"Stopping early: no improvement of the validation loss for {patience} epochs.")
+                break
+
+    # Keep the weights of the best validation epoch
+    if patience and best_state is not None:
+        model.load_state_dict(best_state)
+        print(f"Restored the weights with the best validation loss ({best_val_loss}).")
+    print(f"Training took {time.perf_counter() - training_start:.2f}s")
 
-    # Save model
-    torch.save(model, 'models/ncf_model_full.pth')
-    print("Saved the model!")
+    # Save model, with the vocabularies it was trained with
+    from scripts.model_bundle import save_model_bundle
+    with open(user_features_path, 'r') as f:
+        user_features = json.load(f)
+    with open(courses_list_path, 'r') as f:
+        courses_list = json.load(f)
+    metadata = save_model_bundle(model, user_features, courses_list, model_path, exports, extra_metadata={
+        "epochs": epoch + 1,
+        "train_loss": train_loss,
+        "best_val_loss": best_val_loss if best_state is not None else None,
+    })
+    print(f"Saved the model bundle {metadata['model_version']} to {model_path}!")
     return model
@@ -0,0 +1,228 @@
+import gc
+import os
+import sys
+import time
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import traceback
+
+import uvicorn
+
+from constants import (
+    SERVER_HOST, SERVER_MAX_QUICK_FAILURES, SERVER_PORT, SERVER_RESPAWN_BACKOFF_SECONDS, SERVER_WORKER_MIN_UPTIME_SECONDS,
+    SERVER_WORKER_THREADS, SERVER_WORKERS
+)
+
+# Start time of each running worker process, by pid
+__workers__ = {}
+__stopping__ = False
+
+# Longest delay before restarting a failing worker
+MAX_RESPAWN_BACKOFF_SECONDS = 30.0
+
+
+def create_listening_socket(host=SERVER_HOST, port=SERVER_PORT, backlog=2048):
+    """
+    Function to create the listening socket shared by all the workers.
+    The kernel spreads incoming connections over the workers accepting on it.
+
+    Args:
+        host (str): The host to bind to.
+        port (int): The port to bind to.
+        backlog (int): The maximum number of pending connections.
+
+    Returns:
+        socket.socket: The bound, listening socket.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload(worker_threads=SERVER_WORKER_THREADS):
+    """
+    Function to import the app and load its read-only state in the parent process, before any worker is forked.
+
+    Args:
+        worker_threads (int): The number of torch intra-op threads each worker uses.
+
+    Returns:
+        fastapi.FastAPI: The application.
+    """
+    import torch
+    # Set before the first forward pass: OpenMP thread pools started in the parent do not survive a fork
+    torch.set_num_threads(worker_threads)
+
+    import server
+    server.warm_up()
+    return server.app
+
+
+def run_worker(app, sock, log_level, metrics_dir):
+    """
+    Function run by each forked worker: serve the app on the shared socket until told to stop.
+
+    Args:
+        app (fastapi.FastAPI): The preloaded application.
+        sock (socket.socket): The shared listening socket.
+        log_level (str): The uvicorn log level.
+        metrics_dir (str): The directory where the workers share their metrics.
+    """
+    import server
+    from metrics import REGISTRY
+    server.reinitialize_after_fork()
+    gc.enable()
+
+    # A scrape reaches a single worker, which serves the metrics of every worker
+    REGISTRY.start_multiprocess(metrics_dir)
+    try:
+        config = uvicorn.Config(app, log_level=log_level)
+        uvicorn.Server(config).run(sockets=[sock])
+    finally:
+        REGISTRY.stop_multiprocess()
+
+
+def spawn_worker(app, sock, log_level, metrics_dir):
+    """
+    Function to fork a worker process.
+
+    Args:
+        app (fastapi.FastAPI): The preloaded application.
+        sock (socket.socket): The shared listening socket.
+        log_level (str): The uvicorn log level.
+        metrics_dir (str): The directory where the workers share their metrics.
+
+    Returns:
+        int: The pid of the worker.
+    """
+    pid = os.fork()
+    if pid == 0:
+        # The worker installs its own signal handlers through uvicorn
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        exit_code = 0
+        try:
+            run_worker(app, sock, log_level, metrics_dir)
+        except BaseException:
+            # os._exit skips the interpreter's own report, so the traceback is printed here
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            sys.stderr.flush()
+            os._exit(exit_code)
+    __workers__[pid] = time.monotonic()
+    return pid
+
+
+def stop_workers(signum, frame):
+    """
+    Signal handler forwarding a stop request to every worker.
+
+    Args:
+        signum (int): The received signal.
+        frame (frame): The interrupted frame.
+    """
+    global __stopping__
+    __stopping__ = True
+    for pid in list(__workers__):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def serve(host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS, worker_threads=SERVER_WORKER_THREADS,
+          log_level="info", min_uptime_seconds=SERVER_WORKER_MIN_UPTIME_SECONDS,
+          max_quick_failures=SERVER_MAX_QUICK_FAILURES, respawn_backoff_seconds=SERVER_RESPAWN_BACKOFF_SECONDS):
+    """
+    Function to run the server with several pre-forked worker processes.
+
+    The app, the NCF model, its vocabularies and the local catalog are loaded once in the parent.
+    The garbage collector is then frozen, so collections in the workers do not write to (and un-share)
+    the pages of the preloaded objects, and the workers are forked off the parent sharing its listening socket.
+    Workers that die are replaced until the launcher receives SIGINT or SIGTERM. A worker exiting within
+    `min_uptime_seconds` of its start is failing (bad configuration, import error), so it is restarted after
+    a delay doubling with every failure in a row, and the launcher stops after `max_quick_failures` in a row.
+    The workers share their metrics through a temporary directory, so /metrics serves the totals of every worker,
+    including the ones that were replaced.
+
+    Args:
+        host (str): The host to bind to.
+        port (int): The port to bind to.
+        workers (int): The number of worker processes.
+        worker_threads (int): The number of torch intra-op threads per worker.
+        log_level (str): The uvicorn log level.
+        min_uptime_seconds (float): How long a worker must run for its exit not to count as a failure.
+        max_quick_failures (int): The number of failures in a row after which the launcher gives up.
+        respawn_backoff_seconds (float): The delay before restarting a worker after the first failure.
+
+    Returns:
+        int: The exit status of the launcher: 0 when stopped by a signal, 1 when it gave up on failing workers.
+    """
+    gc.disable()
+    app = preload(worker_threads)
+    sock = create_listening_socket(host, port)
+    gc.freeze()
+    metrics_dir = tempfile.mkdtemp(prefix="recommender-metrics-")
+
+    signal.signal(signal.SIGINT, stop_workers)
+    signal.signal(signal.SIGTERM, stop_workers)
+    for _ in range(workers):
+        spawn_worker(app, sock, log_level, metrics_dir)
+    print(f"Serving on {host}:{port} with {workers} workers (parent pid {os.getpid()})", flush=True)
+
+    quick_failures = 0
+    exit_status = 0
+    while __workers__:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started_at = __workers__.pop(pid, None)
+        if __stopping__:
+            continue
+
+        if started_at is not None and time.monotonic() - started_at < min_uptime_seconds:
+            quick_failures += 1
+        else:
+            quick_failures = 0
+        if quick_failures >= max_quick_failures:
+            print(f"Worker {pid} exited with status {status}; {quick_failures} workers in a row exited within "
+                  f"{min_uptime_seconds:g}s of starting, stopping", flush=True)
+            exit_status = 1
+            stop_workers(signal.SIGTERM, None)
+            continue
+
+        delay = 0
+        if quick_failures:
+            delay = min(respawn_backoff_seconds * 2 ** (quick_failures - 1), MAX_RESPAWN_BACKOFF_SECONDS)
+        print(f"Worker {pid} exited with status {status}; starting a new one"
+              + (f" in {delay:g}s" if delay else ""), flush=True)
+        time.sleep(delay)
+        if not __stopping__:
+            spawn_worker(app, sock, log_level, metrics_dir)
+    sock.close()
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    return exit_status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the API with pre-forked workers sharing the preloaded model state.")
+    parser.add_argument("--host", default=SERVER_HOST, help="Host to bind to")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="Port to bind to")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Number of worker processes")
+    parser.add_argument("--worker-threads", type=int, default=SERVER_WORKER_THREADS,
+                        help="Number of torch intra-op threads per worker")
+    parser.add_argument("--log-level", default="info", help="uvicorn log level")
+    args = parser.parse_args()
+
+    sys.exit(serve(args.host, args.port, args.workers, args.worker_threads, args.log_level))
@@ -1,12 +1,130 @@
-from fastapi import FastAPI, Request
+import json
+import asyncio
+import threading
+import contextvars
+
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from constants import COURSE_RECOMMENDATION_PROMPT, LLM_CACHE_ENABLED, RETRIEVAL_BACKEND, SINGLE_FLIGHT_ENABLED
+from llm_cache import LLMResponseCache, get_llm_cache_key, get_normalized_profile
+from metrics import (
+    PROMPT_COURSES, PROMPT_TOKENS, REGISTRY, MetricsMiddleware, add_stage_timings, run_with_stage_timings, time_stage
+)
+from prompt_builder import PromptBuilder
+from singleflight import SingleFlight
+from scripts.embedding_cache import get_embedding_cache_stats, get_query_embedding_cache_stats
+from scripts.hybrid_recommender import fuse_recommendations
+from scripts.micro_batcher import MicroBatcher
+from scripts.query_vector_db import get_chroma_db_collection, get_search_cache_stats, perform_search
+from util import (
+    clean_text, get_llm_stats, get_response_from_llm_async, get_stop_words, get_unique_values_from_dict,
+    stream_response_from_llm
+)
+
+# The course collection and the NCF micro-batcher are created on first use,
+# so a server that only serves one of the RAG and NCF paths never loads the other
+__chroma_collection__ = None
+__chroma_collection_lock__ = threading.Lock()
+__ncf_batcher__ = None
+__ncf_batcher_lock__ = threading.Lock()
+
+# Cache of LLM responses keyed on the cleaned profile and the retrieved courses
+__llm_cache__ = LLMResponseCache() if LLM_CACHE_ENABLED else None
+
+# Assembles the recommendation prompts within the token budget
+__prompt_builder__ = PromptBuilder()
+
+# Concurrent requests for the same normalized profile share one execution:
+# the whole recommendation, or only the retrieval half for streamed responses
+__recommendation_flights__ = SingleFlight(SINGLE_FLIGHT_ENABLED)
+__retrieval_flights__ = SingleFlight(SINGLE_FLIGHT_ENABLED)
+
+
+def get_course_collection():
+    """
+    Function to get the course collection, connecting to it on first use.
+
+    Returns:
+        chromadb.Collection: The course collection of the configured retrieval backend.
+    """
+    global __chroma_collection__
+    with __chroma_collection_lock__:
+        if __chroma_collection__ is None:
+            __chroma_collection__ = get_chroma_db_collection()
+    return __chroma_collection__
+
 
-from constants import COURSE_RECOMMENDATION_PROMPT
-from scripts.query_vector_db import get_chroma_db_collection, perform_search
-from util import clean_text, get_formatted_key_value_pairs, get_response_from_llm, get_unique_values_from_dict
+async def run_blocking(func, *args):
+    """
+    Function to run blocking work (a search, the query embedding, an LLM cache read or write) in the default executor,
+    so it does not stall the other requests of the event loop. The work runs in a copy of the request's context,
+    so its stages are still timed into the request's timings.
+
+    Args:
+        func (callable): The blocking function.
+        *args: The arguments to call it with.
+
+    Returns:
+        The return value of the function.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(None, context.run, func, *args)
+
+
+def get_ncf_batcher():
+    """
+    Function to get the NCF micro-batcher, loading torch and the NCF predictor shared with scripts.main_DL on first use.
+
+    Returns:
+        scripts.micro_batcher.MicroBatcher: The micro-batcher wrapping the shared predictor.
+    """
+    global __ncf_batcher__
+    with __ncf_batcher_lock__:
+        if __ncf_batcher__ is None:
+            from scripts.inference_DL import get_predictor
+            __ncf_batcher__ = MicroBatcher(get_predictor())
+    return __ncf_batcher__
+
+
+async def get_ncf_batcher_async():
+    """
+    Function to get the NCF micro-batcher from a request handler. On first use the predictor is loaded
+    in the default executor, so loading torch and the model does not block the event loop.
+
+    Returns:
+        scripts.micro_batcher.MicroBatcher: The micro-batcher wrapping the shared predictor.
+    """
+    if __ncf_batcher__ is not None:
+        return __ncf_batcher__
+    return await asyncio.get_running_loop().run_in_executor(None, get_ncf_batcher)
+
+
+def warm_up():
+    """
+    Function to load the read-only serving state up front: the NCF model, its vocabularies and top-k table,
+    the stop words and, with the local retrieval backend, the course catalog and its embeddings.
+
+    The multi-worker launcher (`serve.py`) calls it once before forking, so the workers share these pages
+    copy-on-write instead of each loading their own copy. Network clients (Chroma server, Gemini) are left
+    to each worker, since connections must not be shared across processes.
+    """
+    get_stop_words()
+    predictor = get_ncf_batcher().predictor
+    # One forward pass, so the lazily initialized torch state is also created before forking
+    predictor.predict_proba_keys([predictor.feature_key({})])
+    if RETRIEVAL_BACKEND == "local":
+        get_course_collection()
+
+
+def reinitialize_after_fork():
+    """
+    Function to recreate, in a forked worker process, the state that must not be shared with the parent.
+    """
+    if __llm_cache__ is not None:
+        __llm_cache__.connect()
 
-# Get the chroma database collection
-__chroma_collection__ = get_chroma_db_collection()
 
 # Create a FastAPI instance
 app = FastAPI()
@@ -17,8 +135,21 @@ app.add_middleware(
     allow_origins=["*"],  # Allow all origins
     allow_methods=["*"],  # Allow all methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["Server-Timing", "X-Prompt-Tokens"],  # Let browsers read the timings and prompt sizes
 )
 
+# Count the requests and time them; added last, so it also times the CORS middleware
+app.add_middleware(MetricsMiddleware)
+
+
+@app.on_event("shutdown")
+async def stop_ncf_batcher():
+    """
+    Stop the NCF micro-batcher if it was started.
+    """
+    if __ncf_batcher__ is not None:
+        await __ncf_batcher__.stop()
+
 
 # Health Check endpoint
 @app.get("/")
@@ -29,48 +160,461 @@ async def health_check():
     return {"ping": "pong"}
 
 
+async def run_flight(flights: SingleFlight, key, function, *args):
+    """
+    Function to run a coroutine function in a request coalescing group. The execution records its own stage timings,
+    which every request sharing it gets, since it runs in the context of the request that started it.
+
+    Args:
+        flights (SingleFlight): The coalescing group.
+        key: The key identifying identical calls.
+        function (callable): The coroutine function.
+        *args: The arguments to call it with.
+
+    Returns:
+        tuple: The result of the execution, and whether it was shared with an earlier request.
+    """
+    (result, timings), coalesced = await flights.run(key, lambda: run_with_stage_timings(function, *args))
+    add_stage_timings(timings)
+    return result, coalesced
+
+
+async def read_json_body(req: Request):
+    """
+    Function to read the JSON body of a request.
+
+    Args:
+        req (Request): The request.
+
+    Returns:
+        The decoded JSON body.
+
+    Raises:
+        HTTPException: A 422 error if the body is not valid JSON.
+    """
+    try:
+        return await req.json()
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Expected a valid JSON body")
+
+
+def get_profile_error(profile_dict):
+    """
+    Function to check that a decoded JSON value is a profile: an object with string, number, boolean or null values.
+
+    Args:
+        profile_dict: The decoded JSON value.
+
+    Returns:
+        str: What is wrong with the profile, or None if it is valid.
+    """
+    if not isinstance(profile_dict, dict):
+        return "Expected a JSON object with the profile"
+    invalid = [key for key, value in profile_dict.items() if isinstance(value, (dict, list))]
+    if invalid:
+        return f"Expected the profile values to be strings, numbers, booleans or null; {invalid} are not"
+    return None
+
+
+async def read_profile(req: Request):
+    """
+    Function to read the profile sent as the JSON body of a request.
+
+    Args:
+        req (Request): The request.
+
+    Returns:
+        dict: The user's profile.
+
+    Raises:
+        HTTPException: A 422 error if the body is not a valid profile.
+    """
+    profile_dict = await read_json_body(req)
+    error = get_profile_error(profile_dict)
+    if error is not None:
+        raise HTTPException(status_code=422, detail=error)
+    return profile_dict
+
+
+def search_courses(profile_dict: dict):
+    """
+    Function to search the course collection for the values of a profile.
+
+    Args:
+        profile_dict (dict): The user's profile.
+
+    Returns:
+        tuple: The cleaned search phrase, and the search results.
+    """
+    # Get the unique values from the profile dict and clean the text
+    with time_stage("clean_text"):
+        search_phrase = get_unique_values_from_dict(profile_dict)
+        search_phrase = clean_text(str(search_phrase))
+
+    # Perform a search in the chroma collection using the search phrase
+    with time_stage("search"):
+        return search_phrase, perform_search(search_phrase, get_course_collection())
+
+
+def build_prompt(profile_dict: dict, metadata_list: list, distances: list = None, search_phrase: str = ""):
+    """
+    Function to build the course recommendation prompt within the token budget, and record its size.
+
+    Args:
+        profile_dict (dict): The user's profile.
+        metadata_list (list): The metadata of the courses, best first.
+        distances (list, optional): The search distance of each course.
+        search_phrase (str): The cleaned search phrase.
+
+    Returns:
+        tuple: The prompt and its statistics (see `prompt_builder.PromptBuilder.build`).
+    """
+    with time_stage("prompt_format"):
+        prompt, prompt_stats = __prompt_builder__.build(profile_dict, metadata_list, distances, search_phrase)
+    PROMPT_TOKENS.observe(prompt_stats["prompt_tokens"])
+    for outcome, stat in (("kept", "courses_kept"), ("below_threshold", "dropped_below_threshold"),
+                          ("duplicate", "dropped_duplicates"), ("over_budget", "dropped_over_budget")):
+        PROMPT_COURSES.inc(outcome, amount=prompt_stats[stat])
+    return prompt, prompt_stats
+
+
+async def prepare_recommendation(profile_dict: dict):
+    """
+    Function to run the retrieval half of the recommendation pipeline for a profile.
+
+    Args:
+        profile_dict (dict): The user's profile.
+
+    Returns:
+        tuple: The LLM cache key (None if the cache is disabled), the cached response (None on a miss),
+            and the course recommendation prompt and its statistics (both None when the response is cached).
+    """
+    # Search for the courses matching the profile
+    search_phrase, search_results = await run_blocking(search_courses, profile_dict)
+
+    # Get the metadata and distances from the search results
+    metadata_list = (search_results.get("metadatas") or [[]])[0]
+    distances = (search_results.get("distances") or [None])[0]
+
+    # Return the cached response if this profile already got the same courses.
+    # Fields left out of the prompt are left out of the key, and so are shared.
+    cache_key = None
+    if __llm_cache__ is not None:
+        course_ids = (search_results.get("ids") or [[]])[0]
+        with time_stage("llm_cache_lookup"):
+            cache_key = get_llm_cache_key(
+                __prompt_builder__.filter_profile(profile_dict), course_ids,
+                COURSE_RECOMMENDATION_PROMPT + __prompt_builder__.fingerprint
+            )
+            cached_response = await run_blocking(__llm_cache__.get, cache_key)
+        if cached_response is not None:
+            return cache_key, cached_response, None, None
+
+    course_recommendation_prompt, prompt_stats = build_prompt(profile_dict, metadata_list, distances, search_phrase)
+    return cache_key, None, course_recommendation_prompt, prompt_stats
+
+
+async def recommend_courses_fast(profile_dict: dict, narrate: bool):
+    """
+    Function to recommend courses without waiting on the language model, by fusing the NCF and vector search rankings.
+
+    Args:
+        profile_dict (dict): The user's profile.
+        narrate (bool): Whether to also ask the language model to present the fused courses.
+
+    Returns:
+        dict: The fused courses, and the narration (None if it failed) when requested.
+    """
+    batcher = await get_ncf_batcher_async()
+    search_phrase, search_results = await run_blocking(search_courses, profile_dict)
+
+    # Scoring through the micro-batcher, so forward passes run off the event loop and are shared
+    with time_stage("ncf"):
+        probabilities = await batcher.predict_proba(profile_dict)
+    with time_stage("fusion"):
+        courses = fuse_recommendations(batcher.predictor, profile_dict, search_results, probabilities=probabilities)
+    response = {"courses": courses}
+    if not narrate:
+        return response
+
+    # Present the fused courses with the language model, keeping the ranking if it is slow or down
+    course_recommendation_prompt, _ = build_prompt(
+        profile_dict,
+        [{"display_text": course["display_text"] or f"Title: {course['title']}"} for course in courses],
+        search_phrase=search_phrase
+    )
+    try:
+        with time_stage("llm"):
+            response["narration"] = await get_response_from_llm_async(course_recommendation_prompt)
+    except Exception as ex:
+        response["narration"] = None
+        response["narration_error"] = str(ex) or type(ex).__name__
+    return response
+
+
+async def generate_recommendation(profile_dict: dict):
+    """
+    Function to run the whole recommendation pipeline for a profile: retrieval, prompt, language model and cache.
+
+    Args:
+        profile_dict (dict): The user's profile.
+
+    Returns:
+        tuple: The response from the language model, and the statistics of the prompt (None if the response was cached).
+    """
+    # Search for the courses and build the prompt, unless the response is cached
+    cache_key, cached_response, course_recommendation_prompt, prompt_stats = await prepare_recommendation(profile_dict)
+    if cached_response is not None:
+        return cached_response, None
+
+    # Get the response from the language model
+    with time_stage("llm"):
+        response = await get_response_from_llm_async(course_recommendation_prompt)
+
+    # Store the response for the next identical profile
+    if cache_key is not None:
+        with time_stage("llm_cache_store"):
+            await run_blocking(__llm_cache__.set, cache_key, response)
+
+    return response, prompt_stats
+
+
 @app.post("/recommend-courses/")
-async def recommend_courses(req: Request):
+async def recommend_courses(req: Request, http_response: Response, mode: str = "llm", narrate: bool = False):
     """
     Endpoint to recommend courses based on the user's profile. The profile is sent as a JSON payload in the request.
 
     Args:
         req (Request): The request object containing the user's profile.
+        http_response (Response): The response, given an `X-Prompt-Tokens` header with the estimated size of the prompt.
+        mode (str): "llm" to have the language model pick and present the courses, or "fast" to return the
+            fused NCF and vector search ranking in milliseconds.
+        narrate (bool): In "fast" mode, whether to also have the language model present the ranked courses.
 
     Returns:
-        dict: The response from the language model.
+        dict: The response from the language model, or the fused ranking in "fast" mode.
     """
     # Get the user's profile from the request
-    profile_dict = await req.json()
+    profile_dict = await read_profile(req)
 
-    # Format the profile details
-    profile_details_formatted = get_formatted_key_value_pairs(profile_dict)
+    if mode not in ("llm", "fast"):
+        raise HTTPException(status_code=422, detail="mode must be 'llm' or 'fast'")
+    flight_key = (mode, narrate and mode == "fast", get_normalized_profile(profile_dict))
 
-    # Get the unique values from the profile dict and clean the text
-    search_phrase = get_unique_values_from_dict(profile_dict)
-    search_phrase = clean_text(str(search_phrase))
+    if mode == "fast":
+        response, _ = await run_flight(
+            __recommendation_flights__, flight_key, recommend_courses_fast, profile_dict, narrate
+        )
+        return response
 
-    # Perform a search in the chroma collection using the search phrase
-    search_results = perform_search(search_phrase, __chroma_collection__)
-
-    # Get the metadata from the search results
-    metadata_list = search_results.get("metadatas", [])
-    if len(metadata_list) >= 1:
-        metadata_list = metadata_list[0]
-
-    # Format the courses list
-    courses_list_formatted = ""
-    for metadata in metadata_list:
-        courses_list_formatted += f"{metadata['display_text']}\n\n"
-    courses_list_formatted = courses_list_formatted.strip()
-
-    # Format the course recommendation prompt
-    course_recommendation_prompt = COURSE_RECOMMENDATION_PROMPT.format(
-        formatted_background_and_interests=profile_details_formatted,
-        formatted_course_list=courses_list_formatted
+    (response, prompt_stats), _ = await run_flight(
+        __recommendation_flights__, flight_key, generate_recommendation, profile_dict
     )
+    if prompt_stats is not None:
+        http_response.headers["X-Prompt-Tokens"] = str(prompt_stats["prompt_tokens"])
+    return response
 
-    # Get the response from the language model
-    response = get_response_from_llm(course_recommendation_prompt)
 
-    return response
\ No newline at end of file
+def format_server_sent_event(data, event: str = None):
+    """
+    Function to format a server-sent event. The data is JSON encoded, so newlines in the text survive the event framing.
+
+    Args:
+        data: The JSON serializable payload of the event.
+        event (str, optional): The event type. Defaults to the "message" type.
+
+    Returns:
+        str: The formatted event.
+    """
+    event_line = f"event: {event}\n" if event else ""
+    return f"{event_line}data: {json.dumps(data)}\n\n"
+
+
+@app.post("/recommend-courses/stream/")
+async def recommend_courses_stream(req: Request):
+    """
+    Endpoint to recommend courses based on the user's profile, streaming the language model output as server-sent events.
+    Every chunk is sent as a message event with `{"text": ...}` as data, followed by a final "done" event,
+    or an "error" event if the language model fails.
+
+    Args:
+        req (Request): The request object containing the user's profile.
+
+    Returns:
+        StreamingResponse: The `text/event-stream` response.
+    """
+    # Get the user's profile from the request
+    profile_dict = await read_profile(req)
+
+    # Search for the courses and build the prompt, unless the response is cached.
+    # Identical concurrent requests share the retrieval, but each streams its own response.
+    (cache_key, cached_response, course_recommendation_prompt, prompt_stats), _ = await run_flight(
+        __retrieval_flights__, get_normalized_profile(profile_dict), prepare_recommendation, profile_dict
+    )
+
+    async def event_stream():
+        if cached_response is not None:
+            yield format_server_sent_event({"text": cached_response})
+            yield format_server_sent_event({}, event="done")
+            return
+
+        # Forward the chunks as they are generated
+        chunks = []
+        try:
+            with time_stage("llm"):
+                async for chunk in stream_response_from_llm(course_recommendation_prompt):
+                    chunks.append(chunk)
+                    yield format_server_sent_event({"text": chunk})
+        except Exception as ex:
+            yield format_server_sent_event({"detail": str(ex) or type(ex).__name__}, event="error")
+            return
+
+        # Store the complete response for the next identical profile
+        if cache_key is not None:
+            with time_stage("llm_cache_store"):
+                await run_blocking(__llm_cache__.set, cache_key, "".join(chunks).strip())
+        yield format_server_sent_event({}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            **({"X-Prompt-Tokens": str(prompt_stats["prompt_tokens"])} if prompt_stats is not None else {}),
+        }
+    )
+
+
+@app.get("/cache-stats/")
+async def cache_stats():
+    """
+    Endpoint to get the LLM response cache, search cache, embedding cache, NCF memoization and request coalescing counters.
+
+    Returns:
+        dict: The counters of each cache. The LLM and embedding entries are empty if those caches are disabled,
+            and the embedding, query embedding and NCF entries are empty until the embedding model and the NCF model
+            are first used.
+    """
+    return {
+        "llm": __llm_cache__.stats() if __llm_cache__ is not None else {},
+        "search": get_search_cache_stats(),
+        "embedding": get_embedding_cache_stats(),
+        "query_embedding": get_query_embedding_cache_stats(),
+        "ncf": dict(__ncf_batcher__.predictor.stats) if __ncf_batcher__ is not None else {},
+        "coalescing": {
+            "recommendation": __recommendation_flights__.get_stats(),
+            "retrieval": __retrieval_flights__.get_stats(),
+        },
+    }
+
+
+def collect_metrics():
+    """
+    Function to read, at scrape time, the counters kept by the caches, the NCF predictor and the LLM client.
+
+    Returns:
+        list: (name, kind, documentation, samples[, multiprocess mode]) tuples, where samples is a list of
+            (labels dict, value) pairs.
+    """
+    cache_stats = {
+        "llm": __llm_cache__.stats() if __llm_cache__ is not None else {},
+        "search": get_search_cache_stats(),
+        "embedding": get_embedding_cache_stats(),
+        "query_embedding": get_query_embedding_cache_stats(),
+    }
+    cache_events = [
+        ({"cache": cache, "result": result}, stats[result])
+        for cache, stats in cache_stats.items() for result in ("hits", "misses") if result in stats
+    ]
+    if __ncf_batcher__ is not None:
+        cache_events += [({"cache": "ncf", "result": result}, count)
+                         for result, count in __ncf_batcher__.predictor.stats.items()]
+    cache_entries = [({"cache": cache}, stats["entries"]) for cache, stats in cache_stats.items() if "entries" in stats]
+
+    llm_stats = get_llm_stats()
+    llm_events = [({"event": name}, count) for name, count in llm_stats.items() if name != "in_flight"]
+
+    flights = {"recommendation": __recommendation_flights__.get_stats(), "retrieval": __retrieval_flights__.get_stats()}
+    flight_requests = [
+        ({"flight": flight, "outcome": outcome}, stats[outcome])
+        for flight, stats in flights.items() for outcome in ("executions", "coalesced")
+    ]
+    flights_in_flight = [({"flight": flight}, stats["in_flight"]) for flight, stats in flights.items()]
+    return [
+        ("recommender_cache_lookups_total", "counter", "Cache lookups, by cache and result.", cache_events),
+        # The LLM and embedding caches are stores shared by every worker, so workers are not added up
+        ("recommender_cache_entries", "gauge",
+         "Entries stored, by cache (the largest worker's for the per-process caches).", cache_entries, "livemax"),
+        ("recommender_llm_events_total", "counter", "LLM client calls, retries, timeouts and failures.", llm_events),
+        ("recommender_llm_calls_in_flight", "gauge", "LLM calls holding a concurrency slot.",
+         [({}, llm_stats.get("in_flight", 0))]),
+        ("recommender_coalescing_requests_total", "counter",
+         "Requests that ran an execution or shared the in-flight one of an identical request.", flight_requests),
+        ("recommender_coalescing_in_flight", "gauge", "Executions in flight that identical requests can join.",
+         flights_in_flight),
+    ]
+
+
+REGISTRY.register_collector(collect_metrics)
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Endpoint exposing the request, stage, cache and LLM metrics in the Prometheus text format.
+
+    Returns:
+        PlainTextResponse: The exposition text.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/predict-courses/")
+async def predict_courses(req: Request):
+    """
+    Endpoint to predict courses for the user's profile with the NCF model. The profile is sent as a JSON payload in the request.
+
+    Args:
+        req (Request): The request object containing the user's profile.
+
+    Returns:
+        dict: The top recommended courses.
+    """
+    # Get the user's profile from the request
+    profile_dict = await read_profile(req)
+
+    # Predict the top courses, sharing a forward pass with concurrent requests
+    with time_stage("ncf"):
+        top_courses = await (await get_ncf_batcher_async()).predict(profile_dict)
+
+    return {"courses": top_courses}
+
+
+@app.post("/predict-courses/batch/")
+async def predict_courses_batch(req: Request):
+    """
+    Endpoint to predict courses for many profiles with the NCF model in one forward pass.
+    The profiles are sent as a JSON list in the request.
+
+    Args:
+        req (Request): The request object containing the list of profiles.
+
+    Returns:
+        dict: The top recommended courses for each profile, in request order.
+    """
+    # Get the list of profiles from the request
+    profile_dicts = await read_json_body(req)
+    if not isinstance(profile_dicts, list):
+        raise HTTPException(status_code=422, detail="Expected a JSON list of profiles")
+    errors = [f"item {idx}: {error}" for idx, error in enumerate(map(get_profile_error, profile_dicts)) if error]
+    if errors:
+        raise HTTPException(status_code=422, detail="; ".join(errors))
+
+    # Score the whole cohort at once, off the event loop
+    loop = asyncio.get_running_loop()
+    with time_stage("ncf"):
+        predictor = (await get_ncf_batcher_async()).predictor
+        top_courses = await loop.run_in_executor(None, predictor.predict_batch, profile_dicts)
+
+    return {"courses": top_courses}
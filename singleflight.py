@@ -0,0 +1,70 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution, whose result (or error) every caller receives.
+
+    The execution runs in its own task, so a caller that disconnects does not cancel it for the others,
+    and its result still reaches the caches when every caller is gone.
+    """
+
+    def __init__(self, enabled=True):
+        """
+        Initializes the group.
+
+        Args:
+            enabled (bool): Whether to coalesce; when False every call runs on its own.
+        """
+        self.enabled = enabled
+        self.in_flight = {}
+        self.stats = {"executions": 0, "coalesced": 0}
+
+    def forget(self, key, task):
+        """
+        Remove a finished execution, so the next call with its key runs again.
+
+        Args:
+            key: The key of the execution.
+            task (asyncio.Task): The finished execution.
+        """
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        # Retrieve the error, so it is not reported as unhandled when no caller was left to receive it
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, key, function):
+        """
+        Run a coroutine function, or wait for the in-flight execution with the same key.
+
+        Args:
+            key: The hashable key identifying identical calls.
+            function (callable): The coroutine function to run, without arguments.
+
+        Returns:
+            tuple: The result of the execution, and whether it was shared with an earlier caller.
+        """
+        if not self.enabled:
+            self.stats["executions"] += 1
+            return await function(), False
+
+        task = self.in_flight.get(key)
+        coalesced = task is not None
+        if coalesced:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["executions"] += 1
+            task = asyncio.ensure_future(function())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self.forget(key, done))
+        return await asyncio.shield(task), coalesced
+
+    def get_stats(self):
+        """
+        Get the counters of the group.
+
+        Returns:
+            dict: The number of executions, of calls that shared one, and of executions in flight.
+        """
+        return {**self.stats, "in_flight": len(self.in_flight)}
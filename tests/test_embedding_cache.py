@@ -0,0 +1,49 @@
+import numpy as np
+
+from scripts.embedding_cache import QueryEmbeddingCache
+
+
+class CountingModel:
+    """
+    Embedding model recording the texts it embeds, embedding each text as its length.
+    """
+
+    def __init__(self):
+        """
+        Initializes the model.
+        """
+        self.embedded = []
+
+    def __call__(self, input):
+        self.embedded.extend(input)
+        return [[float(len(text)), 1.0] for text in input]
+
+
+def test_query_embedding_cache_only_embeds_misses():
+    model = CountingModel()
+    embedding_function = QueryEmbeddingCache(model, max_entries=10)
+
+    embeddings = embedding_function(["ab", "abc", "ab"])
+    assert model.embedded == ["ab", "abc"]
+    assert [embedding[0] for embedding in embeddings] == [2, 3, 2]
+    assert all(embedding.dtype == np.float32 for embedding in embeddings)
+
+    embedding_function(["abc", "abcd"])
+    assert model.embedded == ["ab", "abc", "abcd"]
+    assert embedding_function.stats() == {"hits": 1, "misses": 4, "entries": 3}
+
+
+def test_query_embedding_cache_evicts_the_least_recently_used():
+    model = CountingModel()
+    embedding_function = QueryEmbeddingCache(model, max_entries=2)
+
+    embedding_function(["a"])
+    embedding_function(["bb"])
+    embedding_function(["a"])
+    embedding_function(["ccc"])
+    assert embedding_function.stats()["entries"] == 2
+    assert list(embedding_function.entries) == ["a", "ccc"]
+
+    for idx in range(100):
+        embedding_function([f"query {idx}"])
+    assert embedding_function.stats()["entries"] == 2
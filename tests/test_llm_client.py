@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+
+from llm_client import AsyncLLMClient, StubBackend
+
+
+class FlakyBackend(StubBackend):
+    """
+    Stub backend whose first calls fail, with an error or by hanging past the client timeout.
+    """
+
+    def __init__(self, failures, hang=False, error=ConnectionError, **kwargs):
+        """
+        Initializes the backend.
+
+        Args:
+            failures (int): The number of calls that fail before the calls start succeeding.
+            hang (bool): Whether failing calls hang instead of raising an error.
+            error (type): The type of the error raised by failing calls.
+        """
+        super().__init__(**kwargs)
+        self.failures = failures
+        self.hang = hang
+        self.error = error
+        self.attempts = 0
+
+    async def generate(self, prompt: str):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            if self.hang:
+                await asyncio.sleep(10)
+            raise self.error(f"attempt {self.attempts} failed")
+        return await super().generate(prompt)
+
+
+class HTTPError(Exception):
+    """
+    Backend error carrying an HTTP status code, like the `google.api_core` errors.
+    """
+
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def test_generate_returns_backend_response():
+    client = AsyncLLMClient(StubBackend(latency_seconds=0, response="hello"))
+    assert asyncio.run(client.generate("prompt")) == "hello"
+    assert client.stats == {"calls": 1, "retries": 0, "timeouts": 0, "failures": 0}
+    assert client.in_flight == 0
+
+
+def test_generate_limits_concurrency():
+    backend = StubBackend(latency_seconds=0.02)
+    client = AsyncLLMClient(backend, max_concurrency=3)
+
+    async def run():
+        return await asyncio.gather(*(client.generate(f"prompt {idx}") for idx in range(10)))
+
+    assert len(asyncio.run(run())) == 10
+    assert backend.max_in_flight == 3
+    assert client.in_flight == 0
+
+
+def test_generate_retries_errors_with_backoff():
+    backend = FlakyBackend(failures=2, latency_seconds=0, response="recovered")
+    client = AsyncLLMClient(backend, max_retries=2, retry_backoff_seconds=0.05)
+
+    async def run():
+        start = asyncio.get_running_loop().time()
+        response = await client.generate("prompt")
+        return response, asyncio.get_running_loop().time() - start
+
+    response, elapsed = asyncio.run(run())
+    assert response == "recovered"
+    assert backend.attempts == 3
+    # Backoff of 0.05 s, then doubled to 0.1 s
+    assert elapsed >= 0.15
+    assert client.stats == {"calls": 1, "retries": 2, "timeouts": 0, "failures": 0}
+
+
+def test_generate_times_out_and_retries():
+    backend = FlakyBackend(failures=1, hang=True, latency_seconds=0, response="second try")
+    client = AsyncLLMClient(backend, timeout_seconds=0.05, max_retries=1, retry_backoff_seconds=0)
+    assert asyncio.run(client.generate("prompt")) == "second try"
+    assert client.stats == {"calls": 1, "retries": 1, "timeouts": 1, "failures": 0}
+
+
+def test_generate_raises_last_error_once_retries_are_exhausted():
+    backend = FlakyBackend(failures=5, latency_seconds=0)
+    client = AsyncLLMClient(backend, max_retries=2, retry_backoff_seconds=0)
+    with pytest.raises(ConnectionError, match="attempt 3 failed"):
+        asyncio.run(client.generate("prompt"))
+    assert backend.attempts == 3
+    assert client.stats == {"calls": 1, "retries": 2, "timeouts": 0, "failures": 1}
+    assert client.in_flight == 0
+
+
+def test_generate_counts_a_timed_out_failure():
+    backend = FlakyBackend(failures=5, hang=True, latency_seconds=0)
+    client = AsyncLLMClient(backend, timeout_seconds=0.02, max_retries=1, retry_backoff_seconds=0)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(client.generate("prompt"))
+    assert client.stats == {"calls": 1, "retries": 1, "timeouts": 2, "failures": 1}
+
+
+@pytest.mark.parametrize("error", [ValueError("blocked response"), HTTPError(400), HTTPError(403)])
+def test_generate_does_not_retry_permanent_errors(error):
+    backend = FlakyBackend(failures=5, error=lambda message: error, latency_seconds=0)
+    client = AsyncLLMClient(backend, max_retries=2, retry_backoff_seconds=0)
+    with pytest.raises(type(error)):
+        asyncio.run(client.generate("prompt"))
+    assert backend.attempts == 1
+    assert client.stats == {"calls": 1, "retries": 0, "timeouts": 0, "failures": 1}
+
+
+@pytest.mark.parametrize("code", [429, 503])
+def test_generate_retries_transient_status_codes(code):
+    backend = FlakyBackend(failures=1, error=lambda message: HTTPError(code), latency_seconds=0, response="ok")
+    client = AsyncLLMClient(backend, max_retries=1, retry_backoff_seconds=0)
+    assert asyncio.run(client.generate("prompt")) == "ok"
+    assert backend.attempts == 2
+
+
+def test_generate_gives_its_slot_back_during_the_backoff():
+    backend = FlakyBackend(failures=1, latency_seconds=0, response="ok")
+    client = AsyncLLMClient(backend, max_concurrency=1, max_retries=1, retry_backoff_seconds=0.5)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        failing = asyncio.create_task(client.generate("failing"))
+        await asyncio.sleep(0)
+        await client.generate("healthy")
+        healthy_elapsed = loop.time() - start
+        await failing
+        return healthy_elapsed
+
+    # The healthy call ran while the failing one waited out its backoff
+    assert asyncio.run(run()) < 0.25
+    assert client.in_flight == 0
@@ -0,0 +1,106 @@
+import os
+import json
+import asyncio
+
+import httpx
+
+import util
+import server
+from llm_client import AsyncLLMClient, StubBackend
+from metrics import Counter, Gauge, Histogram, MetricsRegistry
+from test_streaming import PROFILE, FakeCollection
+
+
+def create_registry():
+    """
+    Function to create a registry with one metric of each kind.
+
+    Returns:
+        tuple: The registry, counter, gauge and histogram.
+    """
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("test_requests_total", "Requests.", ("path",)))
+    gauge = registry.register(Gauge("test_in_flight", "Requests in flight."))
+    histogram = registry.register(Histogram("test_duration_seconds", "Durations.", buckets=(0.1, 1.0)))
+    return registry, counter, gauge, histogram
+
+
+def write_worker_snapshot(directory, pid, families):
+    """
+    Function to write the snapshot of another worker.
+
+    Args:
+        directory (str): The shared metrics directory.
+        pid (int): The pid of the worker.
+        families (list): Its metric families, as returned by `MetricsRegistry.collect`.
+    """
+    with open(os.path.join(directory, f"metrics-{pid}-0.json"), 'w') as f:
+        json.dump({"pid": pid, "families": families}, f)
+
+
+def get_sample(text, sample):
+    """
+    Function to read one sample of an exposition text.
+
+    Args:
+        text (str): The exposition text.
+        sample (str): The sample name and labels.
+
+    Returns:
+        float: The value of the sample.
+    """
+    for line in text.splitlines():
+        if line.rsplit(" ", 1)[0] == sample:
+            return float(line.rsplit(" ", 1)[1])
+    raise KeyError(sample)
+
+
+def test_render_sums_every_worker_and_keeps_the_totals_of_exited_ones(tmp_path):
+    other, other_counter, other_gauge, other_histogram = create_registry()
+    other_counter.inc("/a", amount=3)
+    other_gauge.inc(amount=2)
+    other_histogram.observe(0.5)
+    # A live worker (this process's parent) and an exited one (past the largest pid Linux allows)
+    write_worker_snapshot(str(tmp_path), os.getppid(), other.collect())
+    write_worker_snapshot(str(tmp_path), 2 ** 22 + 1, other.collect())
+
+    registry, counter, gauge, histogram = create_registry()
+    counter.inc("/a")
+    counter.inc("/b")
+    gauge.inc()
+    histogram.observe(0.05)
+    registry.start_multiprocess(str(tmp_path), interval_seconds=60)
+    try:
+        text = registry.render()
+    finally:
+        registry.stop_multiprocess()
+
+    assert get_sample(text, 'test_requests_total{path="/a"}') == 7
+    assert get_sample(text, 'test_requests_total{path="/b"}') == 1
+    assert get_sample(text, "test_in_flight") == 3
+    assert get_sample(text, 'test_duration_seconds_bucket{le="0.1"}') == 1
+    assert get_sample(text, 'test_duration_seconds_bucket{le="1.0"}') == 3
+    assert get_sample(text, "test_duration_seconds_count") == 3
+    assert text.count("# TYPE test_requests_total counter") == 1
+
+
+def test_coalesced_requests_get_the_stage_timings_of_the_shared_execution(monkeypatch):
+    monkeypatch.setattr(server, "__chroma_collection__", FakeCollection())
+    monkeypatch.setattr(server, "__llm_cache__", None)
+    monkeypatch.setattr(util, "__llm_client__", AsyncLLMClient(StubBackend(latency_seconds=0.2)))
+    flights = server.__recommendation_flights__.stats["coalesced"]
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # Only the request that joins the execution asks for timings, so they cannot come from its own context
+            leader = asyncio.create_task(client.post("/recommend-courses/", json=PROFILE))
+            await asyncio.sleep(0.05)
+            follower = await client.post("/recommend-courses/", json=PROFILE, headers={"X-Debug-Timings": "1"})
+            return await leader, follower
+
+    leader, follower = asyncio.run(run())
+    assert server.__recommendation_flights__.stats["coalesced"] == flights + 1
+    assert "server-timing" not in leader.headers
+    stages = [entry.split(";")[0] for entry in follower.headers["server-timing"].split(", ")]
+    assert stages == ["clean_text", "search", "prompt_format", "llm", "total"]
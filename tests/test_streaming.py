@@ -0,0 +1,218 @@
+import json
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import util
+import server
+from llm_cache import LLMResponseCache
+from llm_client import AsyncLLMClient, StubBackend
+
+PROFILE = {"Field_Of_Study": "AI", "Primary_Hobby": "Photography", "Desired_Career_Field": "AI Ethics Specialist"}
+
+
+class ChunkBackend(StubBackend):
+    """
+    Stub backend streaming scripted attempts: each attempt is a list of chunks, where an exception is raised
+    in place and None hangs past the client timeout.
+    """
+
+    def __init__(self, attempts):
+        """
+        Initializes the backend.
+
+        Args:
+            attempts (list): The chunks of each successive stream; the last one is repeated once exhausted.
+        """
+        super().__init__(latency_seconds=0)
+        self.attempts = attempts
+        self.started = 0
+
+    async def stream(self, prompt: str):
+        chunks = self.attempts[min(self.started, len(self.attempts) - 1)]
+        self.started += 1
+        for chunk in chunks:
+            await asyncio.sleep(0)
+            if chunk is None:
+                await asyncio.sleep(10)
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+class FakeCollection:
+    """
+    Course collection returning the same two courses for every search.
+    """
+
+    name = "courses"
+    metadata = {"version": "test"}
+
+    def embedding_function(self, input):
+        return [[1.0, 0.0]] * len(input)
+
+    def query(self, query_texts=None, n_results=10, query_embeddings=None):
+        return {
+            "ids": [["c1", "c2"]],
+            "distances": [[0.1, 0.3]],
+            "documents": [["d1", "d2"]],
+            "metadatas": [[
+                {"display_text": "Subject: AIPI\nTitle: Deep Learning Applications", "title": "deep learning applications"},
+                {"display_text": "Subject: AIPI\nTitle: AIPI Seminar", "title": "aipi seminar"},
+            ]],
+        }
+
+
+def collect(client, prompt="prompt"):
+    """
+    Function to run a stream to its end.
+
+    Args:
+        client (AsyncLLMClient): The client to stream from.
+        prompt (str): The prompt.
+
+    Returns:
+        list: The chunks received before the stream ended or failed.
+    """
+    chunks = []
+
+    async def run():
+        async for chunk in client.stream(prompt):
+            chunks.append(chunk)
+
+    asyncio.run(run())
+    return chunks
+
+
+def parse_events(body):
+    """
+    Function to split a `text/event-stream` body into (event type, data) pairs.
+
+    Args:
+        body (str): The response body.
+
+    Returns:
+        list: The event type ("message" when unnamed) and decoded JSON data of each event.
+    """
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def app_client(tmp_path, monkeypatch):
+    """
+    Test client of the server with a fake collection and a fresh LLM cache. Set the backend with `use_backend`.
+    """
+    monkeypatch.setattr(server, "__chroma_collection__", FakeCollection())
+    monkeypatch.setattr(server, "__llm_cache__", LLMResponseCache(path=str(tmp_path / "llm.sqlite3")))
+
+    def use_backend(backend, **kwargs):
+        monkeypatch.setattr(util, "__llm_client__", AsyncLLMClient(backend, **kwargs))
+
+    with TestClient(server.app) as client:
+        yield client, use_backend
+
+
+def test_stream_yields_chunks_in_order():
+    client = AsyncLLMClient(StubBackend(latency_seconds=0.01, response="one two three four"))
+    assert collect(client) == ["one ", "two ", "three ", "four"]
+    assert client.stats == {"calls": 1, "retries": 0, "timeouts": 0, "failures": 0}
+    assert client.in_flight == 0
+
+
+def test_stream_retries_a_first_chunk_timeout():
+    backend = ChunkBackend([[None], ["a", "b"]])
+    client = AsyncLLMClient(backend, timeout_seconds=0.05, max_retries=1, retry_backoff_seconds=0)
+    assert collect(client) == ["a", "b"]
+    assert backend.started == 2
+    assert client.stats == {"calls": 1, "retries": 1, "timeouts": 1, "failures": 0}
+
+
+def test_stream_retries_a_first_chunk_error():
+    backend = ChunkBackend([[ConnectionError("unavailable")], ["a"]])
+    client = AsyncLLMClient(backend, max_retries=1, retry_backoff_seconds=0)
+    assert collect(client) == ["a"]
+    assert client.stats["retries"] == 1
+
+
+def test_stream_gives_up_once_retries_are_exhausted():
+    backend = ChunkBackend([[ConnectionError("unavailable")]])
+    client = AsyncLLMClient(backend, max_retries=2, retry_backoff_seconds=0)
+    with pytest.raises(ConnectionError, match="unavailable"):
+        collect(client)
+    assert backend.started == 3
+    assert client.stats == {"calls": 1, "retries": 2, "timeouts": 0, "failures": 1}
+    assert client.in_flight == 0
+
+
+def test_stream_does_not_retry_a_permanent_error():
+    backend = ChunkBackend([[ValueError("bad request")], ["never sent"]])
+    client = AsyncLLMClient(backend, max_retries=2, retry_backoff_seconds=0)
+    with pytest.raises(ValueError, match="bad request"):
+        collect(client)
+    assert backend.started == 1
+    assert client.stats == {"calls": 1, "retries": 0, "timeouts": 0, "failures": 1}
+    assert client.in_flight == 0
+
+
+def test_stream_does_not_retry_after_the_first_chunk():
+    backend = ChunkBackend([["a", RuntimeError("connection lost")], ["never sent"]])
+    client = AsyncLLMClient(backend, max_retries=2, retry_backoff_seconds=0)
+    chunks = []
+
+    async def run():
+        async for chunk in client.stream("prompt"):
+            chunks.append(chunk)
+
+    with pytest.raises(RuntimeError, match="connection lost"):
+        asyncio.run(run())
+    assert chunks == ["a"]
+    assert backend.started == 1
+    assert client.stats["retries"] == 0
+
+
+def test_stream_times_out_between_chunks():
+    backend = ChunkBackend([["a", None]])
+    client = AsyncLLMClient(backend, timeout_seconds=0.05, max_retries=2, retry_backoff_seconds=0)
+    with pytest.raises(asyncio.TimeoutError):
+        collect(client)
+    assert client.stats == {"calls": 1, "retries": 0, "timeouts": 1, "failures": 1}
+
+
+def test_endpoint_streams_chunks_then_done_and_caches_the_response(app_client):
+    client, use_backend = app_client
+    use_backend(StubBackend(latency_seconds=0.01, response="Take Deep Learning Applications first."))
+
+    response = client.post("/recommend-courses/stream/", json=PROFILE)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert int(response.headers["x-prompt-tokens"]) > 0
+    events = parse_events(response.text)
+    assert [event for event, _ in events] == ["message"] * 5 + ["done"]
+    assert "".join(data["text"] for _, data in events[:-1]) == "Take Deep Learning Applications first."
+
+    # The complete response was stored, so the same profile is answered from the cache in one event
+    use_backend(ChunkBackend([[RuntimeError("the model must not be called")]]))
+    events = parse_events(client.post("/recommend-courses/stream/", json=PROFILE).text)
+    assert events == [("message", {"text": "Take Deep Learning Applications first."}), ("done", {})]
+
+
+def test_endpoint_retries_a_slow_first_chunk(app_client):
+    client, use_backend = app_client
+    use_backend(ChunkBackend([[None], ["Recovered ", "answer"]]), timeout_seconds=0.05, retry_backoff_seconds=0)
+
+    events = parse_events(client.post("/recommend-courses/stream/", json=PROFILE).text)
+    assert events == [("message", {"text": "Recovered "}), ("message", {"text": "answer"}), ("done", {})]
+
+
+def test_endpoint_sends_an_error_event_and_caches_nothing(app_client):
+    client, use_backend = app_client
+    use_backend(ChunkBackend([["Partial ", RuntimeError("connection lost")]]), retry_backoff_seconds=0)
+
+    events = parse_events(client.post("/recommend-courses/stream/", json=PROFILE).text)
+    assert events == [("message", {"text": "Partial "}), ("error", {"detail": "connection lost"})]
+    assert server.__llm_cache__.stats()["entries"] == 0
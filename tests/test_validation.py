@@ -0,0 +1,40 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+PROFILE_ENDPOINTS = ["/recommend-courses/", "/recommend-courses/stream/", "/predict-courses/"]
+INVALID_BODIES = [
+    ("not json", "Expected a valid JSON body"),
+    ('["AI", "Photography"]', "Expected a JSON object with the profile"),
+    ('"AI"', "Expected a JSON object with the profile"),
+    ('{"Field_Of_Study": ["AI", "CS"]}', "['Field_Of_Study'] are not"),
+    ('{"Field_Of_Study": "AI", "Primary_Hobby": {"name": "Chess"}}', "['Primary_Hobby'] are not"),
+]
+
+
+@pytest.fixture
+def client():
+    """
+    Test client of the server. Invalid bodies are rejected before the collection or the models are used.
+    """
+    return TestClient(server.app)
+
+
+@pytest.mark.parametrize("endpoint", PROFILE_ENDPOINTS)
+@pytest.mark.parametrize("body, detail", INVALID_BODIES)
+def test_profile_endpoints_reject_invalid_profiles(client, endpoint, body, detail):
+    response = client.post(endpoint, content=body, headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+    assert detail in response.json()["detail"]
+
+
+def test_batch_endpoint_reports_every_invalid_profile(client):
+    response = client.post("/predict-courses/batch/", json=[{"Field_Of_Study": "AI"}, "AI", {"Primary_Hobby": [1]}])
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert detail.startswith("item 1: Expected a JSON object with the profile; item 2: ")
+    assert "['Primary_Hobby'] are not" in detail
+
+    response = client.post("/predict-courses/batch/", content="[", headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
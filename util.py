@@ -1,28 +1,87 @@
 import re
-import nltk
-import google.generativeai as genai
-
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
+import functools
 
 # Local
-from constants import GEMINI_API_KEY
+from constants import GEMINI_API_KEY, LLM_BACKEND
+from llm_client import AsyncLLMClient, GeminiBackend, StubBackend
 
-# Define safety settings for the generative model
-safety_settings = {
-    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE
-}
+# Generative model and async client, created on first use so that importing this module stays cheap
+__llm_model__ = None
+__llm_client__ = None
 
-# Initialize the generative model with the defined safety settings
-__llm_model__ = genai.GenerativeModel(
-    "gemini-pro",
-    safety_settings=safety_settings,
-)
 
-# Configure the generative model with the API key
-genai.configure(api_key=GEMINI_API_KEY)
+def get_llm_model():
+    """
+    Function to get the generative model, importing and configuring `google.generativeai` on first use.
+
+    Returns:
+        google.generativeai.GenerativeModel: The generative model.
+    """
+    global __llm_model__
+    if __llm_model__ is None:
+        import google.generativeai as genai
+        from google.generativeai.types import HarmCategory, HarmBlockThreshold
+
+        # Define safety settings for the generative model
+        safety_settings = {
+            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE
+        }
+
+        # Configure the generative model with the API key
+        genai.configure(api_key=GEMINI_API_KEY)
+
+        # Initialize the generative model with the defined safety settings
+        __llm_model__ = genai.GenerativeModel(
+            "gemini-pro",
+            safety_settings=safety_settings,
+        )
+    return __llm_model__
+
+
+def get_llm_client():
+    """
+    Function to get the async client used by the server, which bounds concurrency and applies timeouts and retries.
+
+    Returns:
+        llm_client.AsyncLLMClient: The async LLM client.
+    """
+    global __llm_client__
+    if __llm_client__ is None:
+        backend = StubBackend() if LLM_BACKEND == "stub" else GeminiBackend(get_llm_model())
+        __llm_client__ = AsyncLLMClient(backend)
+    return __llm_client__
+
+
+def get_llm_stats():
+    """
+    Function to get the counters of the async LLM client.
+
+    Returns:
+        dict: The number of calls, retries, timeouts and failures, and the calls in flight.
+            Empty until the client is first used.
+    """
+    if __llm_client__ is None:
+        return {}
+    return {**__llm_client__.stats, "in_flight": __llm_client__.in_flight}
+
+
+# Precompiled pattern used by clean_text
+__special_chars_pattern__ = re.compile(r'[^a-zA-Z0-9\s]')
+
+
+@functools.lru_cache(maxsize=1)
+def get_stop_words():
+    """
+    Function to get the English stop words, loading the NLTK corpus only once.
+
+    Returns:
+        frozenset: The set of stop words.
+    """
+    import nltk
+    return frozenset(nltk.corpus.stopwords.words('english'))
 
 
 def remove_special_chars(text):
@@ -35,7 +94,7 @@ def remove_special_chars(text):
     Returns:
         str: The text with special characters removed.
     """
-    return re.sub(r'[^a-zA-Z0-9\s]', '', text)
+    return __special_chars_pattern__.sub('', text)
 
 
 def remove_stop_words_from_text(text):
@@ -48,7 +107,7 @@ def remove_stop_words_from_text(text):
     Returns:
         str: The text with stop words removed.
     """
-    stop_words = set(nltk.corpus.stopwords.words('english'))
+    stop_words = get_stop_words()
     words = text.split(" ")
     words = [word for word in words if word not in stop_words]
     return " ".join(words)
@@ -64,14 +123,29 @@ def clean_text(text):
     Returns:
         str: The cleaned text.
     """
-    text = text.strip().lower()
-    text = remove_special_chars(text)
-    text = remove_stop_words_from_text(text)
-    text = text.strip()
-    # Replace 1 or more spaces with single semicolon
-    text = re.sub(r' +', ' ', text)
-    text = text.strip()
-    return text
+    return clean_texts([text])[0]
+
+
+def clean_texts(texts):
+    """
+    Function to clean a batch of texts the same way as `clean_text`.
+    The stop words and patterns are looked up once for the whole batch.
+
+    Args:
+        texts (list): The texts to clean.
+
+    Returns:
+        list: The cleaned texts, in the same order.
+    """
+    stop_words = get_stop_words()
+    remove_special = __special_chars_pattern__.sub
+    cleaned_texts = []
+    for text in texts:
+        text = remove_special('', text.strip().lower())
+        # Dropping empty words leaves single spaces only, as collapsing repeated spaces did
+        words = [word for word in text.split(" ") if word and word not in stop_words]
+        cleaned_texts.append(" ".join(words).strip())
+    return cleaned_texts
 
 
 def get_formatted_key_value_pairs(data: dict):
@@ -119,6 +193,33 @@ def get_response_from_llm(prompt: str):
     Returns:
         str: The generated response.
     """
-    response = __llm_model__.generate_content(prompt)
+    response = get_llm_model().generate_content(prompt)
     response = response.text.strip()
     return response
+
+
+async def get_response_from_llm_async(prompt: str):
+    """
+    Function to get a response from the language model without blocking the event loop.
+
+    Args:
+        prompt (str): The prompt to generate a response for.
+
+    Returns:
+        str: The generated response.
+    """
+    return await get_llm_client().generate(prompt)
+
+
+async def stream_response_from_llm(prompt: str):
+    """
+    Function to stream a response from the language model as it is generated.
+
+    Args:
+        prompt (str): The prompt to generate a response for.
+
+    Yields:
+        str: The text of each generated chunk.
+    """
+    async for chunk in get_llm_client().stream(prompt):
+        yield chunk